@@ -0,0 +1,425 @@
+# api.py
+# Headless JSON/Arrow API over the same cached loaders and similarity indexes as app.py.
+# Plain ASGI callable, no web framework needed:
+#   python api.py --port 8000          (standalone, via uvicorn)
+#   FOOTBALL_API_PORT=8000 streamlit run app.py   (inside the Streamlit process, sharing its caches)
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from data import (load_player_stats, load_team_stats, load_all_leagues, load_all_team_stats,
+                  load_similarity_index, load_shrunk_similarity_index, load_shrunk_leagues, load_group_stats,
+                  load_row_index, data_version, CACHE_TTL)
+from league_groups import fixed_league_groups, canonical_group_name, resolve_league_group
+from lookups import league_id_dict, stat_type_dict, stat_type_reverse_dict, seasons
+from similarity import SIMILARITY_METRICS, minutes_played
+import diagnostics
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow responses are optional
+    pa = None
+
+RESPONSE_CACHE_MAX = 512
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_default(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def _frame_body(df, fmt):
+    if fmt == "arrow":
+        if pa is None:
+            raise ApiError(406, "Arrow output requires pyarrow to be installed.")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), "application/vnd.apache.arrow.stream"
+    return df.to_json(orient="records").encode("utf-8"), "application/json"
+
+
+def _dict_body(payload, fmt):
+    if fmt == "arrow":
+        raise ApiError(406, "This endpoint only supports JSON output.")
+    return json.dumps(payload, default=_json_default).encode("utf-8"), "application/json"
+
+
+# --- Parameter helpers ---
+def _param(params, name, default=None, required=True):
+    value = params.get(name, [default])[0]
+    if value is None and required:
+        raise ApiError(400, f"Missing query parameter '{name}'.")
+    return value
+
+
+def _stat_key(params):
+    # Accept either the fbref key ("gca") or the display label ("Goal and Shot Creation")
+    stat = _param(params, "stat")
+    stat_key = stat_type_dict.get(stat, stat)
+    if stat_key not in stat_type_reverse_dict:
+        raise ApiError(400, f"Statistic type '{stat}' not supported.")
+    return stat_key
+
+
+def _season(params):
+    season = _param(params, "season", seasons[0])
+    if season not in seasons:
+        raise ApiError(400, f"Season '{season}' not supported.")
+    return season
+
+
+def _league(params):
+    league = _param(params, "league")
+    if league not in league_id_dict:
+        raise ApiError(400, f"League '{league}' not supported.")
+    return league
+
+
+def _checked(result):
+    df, error = result
+    if error:
+        raise ApiError(502, error)
+    if df is None:
+        raise ApiError(404, "No data loaded.")
+    return df
+
+
+def _row_index(stat_key, season):
+    row_index = load_row_index("All Leagues", stat_key, season)
+    if row_index is None:
+        raise ApiError(503, "Row index not available.")
+    return row_index
+
+
+def _player_rows(df_all, row_index, player):
+    rows = row_index.player_rows(player)
+    if len(rows) == 0:
+        raise ApiError(404, f"No data for player {player}.")
+    return df_all.iloc[rows]
+
+
+def _group_stats(stat_key, season, group_name, level="All Leagues"):
+    stats = load_group_stats(stat_key, season, level)
+    if stats is None or group_name not in stats:
+        raise ApiError(503, f"Group statistics for '{group_name}' not available.")
+    return stats[group_name]
+
+
+def _features(params, df):
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    raw = _param(params, "features", None, required=False)
+    if not raw:
+        return numeric_cols[:5]
+    features = [f for f in raw.split(",") if f]
+    unknown = [f for f in features if f not in numeric_cols]
+    if unknown:
+        raise ApiError(400, f"Unknown features: {', '.join(unknown)}")
+    return features
+
+
+def _group(params):
+    group_name = canonical_group_name(_param(params, "group", "All 8 Leagues"))
+    leagues = resolve_league_group(group_name)
+    if leagues is None:
+        raise ApiError(400, f"League group '{group_name}' not supported.")
+    return group_name, leagues
+
+
+# --- Endpoint builders (blocking; run in a worker thread) ---
+def build_meta(params, fmt):
+    return _dict_body({
+        "stat_types": stat_type_dict,
+        "seasons": seasons,
+        "leagues": list(league_id_dict.keys()),
+        "league_groups": list(fixed_league_groups.keys()),
+        "metrics": SIMILARITY_METRICS
+    }, fmt)
+
+
+def build_stats(params, fmt):
+    df = _checked(load_player_stats(_stat_key(params), _season(params), _league(params)))
+    return _frame_body(df, fmt)
+
+
+def build_team_stats(params, fmt):
+    df = _checked(load_team_stats(_stat_key(params), _season(params), _league(params)))
+    return _frame_body(df, fmt)
+
+
+def build_all_leagues(params, fmt):
+    df = _checked(load_all_leagues(_stat_key(params), _season(params)))
+    return _frame_body(df, fmt)
+
+
+def build_similar(params, fmt):
+    stat_key, season = _stat_key(params), _season(params)
+    player = _param(params, "player")
+    group_name, leagues = _group(params)
+    metric = _param(params, "metric", "cosine")
+    if metric not in SIMILARITY_METRICS.values():
+        raise ApiError(400, f"Unknown similarity metric '{metric}'.")
+    try:
+        top_n = max(1, min(int(_param(params, "top_n", "3")), 100))
+    except ValueError:
+        raise ApiError(400, "top_n must be an integer.")
+
+    df_all = _checked(load_all_leagues(stat_key, season))
+    features = _features(params, df_all)
+    player_rows = _player_rows(df_all, _row_index(stat_key, season), player)
+    minutes = minutes_played(player_rows)
+    selected_vec = player_rows[features].values
+    if metric == "shrunk":
+        shrunk = load_shrunk_leagues(stat_key, season)
+        if shrunk is None:
+            raise ApiError(503, "Shrunk rates not available.")
+        # Row labels are shared with the all-leagues frame, so the player's shrunk rates are a .loc away
+        selected_vec = shrunk[0].loc[player_rows.index, features].values
+
+    loader = load_shrunk_similarity_index if metric == "shrunk" else load_similarity_index
+    sim_index = loader(stat_key, season, tuple(leagues))
+    top_similar = None if sim_index is None else sim_index.top_similar(
+        selected_vec, features, exclude_player=player, top_n=top_n, metric=metric,
+        query_minutes=None if minutes is None else minutes[0], explain=_param(params, "explain", "0") == "1")
+    if top_similar is None:
+        top_similar = df_all.iloc[0:0].assign(similarity=[])
+
+    return _frame_body(top_similar, fmt)
+
+
+def build_radar(params, fmt):
+    from visuals import compute_radar_data
+
+    stat_key, season = _stat_key(params), _season(params)
+    player = _param(params, "player")
+    compare = _param(params, "compare", None, required=False)
+    group_name, leagues = _group(params)
+
+    df_all = _checked(load_all_leagues(stat_key, season))
+    features = _features(params, df_all)
+    row_index = _row_index(stat_key, season)
+    player_df = _player_rows(df_all, row_index, player)
+    compare_df = _player_rows(df_all, row_index, compare) if compare else None
+    group_df = df_all.iloc[row_index.league_rows(leagues)]
+
+    payload = compute_radar_data(player_df, group_df, features, checkbox_player_df=compare_df,
+                                 group_stats=_group_stats(stat_key, season, group_name))
+    payload.update({"player_name": player, "compare_name": compare, "group": group_name,
+                    "stat_type": stat_key, "season": season, "group_stats": payload.pop("group")})
+    return _dict_body(payload, fmt)
+
+
+def build_group_stats(params, fmt):
+    stat_key, season = _stat_key(params), _season(params)
+    group_name, leagues = _group(params)
+    df_all = _checked(load_all_leagues(stat_key, season))
+    group_stats = _group_stats(stat_key, season, group_name)
+    features = _features(params, df_all) if "features" in params else group_stats.features
+    return _frame_body(group_stats.summary_frame(features).rename_axis("Feature").reset_index(), fmt)
+
+
+def build_leaderboard(params, fmt):
+    from group_stats import leaderboard
+
+    stat_key, season = _stat_key(params), _season(params)
+    group_name, leagues = _group(params)
+    level = "All Teams" if _param(params, "level", "player") == "team" else "All Leagues"
+    df_all = _checked(load_all_team_stats(stat_key, season) if level == "All Teams" else load_all_leagues(stat_key, season))
+    feature = _param(params, "feature")
+    if feature not in df_all.select_dtypes(include="number").columns:
+        raise ApiError(400, f"Unknown feature '{feature}'.")
+    try:
+        k = max(1, min(int(_param(params, "k", "20")), 500))
+    except ValueError:
+        raise ApiError(400, "k must be an integer.")
+    ascending = _param(params, "order", "desc") == "asc"
+    return _frame_body(leaderboard(df_all, _group_stats(stat_key, season, group_name, level), feature, k,
+                                   ascending), fmt)
+
+
+ROUTES = {
+    "/meta": build_meta,
+    "/stats": build_stats,
+    "/team-stats": build_team_stats,
+    "/all-leagues": build_all_leagues,
+    "/similar": build_similar,
+    "/radar": build_radar,
+    "/group-stats": build_group_stats,
+    "/leaderboard": build_leaderboard
+}
+
+
+# --- Response cache with ETags and request coalescing ---
+_response_cache = {}
+_cache_lock = threading.Lock()
+_inflight = {}
+
+
+def _cached_response(key):
+    with _cache_lock:
+        hit = _response_cache.get(key)
+        if hit is not None and hit["expires"] > time.monotonic():
+            return hit
+        _response_cache.pop(key, None)
+    return None
+
+
+def _source_version(path, params):
+    # data_version() of the table an endpoint reads, so a reloaded table is never answered
+    # from a response built on the previous one; None for /meta and invalid parameters
+    if path == "/meta":
+        return None
+    try:
+        stat_key, season = _stat_key(params), _season(params)
+        if path in ("/stats", "/team-stats"):
+            return data_version("Player" if path == "/stats" else "Team", stat_key, season, _league(params))
+    except ApiError:
+        return None
+    level = "All Teams" if path == "/leaderboard" and _param(params, "level", "player") == "team" else "All Leagues"
+    return data_version(level, stat_key, season)
+
+
+def _store_response(key, body, content_type):
+    # The key ends with the source data version, which goes into the ETag with the body
+    etag = hashlib.sha1(repr(key[-1]).encode("utf-8") + body)
+    entry = {
+        "body": body,
+        "content_type": content_type,
+        "etag": '"' + etag.hexdigest()[:20] + '"',
+        "expires": time.monotonic() + CACHE_TTL
+    }
+    with _cache_lock:
+        if len(_response_cache) >= RESPONSE_CACHE_MAX:
+            # Drop the entry closest to expiry
+            _response_cache.pop(min(_response_cache, key=lambda k: _response_cache[k]["expires"]))
+        _response_cache[key] = entry
+    return entry
+
+
+async def _get_response(path, params, fmt):
+    # Resolving the version may load the source table, so it runs off the event loop too
+    version = await asyncio.to_thread(_source_version, path, params)
+    key = (path, fmt, tuple(sorted((k, tuple(v)) for k, v in params.items() if k != "format")), version)
+    entry = _cached_response(key)
+    diagnostics.record_cache("api_response", entry is not None)
+    if entry is not None:
+        return entry
+
+    # Identical concurrent requests share one computation
+    task = _inflight.get(key)
+    if task is None:
+        async def compute():
+            try:
+                body, content_type = await asyncio.to_thread(ROUTES[path], params, fmt)
+                return _store_response(key, body, content_type)
+            finally:
+                _inflight.pop(key, None)
+        task = asyncio.ensure_future(compute())
+        _inflight[key] = task
+    return await asyncio.shield(task)
+
+
+async def _send(send, status, body, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    method = scope["method"]
+    error_headers = [("content-type", "application/json")]
+
+    if path == "/health":
+        await _send(send, 200, b'{"status": "ok"}', error_headers)
+        return
+    if path == "/metrics":
+        # Prometheus scrape endpoint; never cached
+        body = diagnostics.export_prometheus().encode("utf-8")
+        await _send(send, 200, body, [("content-type", "text/plain; version=0.0.4")])
+        return
+    if path not in ROUTES:
+        await _send(send, 404, json.dumps({"error": f"Unknown endpoint {path}"}).encode(), error_headers)
+        return
+    if method not in ("GET", "HEAD"):
+        await _send(send, 405, b'{"error": "Method not allowed"}', error_headers + [("allow", "GET, HEAD")])
+        return
+
+    params = parse_qs(scope.get("query_string", b"").decode("utf-8"))
+    fmt = params.get("format", ["json"])[0]
+    if fmt not in ("json", "arrow"):
+        await _send(send, 400, b'{"error": "format must be json or arrow"}', error_headers)
+        return
+
+    try:
+        entry = await _get_response(path, params, fmt)
+    except ApiError as e:
+        await _send(send, e.status, json.dumps({"error": e.message}).encode(), error_headers)
+        return
+
+    headers = [("etag", entry["etag"]), ("cache-control", f"public, max-age={CACHE_TTL}")]
+    request_headers = dict(scope.get("headers", []))
+    if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+    if entry["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        await _send(send, 304, b"", headers)
+        return
+
+    headers += [("content-type", entry["content_type"]), ("content-length", str(len(entry["body"])))]
+    await _send(send, 200, b"" if method == "HEAD" else entry["body"], headers)
+
+
+def start_background_server(host="127.0.0.1", port=8000):
+    """
+    Serve the API from a daemon thread of the current process (used by app.py),
+    so it reads the same in-memory caches as the Streamlit UI.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="football-api", daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Football stats JSON/Arrow API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,103 +1,332 @@
 # app.py
-import pandas as pd
+import os
+import time
 import streamlit as st
-from urllib.parse import urlencode, quote
-from scraper import get_fbref_stats, get_fbref_team_stats, build_all_leagues_df
-from visuals import plot_radar_comparison
-from sklearn.metrics.pairwise import cosine_similarity
+from lookups import league_id_dict, stat_type_dict, stat_type_reverse_dict, seasons
+from league_groups import comparison_groups, canonical_group_name, resolve_league_group
+import diagnostics
+from diagnostics import span
+from figure_cache import radar_figures, map_figures
+
+# Streamlit re-executes this script on every widget interaction. Everything below up to the
+# page functions is cheap (stdlib + streamlit + lookup tables); pandas, the scraper (bs4) and
+# Plotly are imported on first use by the page that needs them, so About/Diagnostics never
+# pay for them and Explorer pays once per process.
+_script_start = time.perf_counter()
+
+# Time budget checked on the Diagnostics page
+COLD_START_BUDGET_MS = 3000
+RERUN_BUDGET_MS = 250
 
 # Set a page of this project
 st.set_page_config(page_title="Football Stats App", layout="wide")
 
-# Move the main title into the sidebar
-with st.sidebar:
-    st.markdown("## ⚽ Football Player Stats Explorer")
-    page_choice = st.radio("Navigate to...", ["Explorer", "About"])
+# Optional headless API served from this process, sharing the data.py caches (see api.py)
+@st.cache_resource(show_spinner=False)
+def start_api_server(host, port):
+    from api import start_background_server
+    return start_background_server(host=host, port=port)
+
+if os.environ.get("FOOTBALL_API_PORT"):
+    start_api_server(os.environ.get("FOOTBALL_API_HOST", "127.0.0.1"), int(os.environ["FOOTBALL_API_PORT"]))
+
+# Process-wide flag so the first (cold) run is timed separately from reruns
+@st.cache_resource(show_spinner=False)
+def startup_state():
+    return {"cold_start_recorded": False}
+
+# --- Cached loaders (data.py caches are shared with the API) ---
+def get_cached_stats(stat_type, season_str, league_name):
+    from data import load_player_stats
+    return load_player_stats(stat_type_dict.get(stat_type, stat_type), season_str, league_name)
+
+def get_cached_team_stats(stat_type, season_str, league_name):
+    from data import load_team_stats
+    return load_team_stats(stat_type_dict.get(stat_type, stat_type), season_str, league_name)
+
+def load_all_league_data(stat_type, season_str):
+    from data import load_all_leagues
+    return load_all_leagues(stat_type_dict.get(stat_type, stat_type), season_str)
+
+# Figure cache keys: (stat key, season) plus the cached table's data version, which changes on
+# every reload (an id() of the frame can be reused by a newer frame once the old one is freed)
+def get_data_version(level, stat_type, season_str, league_name=None):
+    from data import data_version
+    stat_key = stat_type_dict.get(stat_type, stat_type)
+    return (stat_key, season_str) + data_version(level, stat_key, season_str, league_name)
+
+def get_sketches_version(stat_type, seasons_tuple):
+    from data import load_group_sketches
+    stat_key = stat_type_dict.get(stat_type, stat_type)
+    return (stat_key, seasons_tuple, load_group_sketches.generation(stat_key, seasons_tuple))
+
+def get_table_view(level, stat_type, season_str, league_name):
+    from data import load_table_view
+    return load_table_view(level, stat_type_dict.get(stat_type, stat_type), season_str, league_name)
+
+def get_row_index(level, stat_type, season_str, league_name=None):
+    from data import load_row_index
+    return load_row_index(level, stat_type_dict.get(stat_type, stat_type), season_str, league_name)
+
+def get_similarity_index(stat_type, season_str, leagues, shrunk=False):
+    from data import load_similarity_index, load_shrunk_similarity_index
+    loader = load_shrunk_similarity_index if shrunk else load_similarity_index
+    return loader(stat_type_dict.get(stat_type, stat_type), season_str, leagues)
+
+def get_shrunk_leagues(stat_type, season_str):
+    from data import load_shrunk_leagues
+    return load_shrunk_leagues(stat_type_dict.get(stat_type, stat_type), season_str)
+
+def get_group_stats(stat_type, season_str, level="All Leagues"):
+    from data import load_group_stats
+    return load_group_stats(stat_type_dict.get(stat_type, stat_type), season_str, level)
+
+def get_clusters(stat_type, season_str):
+    from data import load_clusters
+    return load_clusters(stat_type_dict.get(stat_type, stat_type), season_str)
+
+def get_player_map(stat_type, season_str, features):
+    from data import load_player_map
+    return load_player_map(stat_type_dict.get(stat_type, stat_type), season_str, tuple(features))
+
+def get_scouting_index(stat_type, season_str):
+    from data import load_scouting_index
+    return load_scouting_index(stat_type_dict.get(stat_type, stat_type), season_str)
+
+def get_group_sketches(stat_type, seasons_tuple):
+    from data import load_group_sketches
+    return load_group_sketches(stat_type_dict.get(stat_type, stat_type), seasons_tuple)
+
+def load_all_team_data(stat_type, season_str):
+    from data import load_all_team_stats
+    return load_all_team_stats(stat_type_dict.get(stat_type, stat_type), season_str)
+
+def get_team_index(stat_type, seasons_tuple, leagues):
+    from data import load_team_index
+    return load_team_index(stat_type_dict.get(stat_type, stat_type), seasons_tuple, leagues)
+
+def get_top_similar_players(selected_vec, sim_index, radar_features, exclude_player, top_n=3,
+                            metric="cosine", weights=None, query_minutes=None, explain=False):
+    if sim_index is None:
+        return None
+    return sim_index.top_similar(selected_vec, radar_features, exclude_player=exclude_player,
+                                 top_n=top_n, metric=metric, weights=weights, query_minutes=query_minutes,
+                                 explain=explain)
+
+# Radar beside the per-feature breakdown of one match's similarity
+def render_radar_with_breakdown(radar_fig, match_row, features, name, match_name, compact, key):
+    from visuals import plot_similarity_contributions
+
+    radar_col, bars_col = st.columns([2, 1])
+    radar_col.plotly_chart(radar_fig, use_container_width=True)
+    # Groups can share their closest match, so the bar charts need their own keys
+    bars_col.plotly_chart(plot_similarity_contributions(match_row, features, name, match_name, compact=compact),
+                          use_container_width=True, key=key)
+    bars_col.caption(f"↔ marks the features where they differ most: {match_row['divergent']}.")
+
+def similarity_query(stat_type, season_str, df_all, rows, features, metric):
+    # (query vector, query minutes) for the selected player's rows of the all-leagues frame;
+    # the "shrunk" metric compares the player's shrunk rates, not the raw ones
+    from similarity import minutes_played
+    minutes = minutes_played(df_all.iloc[rows[:1]])
+    query_minutes = minutes[0] if minutes is not None and len(minutes) else None
+    if metric == "shrunk":
+        shrunk = get_shrunk_leagues(stat_type, season_str)
+        if shrunk is not None:
+            df_all = shrunk[0]
+    return df_all.iloc[rows[:1]][features].values, query_minutes
+
+# --- Similar player link generation ---
+def create_similar_player_link(player_name, squad, age, pos, similarity, league_group, stat_choice, season_choice, selected_player,
+                               confidence=None):
+    query = {
+        "player1": selected_player,
+        "player2": player_name,
+        "league_group": league_group,
+        "stat_choice": stat_type_dict[stat_choice],  # store key in URL (e.g. 'gca')
+        "season_choice": season_choice
+    }
+    #url_params = urlencode(query, quote_via=quote)  # support full names with spaces
+    #return f"[{player_name} ({squad}, {age}, {similarity:.3f})](?{url_params})"
+    if confidence is None:
+        return f"{player_name} ({squad}, {age}, {pos} / Similarity: {similarity:.3f})"
+    return f"{player_name} ({squad}, {age}, {pos} / Similarity: {similarity:.3f}, confidence {confidence:.2f})"
+
+# Paginated table: sort/filter/projection run server-side over the cached frame and only
+# the visible page is sent to the browser
+def render_paginated_table(view, rows=None, key="table", clusters=None):
+    from table_view import PAGE_SIZES
+
+    with st.expander("Table options"):
+        col1, col2, col3 = st.columns([3, 2, 1])
+        visible_cols = col1.multiselect("Columns", view.columns, default=view.columns, key=f"{key}_cols")
+        sort_by = col2.selectbox("Sort by", ["(none)"] + view.columns, key=f"{key}_sort")
+        descending = col3.checkbox("Descending", value=True, key=f"{key}_desc")
+
+    col1, col2, col3 = st.columns([3, 1, 1])
+    search = col1.text_input("Search", placeholder="Player, squad, nation or position", key=f"{key}_search")
+    page_size = col2.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+
+    positions = view.positions(sort_by=None if sort_by == "(none)" else sort_by, ascending=not descending,
+                               search=search or None, rows=rows)
+    n_pages = max((len(positions) - 1) // page_size + 1, 1)
+    page = col3.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, key=f"{key}_page")
+
+    first = (page - 1) * page_size
+    page_df = view.page(positions, page - 1, page_size, visible_cols)
+    if clusters is not None:
+        # clusters: (PlayerClusters, labels of the view's rows); only the visible page is styled
+        page_df = with_cluster_column(page_df, *clusters, positions[first:first + page_size])
+    st.dataframe(page_df, hide_index=True)
+    st.caption(f"Rows {min(first + 1, len(positions))}–{min(first + page_size, len(positions))} of {len(positions)}")
+
+# Role cluster column, coloured like the cluster
+def with_cluster_column(df, clusters, labels, rows):
+    names = clusters.name_of(labels[rows])
+    df = df.reset_index(drop=True)
+    df.insert(0, "Cluster", names)
+    return df.style.map(lambda name: f"background-color: {clusters.color_of(name)}; color: black",
+                        subset=["Cluster"])
+
+# Player map: all 8 leagues on the first two principal components of the radar features,
+# projected once per (stat_type, season, features) and drawn with WebGL
+def render_player_map(stat_choice, season_choice, df_all, all_index, player_choice, features,
+                      metric, weights, show_clusters):
+    import numpy as np
+    from visuals import plot_player_map
+
+    if len(features) < 2:
+        st.info("Select at least two features to draw the player map.")
+        return
+    player_map = get_player_map(stat_choice, season_choice, features)
+    if player_map is None:
+        return
+
+    sel_rows = all_index.player_rows(player_choice)
+    neighbour_rows = np.empty(0, dtype=np.int64)
+    sim_index = get_similarity_index(stat_choice, season_choice, tuple(league_id_dict.keys()), metric == "shrunk")
+    if len(sel_rows):
+        query_vec, query_minutes = similarity_query(stat_choice, season_choice, df_all, sel_rows, features, metric)
+        neighbours = get_top_similar_players(query_vec, sim_index, features, player_choice, top_n=10,
+                                             metric=metric, weights=weights, query_minutes=query_minutes)
+        if neighbours is not None:
+            neighbour_rows = np.concatenate([all_index.player_rows(p) for p in neighbours["Player"]])
+
+    clusters = get_clusters(stat_choice, season_choice) if show_clusters else None
+    color_by = "cluster" if clusters is not None else "league"
+    color_labels = clusters.name_of(clusters.labels) if clusters is not None else df_all["League"].to_numpy()
+    fig = plot_player_map(df_all, player_map, color_labels, selected_rows=sel_rows, neighbour_rows=neighbour_rows,
+                          title=f"{player_choice} and 10 most similar players, all 8 leagues",
+                          cache_key=(get_data_version("All Leagues", stat_choice, season_choice), features, color_by,
+                                     player_choice, tuple(neighbour_rows)))
+    st.plotly_chart(fig, use_container_width=True)
+
+# Scouting search: compound filter over all 8 leagues, evaluated as one vectorized mask
+def render_scouting_search(stat_choice, season_choice):
+    from league_groups import all_group_names
+    from query_engine import POSITIONS
+
+    index = get_scouting_index(stat_choice, season_choice)
+    if index is None:
+        st.sidebar.caption("Scouting search needs the all-leagues table.")
+        return
+
+    with st.sidebar.expander("Scouting Search", expanded=True):
+        group = st.selectbox("Search in", all_group_names(), index=all_group_names().index("All 8 Leagues"),
+                             key="search_group")
+        positions = st.multiselect("Positions", POSITIONS, key="search_pos")
+        age_min, age_max = st.slider("Age", 15, 45, (15, 45), key="search_age")
+        features = st.multiselect("Percentile thresholds", index.features, key="search_features")
+        thresholds = {f: float(st.slider(f"{f} ≥ percentile", 0, 100, 80, 5, key=f"search_pct_{f}"))
+                      for f in features}
+
+    found_rows, found_pct = index.search(group, positions=positions or None,
+                                         age_min=age_min if age_min > 15 else None,
+                                         age_max=age_max if age_max < 45 else None,
+                                         thresholds=thresholds)
+    st.subheader("Scouting Search")
+    st.caption(f"{len(found_rows)} players in {group}; percentiles are within {group}.")
+    st.dataframe(index.results_frame(found_rows, found_pct, features), hide_index=True)
+
+# Team similarity & radar: same cached, vectorized path as players, over the squad tables
+def render_team_comparison(stat_choice, season_choice, league_choice, team_choice, numeric_cols, compact_charts):
+    from similarity import SIMILARITY_METRICS, PLAYER_ONLY_METRICS
+    from visuals import plot_radar_comparison
+
+    radar_features = st.multiselect("Select features for radar chart", numeric_cols, default=numeric_cols[:5],
+                                    key="team_radar_features")
+    if not radar_features:
+        return
+    metric_label = st.sidebar.selectbox("Similarity Metric", [label for label, metric in SIMILARITY_METRICS.items()
+                                                              if metric not in PLAYER_ONLY_METRICS], key="team_metric")
+    similarity_metric = SIMILARITY_METRICS[metric_label]
+    all_seasons = st.checkbox("Find similar squads in all seasons", value=False)
+    seasons_tuple = tuple(seasons) if all_seasons else (season_choice,)
+
+    teams_all, error = load_all_team_data(stat_choice, season_choice)
+    if error:
+        st.warning(error)
+        return
+    teams_index = get_row_index("All Teams", stat_choice, season_choice)
+    sel_team_df = teams_all.iloc[teams_index.squad_rows(team_choice)[:1]]
+    if sel_team_df.empty:
+        st.warning(f"No data for {team_choice}.")
+        return
+    group_stats = get_group_stats(stat_choice, season_choice, "All Teams")
+    team_label = f"{team_choice} ({season_choice})"
+
+    for group_name, leagues in comparison_groups(league_choice).items():
+        st.subheader(f"{team_choice} vs {group_name}")
+
+        team_sim_index = get_team_index(stat_choice, seasons_tuple, tuple(leagues))
+        top_similar = get_top_similar_players(sel_team_df[radar_features].values, team_sim_index, radar_features,
+                                              team_label, top_n=3, metric=similarity_metric, explain=True)
+        if top_similar is None or top_similar.empty:
+            st.write("No similar squads found for this group.")
+            continue
+
+        labels = [f"{row['Team']} ({row['League']} / Similarity: {row['similarity']:.3f})"
+                  for _, row in top_similar.iterrows()]
+        selected_label = st.radio(f"Comparison with Similar Squad:", options=labels + ["None"],
+                                  key=f"team_radio_{group_name}")
+        overlay_df, overlay_name = None, None
+        if selected_label != "None":
+            overlay_df = top_similar.iloc[[labels.index(selected_label)]]
+            overlay_name = overlay_df["Team"].iloc[0]
+        # Breakdown of the chosen squad, or of the closest one
+        match_row = top_similar.iloc[labels.index(selected_label) if overlay_df is not None else 0]
+
+        radar_fig = plot_radar_comparison(
+            selected_player_df=sel_team_df,
+            comparison_df=teams_all.iloc[teams_index.league_rows(leagues)],
+            player_name=team_choice,
+            features=radar_features,
+            comparison_group_name=group_name,
+            checkbox_player_df=overlay_df,
+            checkbox_name=overlay_name,
+            group_stats=group_stats[group_name],
+            compact=compact_charts,
+            cache_key=(get_data_version("All Teams", stat_choice, season_choice), "team", group_name, team_choice, overlay_name, radar_features, compact_charts)
+        )
+        render_radar_with_breakdown(radar_fig, match_row, radar_features, team_choice, match_row["Team"], compact_charts,
+                                    key=f"team_breakdown_{group_name}")
 
 # Code for exploring the players' stats
-if page_choice == "Explorer":
+def render_explorer():
+    from similarity import SIMILARITY_METRICS
+    from visuals import plot_radar_comparison
+
     # Sidebar inputs
     level_choice = st.sidebar.selectbox("Data Level", ["Player", "Team"])
-    stat_choice = st.sidebar.selectbox("Statistic Type", [
-        "Standard", "Shooting", "Passing", "Pass Types", 
-        "Goal and Shot Creation", "Defensive Actions", 
-        "Possession", "Playing Time", "Goalkeeping", "Goalkeeping Advanced"
-    ])
-    season_choice = st.sidebar.selectbox("Season", ["2024-2025", "2023-2024", "2022-2023", "2021-2022"])
-    league_choice = st.sidebar.selectbox("League", [
-        "Premier League", "La Liga", "Bundesliga", "Serie A", "Ligue 1", 
-        "Eredivisie", "Primeira Liga", "Belgian Pro League"
-    ])
-
-    stat_type_dict = {
-        "Standard": "standard",
-        "Shooting": "shooting",
-        "Passing": "passing",
-        "Pass Types": "passing_types",
-        "Goal and Shot Creation": "gca",
-        "Defensive Actions": "defense",
-        "Possession": "possession",
-        "Playing Time": "playingtime",
-        "Goalkeeping": "keepers",
-        "Goalkeeping Advanced": "keepersadv"
-    }
-
-    # Reverse dictionary for converting back lowercase stat_type → display label
-    stat_type_reverse_dict = {v: k for k, v in stat_type_dict.items()}
-
-    league_id_dict = {
-        "Premier League": 9,
-        "La Liga": 12,
-        "Bundesliga": 20,
-        "Serie A": 11,
-        "Ligue 1": 13,
-        "Eredivisie": 23,
-        "Primeira Liga": 32,
-        "Belgian Pro League": 37
-    }
-
-    @st.cache_data(ttl=3600, show_spinner=False)
-    def get_cached_stats(stat_type, season_str, league_name):
-        stat_key = stat_type_dict.get(stat_type, None)
-        if stat_key is None:
-            return None, f"Statistic type '{stat_type}' not supported."
-        return get_fbref_stats(stat_key, season_str, league_name)
-
-    @st.cache_data(ttl=3600, show_spinner=False)
-    def get_cached_team_stats(stat_type, season_str, league_name):
-        stat_key = stat_type_dict.get(stat_type, None)
-        if stat_key is None:
-            return None, f"Statistic type '{stat_type}' not supported."
-        return get_fbref_team_stats(stat_key, season_str, league_name)
-
-    @st.cache_data(ttl=3600, show_spinner=False)
-    def load_all_league_data(stat_type, season_str):
-        all_leagues = list(league_id_dict.keys())
-        stat_key = stat_type_dict.get(stat_type, None)
-        if stat_key is None:
-            return None, f"Statistic type '{stat_type}' not supported."
-        return build_all_leagues_df(stat_key, season_str, all_leagues)
-
-    def get_top_similar_players(selected_vec, candidate_df, radar_features, exclude_player, top_n=3):
-        df = candidate_df[candidate_df["Player"] != exclude_player].dropna(subset=radar_features).reset_index(drop=True)
-        if df.empty or selected_vec.size == 0:
-            return None
-        sim_scores = cosine_similarity(selected_vec, df[radar_features].values)[0]
-        df = df.assign(similarity=sim_scores)
-        return df.sort_values("similarity", ascending=False).head(top_n).reset_index(drop=True)
-
-    # --- Similar player link generation ---
-    def create_similar_player_link(player_name, squad, age, pos, similarity, league_group, stat_choice, season_choice, selected_player):
-        query = {
-            "player1": selected_player,
-            "player2": player_name,
-            "league_group": league_group,
-            "stat_choice": stat_type_dict[stat_choice],  # store key in URL (e.g. 'gca')
-            "season_choice": season_choice
-        }
-        #url_params = urlencode(query, quote_via=quote)  # support full names with spaces
-        #return f"[{player_name} ({squad}, {age}, {similarity:.3f})](?{url_params})"
-        return f"{player_name} ({squad}, {age}, {pos} / Similarity: {similarity:.3f})"
+    stat_choice = st.sidebar.selectbox("Statistic Type", list(stat_type_dict.keys()))
+    season_choice = st.sidebar.selectbox("Season", seasons)
+    league_choice = st.sidebar.selectbox("League", list(league_id_dict.keys()))
+    table_mode = st.sidebar.selectbox("Table Mode", ["Paginated", "Full"])
+    # Compact radar payloads: typed arrays, template hover text, short axis labels
+    compact_charts = st.sidebar.checkbox("Compact charts", value=True)
+    # Role clusters are fitted over all 8 leagues, so this loads them on first use
+    show_clusters = level_choice == "Player" and st.sidebar.checkbox("Role clusters", value=False)
+    show_search = level_choice == "Player" and st.sidebar.checkbox("Scouting search", value=False)
 
     # --- Read from query string ---
     query_params = st.query_params
@@ -106,16 +335,16 @@ if page_choice == "Explorer":
 
         # URL-based comparison mode
         if all(k in query_params for k in ("player1", "player2", "league_group", "stat_choice", "season_choice")):
-            player1 = query_params["player1"][0]
-            player2 = query_params["player2"][0]
-            league_group = query_params["league_group"][0]
+            player1 = query_params["player1"]
+            player2 = query_params["player2"]
+            league_group = canonical_group_name(query_params["league_group"])
 
             # Convert lowercase stat_choice key back to display name
-            stat_choice_q_lower = query_params["stat_choice"][0]
+            stat_choice_q_lower = query_params["stat_choice"]
             stat_choice_q = stat_type_reverse_dict.get(stat_choice_q_lower, stat_choice_q_lower)
                 
             # Season Choice
-            season_choice_q = query_params["season_choice"][0]
+            season_choice_q = query_params["season_choice"]
 
             st.header(f"Comparison: {player1} vs {player2} in {league_group}")
             st.write(f"Statistic: {stat_choice_q} | Season: {season_choice_q}")
@@ -124,27 +353,24 @@ if page_choice == "Explorer":
             if error_all:
                 st.error(error_all)
             elif df_all_leagues is not None:
-                big5_leagues = ["Premier League", "La Liga", "Bundesliga", "Serie A", "Ligue 1"]
-                other3_leagues = ["Eredivisie", "Primeira Liga", "Belgian Pro League"]
-
-                # Use selected group
-                if league_group == league_choice:
-                    group_df = df_all_leagues[df_all_leagues["League"] == league_choice]
-                elif league_group == "Big 5 Leagues":
-                    group_df = df_all_leagues[df_all_leagues["League"].isin(big5_leagues)]
-                elif league_group == "Eredivisie/Primeira Liga/Belgian Pro League":
-                    group_df = df_all_leagues[df_all_leagues["League"].isin(other3_leagues)]
-                elif league_group == "All 8 Leagues":
-                    group_df = df_all_leagues
-                else:
-                    group_df = df_all_leagues
+                import numpy as np
+
+                all_index = get_row_index("All Leagues", stat_choice_q, season_choice_q)
+
+                # Use selected group (unknown names fall back to all 8 leagues)
+                group_leagues = resolve_league_group(league_group)
+                if group_leagues is None:
+                    league_group, group_leagues = "All 8 Leagues", resolve_league_group("All 8 Leagues")
+                group_rows = all_index.league_rows(group_leagues)
 
                 # Add selected players if not already in group
-                player_rows = df_all_leagues[df_all_leagues["Player"].isin([player1, player2])]
-                group_df = group_df.append(player_rows).drop_duplicates().reset_index(drop=True)
+                player1_rows = all_index.player_rows(player1)
+                player2_rows = all_index.player_rows(player2)
+                group_rows = np.union1d(group_rows, np.concatenate([player1_rows, player2_rows]))
+                group_df = df_all_leagues.iloc[group_rows].reset_index(drop=True)
 
-                player1_df = group_df[group_df["Player"] == player1]
-                player2_df = group_df[group_df["Player"] == player2]
+                player1_df = df_all_leagues.iloc[player1_rows]
+                player2_df = df_all_leagues.iloc[player2_rows]
 
                 if player1_df.empty:
                     st.error(f"No data for player {player1} in {league_group}")
@@ -158,16 +384,24 @@ if page_choice == "Explorer":
 
                     if radar_features:
                         fig = plot_radar_comparison(
-                            player1_df, 
-                            player2_df, 
-                            player1, 
-                            radar_features, 
+                            player1_df,
+                            group_df,
+                            player1,
+                            radar_features,
                             comparison_group_name=league_group,
-                            comparison_player2=player2_df
+                            checkbox_player_df=player2_df,
+                            checkbox_name=player2,
+                            group_stats=get_group_stats(stat_choice_q, season_choice_q)[league_group],
+                            compact=compact_charts,
+                            cache_key=(get_data_version("All Leagues", stat_choice_q, season_choice_q), league_group,
+                                       player1, player2, radar_features, compact_charts)
                         )
                         st.plotly_chart(fig, use_container_width=True)
 
-            st.stop()
+            return
+
+        player_choice = None
+        team_choice = None
 
         with st.spinner("Fetching data..."):
             if level_choice == "Player":
@@ -179,73 +413,129 @@ if page_choice == "Explorer":
             st.error(error)
 
         elif df is not None:
-            team_list = sorted(df["Squad"].unique())
-            team_choice = st.sidebar.selectbox("Team", ["All Teams"] + team_list)
+            # Option lists and row subsets come from the grouped index built with the cache
+            row_index = get_row_index(level_choice, stat_choice, season_choice, league_choice)
+            table_rows = None
+
+            team_choice = st.sidebar.selectbox("Team", ["All Teams"] + row_index.squads)
 
             if team_choice != "All Teams":
-                df = df[df["Squad"] == team_choice].reset_index(drop=True)
+                table_rows = row_index.squad_rows(team_choice)
 
             if level_choice == "Player":
-                player_list = sorted(df["Player"].unique())
+                player_list = row_index.players if team_choice == "All Teams" else row_index.players_in_squad(team_choice)
                 player_choice = st.sidebar.selectbox("Player", ["All Players"] + player_list)
 
                 if player_choice != "All Players":
-                    df = df[df["Player"] == player_choice].reset_index(drop=True)
-
-            st.success(f"{df.shape[0]} rows loaded.")
-            st.subheader(f"{level_choice} Level Stats")
-            st.dataframe(df)
+                    table_rows = row_index.player_rows(player_choice, within=table_rows)
+
+            table_clusters = None
+            cluster_choice = "All Clusters"
+            if show_clusters:
+                import numpy as np
+
+                clusters = get_clusters(stat_choice, season_choice)
+                league_rows = get_row_index("All Leagues", stat_choice, season_choice).league_rows([league_choice]) \
+                    if clusters is not None else None
+                if league_rows is None or len(league_rows) != len(df):
+                    st.sidebar.caption("Role clusters are not available for this selection.")
+                else:
+                    # Labels of this league's rows; the league is one contiguous block of the all-leagues frame
+                    table_clusters = (clusters, clusters.labels[league_rows])
+                    cluster_choice = st.sidebar.selectbox("Cluster", ["All Clusters"] + clusters.options())
+                    if cluster_choice != "All Clusters":
+                        in_cluster = clusters.rows(cluster_choice, within=league_rows)
+                        table_rows = in_cluster if table_rows is None else \
+                            np.intersect1d(table_rows, in_cluster, assume_unique=True)
+
+            if table_rows is not None:
+                with span("app.row_subset") as s:
+                    df = df.iloc[table_rows].reset_index(drop=True)
+                    s["rows"] = len(df)
+
+            if cluster_choice != "All Clusters" and len(df) == 0:
+                # The team/player filter and the cluster filter can exclude each other
+                if level_choice == "Player" and player_choice != "All Players":
+                    empty = f"{player_choice} is not in cluster {cluster_choice}."
+                else:
+                    empty = f"No players of {league_choice if team_choice == 'All Teams' else team_choice} " \
+                            f"are in cluster {cluster_choice}."
+                st.info(empty + " Choose \"All Clusters\" or another team or player.")
+            else:
+                st.success(f"{df.shape[0]} rows loaded.")
+                st.subheader(f"{level_choice} Level Stats")
+                table_view = get_table_view(level_choice, stat_choice, season_choice, league_choice) \
+                    if table_mode == "Paginated" else None
+                if table_view is not None:
+                    render_paginated_table(table_view, rows=table_rows, key=f"table_{level_choice}",
+                                           clusters=table_clusters)
+                elif table_clusters is not None:
+                    rows = table_rows if table_rows is not None else np.arange(len(df))
+                    st.dataframe(with_cluster_column(df, *table_clusters, rows))
+                else:
+                    st.dataframe(df)
 
         else:
             st.warning("No data loaded.")
 
+        if show_search:
+            render_scouting_search(stat_choice, season_choice)
+
         # Radar chart & similarity section
-        if level_choice == "Player" and 'player_choice' in locals() and player_choice != "All Players":
+        if level_choice == "Player" and player_choice not in (None, "All Players"):
             numeric_cols = df.select_dtypes(include='number').columns.tolist()
             radar_features = st.multiselect("Select features for radar chart", numeric_cols, default=numeric_cols[:5])
 
-            big5_leagues = ["Premier League", "La Liga", "Bundesliga", "Serie A", "Ligue 1"]
-            other3_leagues = ["Eredivisie", "Primeira Liga", "Belgian Pro League"]
+            metric_label = st.sidebar.selectbox("Similarity Metric", list(SIMILARITY_METRICS.keys()))
+            # Radar percentiles against this season's rows, or against every season via merged sketches
+            pool_choice = st.sidebar.selectbox("Percentile Pool", ["This season (exact)", "All seasons (sketch)"])
+            similarity_metric = SIMILARITY_METRICS[metric_label]
+            feature_weights = None
+            if similarity_metric == "weighted" and radar_features:
+                with st.sidebar.expander("Feature Weights", expanded=True):
+                    feature_weights = {
+                        f: st.slider(f, 0.0, 3.0, 1.0, 0.1, key=f"weight_{f}") for f in radar_features
+                    }
 
             df_all_leagues, error_all = load_all_league_data(stat_choice, season_choice)
 
             if error_all:
                 st.warning(error_all)
             elif df_all_leagues is not None and not df.empty:
-                selected_row = df[df["Player"] == player_choice]
-
-                league_groups = {
-                    league_choice: [league_choice],
-                    "Big 5 Leagues": big5_leagues,
-                    "Eredivisie/Primeira Liga/Jupiler": other3_leagues,
-                    "All 8 Leagues": list(league_id_dict.keys())
-                }
+                all_index = get_row_index("All Leagues", stat_choice, season_choice)
+                sel_player_rows = all_index.player_rows(player_choice)
+                group_stats = get_group_stats(stat_choice, season_choice)
+                pooled = get_group_sketches(stat_choice, tuple(seasons)) if pool_choice.startswith("All") else None
 
                 # Original code (""")
-                for group_name, leagues in league_groups.items():
+                for group_name, leagues in comparison_groups(league_choice).items():
                     #st.text(f"Group: {group_name} / League: {leagues}")
                     #comp_group_df = df_all_leagues[df_all_leagues["League"].isin(leagues) & (df_all_leagues["Player"] != player_choice)]
-                    comp_group_df = df_all_leagues[df_all_leagues["League"].isin(leagues)]
-                    
-                    sel_player_df = df_all_leagues[df_all_leagues["Player"] == player_choice]
+                    with span("app.group_filter", group=group_name) as s:
+                        comp_group_df = df_all_leagues.iloc[all_index.league_rows(leagues)]
+                        sel_player_df = df_all_leagues.iloc[sel_player_rows]
+                        s["rows"] = len(comp_group_df)
                     
                     if sel_player_df.empty:
-                        sel_player_df = df_all_leagues[df_all_leagues["Player"] == player_choice]
-                        if sel_player_df.empty:
-                            st.warning(f"No data for {player_choice} in {group_name}. Skipping...")
-                            continue
+                        st.warning(f"No data for {player_choice} in {group_name}. Skipping...")
+                        continue
                         
                     # Subheader
                     st.subheader(f"{player_choice} vs {group_name}")
 
-                    # Selected vector
-                    selected_vec = sel_player_df[radar_features].values
+                    # Selected vector (shrunk rates for the "shrunk" metric) and minutes, for the match confidence
+                    selected_vec, query_minutes = similarity_query(stat_choice, season_choice, df_all_leagues,
+                                                                   sel_player_rows, radar_features, similarity_metric)
                     
                     #st.text(f"[DEBUG] Comparing {player_choice} against {group_name}")
                     #st.text(f"Player vector shape: {selected_vec.shape}")
                     #st.text(f"Comparison group shape: {comp_group_df.shape}")
                     
-                    top_similar = get_top_similar_players(selected_vec, comp_group_df, radar_features, player_choice, top_n=3)
+                    sim_index = get_similarity_index(stat_choice, season_choice, tuple(leagues),
+                                                     similarity_metric == "shrunk")
+                    top_similar = get_top_similar_players(selected_vec, sim_index, radar_features, player_choice, top_n=3,
+                                                          metric=similarity_metric, weights=feature_weights,
+                                                          query_minutes=query_minutes, explain=True)
 
                     if top_similar is None or top_similar.empty:
                         st.write("No similar players found for this group.")
@@ -267,7 +557,8 @@ if page_choice == "Explorer":
                             league_group=group_name,
                             stat_choice=stat_choice,
                             season_choice=season_choice,
-                            selected_player=player_choice
+                            selected_player=player_choice,
+                            confidence=row.get("confidence")
                         )
                         
                         player_radio_labels.append(link_md)
@@ -281,12 +572,16 @@ if page_choice == "Explorer":
                     # Retrieve selected player name
                     if selected_radio_label != "None":
                         selected_similar_player = player_radio_mapping[selected_radio_label]
-                        checkbox_df = df_all_leagues[df_all_leagues["Player"] == selected_similar_player]
+                        checkbox_df = df_all_leagues.iloc[all_index.player_rows(selected_similar_player)]
                     else:
                         selected_similar_player = None
                         checkbox_df = None
+                    # Breakdown of the chosen player, or of the closest one
+                    match_row = top_similar.iloc[player_radio_labels.index(selected_radio_label)
+                                                 if selected_similar_player is not None else 0]
 
-                    # Update data for radar chart
+                    # Update data for radar chart; a group whose leagues have no sketch uses exact ranks
+                    group_pool = pooled.get(group_name) if pooled else None
                     radar_fig = plot_radar_comparison(
                         selected_player_df=sel_player_df,
                         comparison_df=comp_group_df,
@@ -294,16 +589,153 @@ if page_choice == "Explorer":
                         features=radar_features,
                         comparison_group_name=group_name,
                         checkbox_player_df=checkbox_df,
-                        checkbox_name=selected_similar_player
+                        checkbox_name=selected_similar_player,
+                        group_stats=group_pool or group_stats[group_name],
+                        percentiles=group_pool,
+                        compact=compact_charts,
+                        cache_key=(get_data_version("All Leagues", stat_choice, season_choice), group_name, player_choice,
+                                   selected_similar_player, radar_features, compact_charts,
+                                   get_sketches_version(stat_choice, tuple(seasons)) if group_pool else None)
                     )
-                    
-                    st.plotly_chart(radar_fig, use_container_width=True)
+
+                    render_radar_with_breakdown(radar_fig, match_row, radar_features, player_choice,
+                                                match_row["Player"], compact_charts, key=f"breakdown_{group_name}")
+
+                if radar_features and st.checkbox("Show player map", value=False):
+                    st.subheader("Player Map")
+                    render_player_map(stat_choice, season_choice, df_all_leagues, all_index, player_choice,
+                                      radar_features, similarity_metric, feature_weights, show_clusters)
+
+        elif level_choice == "Team" and team_choice not in (None, "All Teams") and df is not None:
+            render_team_comparison(stat_choice, season_choice, league_choice, team_choice,
+                                   df.select_dtypes(include='number').columns.tolist(), compact_charts)
 
     else:
         st.warning("Please select all required inputs.")
 
+# Code for the "Leaderboards" page: top k per feature and league group, sliced from the
+# sorted indexes kept with the radar's group statistics
+def render_leaderboards():
+    import numpy as np
+    from group_stats import leaderboard
+    from league_groups import all_group_names
+
+    st.header("🏆 Leaderboards")
+    level = st.sidebar.selectbox("Level", ["Players", "Teams"], key="lb_level")
+    stat_choice = st.sidebar.selectbox("Statistic Type", list(stat_type_dict.keys()), key="lb_stat")
+    season_choice = st.sidebar.selectbox("Season", seasons, key="lb_season")
+    group_name = st.sidebar.selectbox("League Group", all_group_names(),
+                                      index=all_group_names().index("All 8 Leagues"), key="lb_group")
+    data_level = "All Teams" if level == "Teams" else "All Leagues"
+
+    with st.spinner("Fetching data..."):
+        if level == "Teams":
+            df_all, error = load_all_team_data(stat_choice, season_choice)
+        else:
+            df_all, error = load_all_league_data(stat_choice, season_choice)
+    if df_all is None:
+        st.error(error or "No data loaded.")
+        return
+
+    group_stats = get_group_stats(stat_choice, season_choice, data_level)[group_name]
+    col1, col2, col3 = st.columns([3, 2, 1])
+    feature = col1.selectbox("Feature", group_stats.features, key="lb_feature")
+    k = col2.slider("Top", 5, 100, 20, 5, key="lb_k")
+    ascending = col3.checkbox("Lowest first", value=False, key="lb_asc")
+
+    st.subheader(f"{'Lowest' if ascending else 'Top'} {k}: {feature} in {group_name}")
+    st.dataframe(leaderboard(df_all, group_stats, feature, k, ascending), hide_index=True)
+
+    row_index = get_row_index(data_level, stat_choice, season_choice)
+    name = st.selectbox("Find rank of", ["(none)"] + (row_index.squads if level == "Teams" else row_index.players),
+                        key="lb_find")
+    if name != "(none)":
+        rows = row_index.squad_rows(name) if level == "Teams" else row_index.player_rows(name)
+        rows = rows[np.isin(rows, group_stats.rows)]
+        if len(rows) == 0:
+            st.info(f"{name} is not in {group_name}.")
+        else:
+            value = float(df_all[feature].iloc[rows[0]])
+            rank, ranked = group_stats.rank_of(feature, value, ascending)
+            if rank is None:
+                st.info(f"No {feature} value for {name}.")
+            else:
+                st.metric(f"{name}: {feature} = {value:g}", f"#{rank} of {ranked}",
+                          f"Percentile {float(group_stats.percentile(feature, value)):.1f}", delta_color="off")
+
+# Code for the "Diagnostics" page: where the time goes on the Explorer page
+def render_diagnostics():
+    import pandas as pd
+
+    st.header("🩺 Diagnostics")
+    st.caption(f"Timings from the last {diagnostics.RING_SIZE} instrumented spans in this process.")
+
+    summary = diagnostics.span_summary()
+
+    # Startup and rerun time budget
+    st.subheader("Time Budget")
+    budget_rows = []
+    cold = summary.get("app.cold_start")
+    if cold:
+        budget_rows.append({"Measure": "Cold start (first run in process)", "Measured (ms)": cold["max_ms"],
+                            "Budget (ms)": COLD_START_BUDGET_MS, "Within Budget": cold["max_ms"] <= COLD_START_BUDGET_MS})
+    for name in sorted(n for n in summary if n.startswith("app.rerun.")):
+        rerun = summary[name]
+        budget_rows.append({"Measure": f"Rerun p95 ({name.split('.', 2)[2]}, {rerun['count']} runs)",
+                            "Measured (ms)": rerun["p95_ms"], "Budget (ms)": RERUN_BUDGET_MS,
+                            "Within Budget": rerun["p95_ms"] <= RERUN_BUDGET_MS})
+    if budget_rows:
+        st.dataframe(pd.DataFrame(budget_rows), hide_index=True)
+    st.caption("Reruns of pages that had to scrape fbref include the scrape time; repeat the interaction for the cached figure.")
+
+    if summary:
+        summary_df = pd.DataFrame([
+            {"Span": name, "Count": s["count"], "Errors": s["errors"], "Total (ms)": s["total_ms"],
+             "Mean (ms)": s["mean_ms"], "p50 (ms)": s["p50_ms"], "p95 (ms)": s["p95_ms"], "Max (ms)": s["max_ms"],
+             "Bytes": s["totals"].get("bytes", 0), "Rows": s["totals"].get("rows", 0)}
+            for name, s in summary.items()
+        ]).sort_values("Total (ms)", ascending=False)
+        st.subheader("Spans")
+        st.dataframe(summary_df, hide_index=True)
+    else:
+        st.info("No spans recorded yet. Use the Explorer page first.")
+
+    cache = diagnostics.cache_stats()
+    if cache:
+        st.subheader("Caches")
+        st.dataframe(pd.DataFrame([
+            {"Cache": name, "Hits": c["hits"], "Misses": c["misses"], "Hit Rate": c["hit_rate"]}
+            for name, c in cache.items()
+        ]), hide_index=True)
+        fig_stats = radar_figures.stats()
+        st.caption(f"Radar figure cache: {fig_stats['size']}/{fig_stats['maxsize']} figures, "
+                   f"{fig_stats['evictions']} evicted.")
+        map_stats = map_figures.stats()
+        st.caption(f"Player map cache: {map_stats['size']}/{map_stats['maxsize']} figures, "
+                   f"{map_stats['evictions']} evicted.")
+
+    recent = diagnostics.recent_spans(limit=200)
+    if recent:
+        st.subheader("Recent Spans")
+        st.dataframe(pd.DataFrame([
+            {"Span": s["name"], "Duration (ms)": s["duration_ms"], "Thread": s["thread"],
+             "Error": s.get("error", ""), **{k: str(v) for k, v in s["attrs"].items()}}
+            for s in reversed(recent)
+        ]), hide_index=True)
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Export JSON", diagnostics.export_json(indent=2), file_name="diagnostics.json",
+                         mime="application/json")
+    col2.download_button("Export Prometheus", diagnostics.export_prometheus(), file_name="metrics.prom",
+                         mime="text/plain")
+    if col3.button("Clear"):
+        diagnostics.clear()
+        radar_figures.clear()
+        map_figures.clear()
+        st.rerun()
+
 # Code for "About" page
-elif page_choice == "About":
+def render_about():
     st.header("📘 About This App")
     st.markdown("""
     Welcome to the **Football Player Stats Explorer**!  
@@ -322,7 +754,38 @@ elif page_choice == "About":
     - **Python & Streamlit** for App Development  
     - **Pandas & NumPy** for Data Manipulation  
     - **Plotly** for Interactive Charts  
-    - **Scikit-learn & Scipy** for Player Comparisons (Cosine Similarity)
+    - **NumPy** for Player Comparisons (Cosine, Z-scored, Weighted and Mahalanobis Similarity)
+    - **scikit-learn** for Role Clusters
 
     If you find this useful or have suggestions, feel free to reach out!
-    """)
\ No newline at end of file
+    """)
+
+# Move the main title into the sidebar
+with st.sidebar:
+    st.markdown("## ⚽ Football Player Stats Explorer")
+    page_choice = st.radio("Navigate to...", ["Explorer", "Leaderboards", "Diagnostics", "About"])
+
+    # Offline mode: open the snapshot bundle (manifest only) at startup, not on the first table
+    if os.environ.get("FOOTBALL_SNAPSHOT"):
+        from snapshot import active_snapshot
+        snapshot, snapshot_error = active_snapshot()
+        if snapshot_error:
+            st.error(snapshot_error)
+        else:
+            st.caption(f"Offline mode: snapshot from {snapshot.created}, {len(snapshot.tables)} tables")
+
+pages = {
+    "Explorer": render_explorer,
+    "Leaderboards": render_leaderboards,
+    "Diagnostics": render_diagnostics,
+    "About": render_about
+}
+
+try:
+    with span(f"app.rerun.{page_choice}"):
+        pages[page_choice]()
+finally:
+    state = startup_state()
+    if not state["cold_start_recorded"]:
+        state["cold_start_recorded"] = True
+        diagnostics.record_span("app.cold_start", (time.perf_counter() - _script_start) * 1000, page=page_choice)
@@ -0,0 +1,258 @@
+# async_scraper.py
+# asyncio versions of the scraper.py fetchers. One AsyncScraper owns a single aiohttp
+# connection pool, a semaphore capping concurrent requests and a minimum spacing between
+# request starts (fbref rate-limits aggressive clients); table parsing is CPU-bound and
+# runs in an executor so the event loop keeps downloading meanwhile.
+import asyncio
+import time
+
+import aiohttp
+import pandas as pd
+
+from diagnostics import span
+from scraper import (HEADERS, PAGE_PARSERS, build_stats_url, build_team_stats_url, build_match_log_url,
+                     eligibility_source, filter_eligible)
+from snapshot import active_snapshot
+
+MAX_CONCURRENT_REQUESTS = 8
+MIN_REQUEST_INTERVAL = 0.0  # seconds between request starts; raise for live fbref scraping
+REQUEST_TIMEOUT = 30
+
+
+class AsyncScraper:
+    """
+    Shared session, rate limit and parse executor for many concurrent fetches:
+
+        async with AsyncScraper() as scraper:
+            df, error = await scraper.get_fbref_stats("gca", "2024-2025", "Premier League")
+
+    executor=None parses in the loop's default thread pool; pass a ProcessPoolExecutor,
+    or a parse_pool.ParsePool (compact Arrow transfer) as parse_pool, to parse on several cores.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_REQUESTS, min_interval=MIN_REQUEST_INTERVAL,
+                 executor=None, timeout=REQUEST_TIMEOUT, parse_pool=None):
+        self.max_concurrency = max_concurrency
+        self.min_interval = min_interval
+        self.executor = executor
+        self.parse_pool = parse_pool
+        self.timeout = timeout
+        self.session = None
+        self._semaphore = None
+        self._pace_lock = None
+        self._last_request = 0.0
+        # (std_url, std_table_id) -> Task; the eligibility table is shared by every
+        # stat type of a league/season, so it is fetched and parsed once per scraper
+        # (failed loads are dropped, see _standard_table)
+        self._std_tables = {}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(
+                headers=HEADERS, connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._pace_lock = asyncio.Lock()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _pace(self):
+        if self.min_interval <= 0:
+            return
+        async with self._pace_lock:
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_request = time.monotonic()
+
+    async def fetch_html(self, url):
+        await self.open()
+        async with self._semaphore:
+            await self._pace()
+            with span("scraper.fetch", url=url, mode="async") as s:
+                async with self.session.get(url) as response:
+                    response.raise_for_status()
+                    html = await response.read()
+                s["bytes"] = len(html)
+            return html
+
+    async def _parse(self, kind, *args):
+        if self.parse_pool is not None:
+            return await self.parse_pool.parse_async(kind, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, PAGE_PARSERS[kind], *args)
+
+    async def _standard_table(self, std_url, std_table_id):
+        key = (std_url, std_table_id)
+        task = self._std_tables.get(key)
+        if task is None:
+            async def load():
+                try:
+                    html_std = await self.fetch_html(std_url)
+                except Exception as e:
+                    return None, f"Error loading standard stats page: {e}"
+                return await self._parse("standard", html_std, std_table_id, std_url)
+            task = asyncio.ensure_future(load())
+            self._std_tables[key] = task
+
+            def forget_failed(done):
+                # Only successful tables are shared; after an error the next caller fetches again
+                if done.cancelled() or done.exception() is not None or done.result()[0] is None:
+                    if self._std_tables.get(key) is done:
+                        del self._std_tables[key]
+            task.add_done_callback(forget_failed)
+        return await asyncio.shield(task)
+
+    async def get_fbref_stats(self, stat_type, season_str, league_name):
+        snapshot, error = active_snapshot()
+        if error or snapshot is not None:
+            return (None, error) if error else snapshot.player_stats(stat_type, season_str, league_name)
+
+        url = build_stats_url(stat_type, season_str, league_name)
+        std_source = eligibility_source(stat_type, season_str, league_name)
+
+        # Start the eligibility table download alongside the main page
+        std_task = asyncio.ensure_future(self._standard_table(*std_source)) if std_source else None
+
+        try:
+            html = await self.fetch_html(url)
+        except Exception as e:
+            if std_task is not None:
+                std_task.cancel()
+            return None, f"Error loading page: {e}"
+
+        df, error = await self._parse("player", html, stat_type, (league_name, season_str))
+        if error:
+            if std_task is not None:
+                std_task.cancel()
+            return None, error
+
+        if std_task is None:
+            return filter_eligible(df), None
+
+        std_df, error = await std_task
+        if error:
+            return None, error
+        return filter_eligible(df, std_df), None
+
+    async def get_fbref_team_stats(self, stat_type, season_str, league_name):
+        snapshot, error = active_snapshot()
+        if error or snapshot is not None:
+            return (None, error) if error else snapshot.team_stats(stat_type, season_str, league_name)
+
+        url = build_team_stats_url(stat_type, season_str, league_name)
+        try:
+            html = await self.fetch_html(url)
+        except Exception as e:
+            return None, f"Error loading team stats page: {e}"
+        return await self._parse("team", html, stat_type, (league_name, season_str))
+
+    async def get_fbref_page(self, stat_type, season_str, league_name):
+        # Async scraper.get_fbref_page: player, squad and opponent tables from one download
+        snapshot, error = active_snapshot()
+        if error:
+            return None, error
+        if snapshot is not None:
+            return {
+                "player": snapshot.player_stats(stat_type, season_str, league_name),
+                "team": snapshot.team_stats(stat_type, season_str, league_name),
+                "opponent": (None, "Opponent tables are not in the offline snapshot.")
+            }, None
+
+        url = build_stats_url(stat_type, season_str, league_name)
+        std_source = eligibility_source(stat_type, season_str, league_name)
+        std_task = asyncio.ensure_future(self._standard_table(*std_source)) if std_source else None
+
+        try:
+            html = await self.fetch_html(url)
+        except Exception as e:
+            if std_task is not None:
+                std_task.cancel()
+            return None, f"Error loading page: {e}"
+
+        tables = await self._parse("page", html, stat_type, (league_name, season_str))
+
+        df, error = tables["player"]
+        if df is None:
+            if std_task is not None:
+                std_task.cancel()
+        elif std_task is None:
+            tables["player"] = filter_eligible(df), None
+        else:
+            std_df, error = await std_task
+            tables["player"] = (None, error) if error else (filter_eligible(df, std_df), None)
+        return tables, None
+
+    async def get_player_links(self, season_str, league_name):
+        try:
+            html = await self.fetch_html(build_stats_url("standard", season_str, league_name))
+        except Exception as e:
+            return None, f"Error loading page: {e}"
+        # A list, not a table, so never through the parse pool's Arrow transfer
+        return await asyncio.get_running_loop().run_in_executor(self.executor, PAGE_PARSERS["player_links"], html)
+
+    async def get_match_log(self, player_id, season_str, log_type="summary"):
+        try:
+            html = await self.fetch_html(build_match_log_url(player_id, season_str, log_type))
+        except Exception as e:
+            return None, f"Error loading match log page: {e}"
+        return await self._parse("match_log", html, log_type)
+
+    async def build_all_leagues_df(self, stat_type, season_str, league_list):
+        results = await asyncio.gather(
+            *[self.get_fbref_stats(stat_type, season_str, league) for league in league_list])
+
+        all_dfs = []
+        for league, (df, error) in zip(league_list, results):
+            if df is not None:
+                df["League"] = league
+                all_dfs.append(df)
+            else:
+                print(f"Skipped {league} due to error: {error}")
+
+        if not all_dfs:
+            return None, "No data could be loaded for any league."
+
+        return pd.concat(all_dfs, ignore_index=True), None
+
+    async def scrape_many(self, specs, level="player"):
+        """
+        Fetch many (stat_type, season_str, league_name) combinations concurrently.
+        Returns {spec: (df, error)} in the order given.
+        """
+        fetch = self.get_fbref_stats if level == "player" else self.get_fbref_team_stats
+        results = await asyncio.gather(*[fetch(*spec) for spec in specs])
+        return dict(zip(specs, results))
+
+
+# Coroutine counterparts of the scraper.py functions. Pass scraper= to share one
+# session/rate limit across calls; otherwise a short-lived one is used.
+async def get_fbref_stats_async(stat_type, season_str, league_name, scraper=None):
+    if scraper is not None:
+        return await scraper.get_fbref_stats(stat_type, season_str, league_name)
+    async with AsyncScraper() as scraper:
+        return await scraper.get_fbref_stats(stat_type, season_str, league_name)
+
+
+async def get_fbref_team_stats_async(stat_type, season_str, league_name, scraper=None):
+    if scraper is not None:
+        return await scraper.get_fbref_team_stats(stat_type, season_str, league_name)
+    async with AsyncScraper() as scraper:
+        return await scraper.get_fbref_team_stats(stat_type, season_str, league_name)
+
+
+async def build_all_leagues_df_async(stat_type, season_str, league_list, scraper=None):
+    if scraper is not None:
+        return await scraper.build_all_leagues_df(stat_type, season_str, league_list)
+    async with AsyncScraper() as scraper:
+        return await scraper.build_all_leagues_df(stat_type, season_str, league_list)
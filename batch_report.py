@@ -0,0 +1,274 @@
+# batch_report.py
+# Similar-player tables and radar figures for a whole shortlist in one run:
+#   python batch_report.py shortlist.txt --stat gca --season 2024-2025 \
+#       --group "Big 5 Leagues" --group "All 8 Leagues" --format parquet --out reports/ --workers 4
+# The all-leagues table is scraped (or taken from the data.py cache) once in this process and
+# shipped to every worker as one Arrow buffer; each worker then builds its row index, group
+# statistics and similarity indexes once and handles a slice of the shortlist.
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from league_groups import canonical_group_name, resolve_league_group
+from lookups import stat_type_dict, stat_type_reverse_dict
+from parse_pool import encode_table, decode_table
+from render_pool import IMAGE_FORMATS
+from similarity import SIMILARITY_METRICS, minutes_played
+
+OUTPUT_FORMATS = ["csv", "parquet", "html"]
+FIGURE_FORMATS = ["html", "png", "svg", "none"]
+
+# Per-process state set by _init_worker (or by run_batch when workers == 1)
+_state = {}
+
+
+def read_player_list(path):
+    # Plain text (one name per line) or a CSV with a "Player" column
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        names = pd.read_csv(path)["Player"].astype(str).tolist()
+    else:
+        names = path.read_text(encoding="utf-8").splitlines()
+    names = [n.strip() for n in names if n.strip() and not n.lstrip().startswith("#")]
+    return list(dict.fromkeys(names))
+
+
+def slugify(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_") or "item"
+
+
+def _init_worker(encoded_df, spec):
+    from group_stats import build_group_stats
+    from row_index import RowIndex
+    from similarity import SimilarityIndex, shrink_frame
+
+    df_all = encoded_df if isinstance(encoded_df, pd.DataFrame) else decode_table(encoded_df)
+    row_index = RowIndex(df_all)
+    group_stats = build_group_stats(df_all, row_index)
+    # The "shrunk" metric searches the minutes-shrunk copy of the frame (same rows)
+    df_query, row_weights = shrink_frame(df_all) if spec["metric"] == "shrunk" else (df_all, None)
+    groups = {}
+    for group, leagues in spec["groups"].items():
+        rows = row_index.league_rows(leagues)
+        groups[group] = (df_all.iloc[rows],
+                         SimilarityIndex(df_query.iloc[rows], row_weights=None if row_weights is None else row_weights[rows]))
+    _state.clear()
+    _state.update({
+        "df": df_all,
+        "df_query": df_query,
+        "row_index": row_index,
+        "spec": spec,
+        "group_stats": group_stats,
+        "groups": groups
+    })
+
+
+def _radar_figure(player, group):
+    # Radar of one player against one group, from the state _init_worker set up
+    from visuals import plot_radar_comparison
+
+    df_all, spec = _state["df"], _state["spec"]
+    player_df = df_all.iloc[_state["row_index"].player_rows(player)[:1]]
+    group_df, _ = _state["groups"][group]
+    return plot_radar_comparison(player_df, group_df, player, spec["features"], comparison_group_name=group,
+                                 group_stats=_state["group_stats"][group])
+
+
+def _player_report(player):
+    # Runs in the worker: one player against every requested group
+    df_all, spec = _state["df"], _state["spec"]
+    player_rows = _state["row_index"].player_rows(player)
+    if len(player_rows) == 0:
+        return False, None, []
+    player_df = df_all.iloc[player_rows[:1]]
+    features = spec["features"]
+    query_vec = _state["df_query"].iloc[player_rows[:1]][features].values
+    minutes = minutes_played(player_df)
+    query_minutes = None if minutes is None else minutes[0]
+
+    tables, figures = [], []
+    for group, (_, sim_index) in _state["groups"].items():
+        top_similar = sim_index.top_similar(query_vec, features, exclude_player=player, top_n=spec["top_n"],
+                                            metric=spec["metric"], query_minutes=query_minutes)
+        if top_similar is not None:
+            tables.append(top_similar.assign(**{"Query Player": player, "Group": group,
+                                                "Rank": range(1, len(top_similar) + 1)}))
+
+        if spec["figures"] != "none":
+            path = Path(spec["out"]) / "figures" / f"{slugify(player)}__{slugify(group)}.{spec['figures']}"
+            if spec["figures"] == "html":
+                _radar_figure(player, group).write_html(path, include_plotlyjs="cdn")
+                figures.append(str(path))
+            else:
+                # PNG/SVG are rendered by the parent's RenderPool, which builds the figure only
+                # when the image is not cached yet; send back what identifies it
+                key_parts = {"player": player, "features": features, "group": group,
+                             "season": spec["season"], "stat_type": spec["stat_type"], "data": spec["data"]}
+                figures.append((str(path), key_parts, (player, group)))
+
+    similar = pd.concat(tables, ignore_index=True) if tables else None
+    return True, similar, figures
+
+
+def _report_chunk(players):
+    return [(player, *_player_report(player)) for player in players]
+
+
+def render_images(jobs, fmt, workers, df_all, spec):
+    # jobs: (target path, render key parts, (player, group)); images are cached by render_pool,
+    # and a figure is built here only for an image that is not in the cache
+    from render_pool import RenderPool
+
+    def factory(player, group):
+        def build():
+            # With several workers this process has no state until the first cache miss
+            if _state.get("spec") is not spec:
+                _init_worker(df_all, spec)
+            return _radar_figure(player, group)
+        return build
+
+    try:
+        with RenderPool(workers=workers) as pool:
+            cached = pool.render_many([(key_parts, factory(*figure)) for _, key_parts, figure in jobs], fmt)
+    except Exception as e:
+        return None, f"Image rendering failed: {e}"
+
+    for (target, _, _), path in zip(jobs, cached):
+        shutil.copyfile(path, target)
+    return [target for target, _, _ in jobs], None
+
+
+def frame_fingerprint(df):
+    # Content hash of the all-leagues table, stable across processes and runs, for the image cache
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return hashlib.sha1(row_hashes.tobytes() + "\x1f".join(map(str, df.columns)).encode("utf-8")).hexdigest()[:16]
+
+
+def write_table(df, path_stem, fmt):
+    path = Path(f"{path_stem}.{fmt}")
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_html(path, index=False)
+    return path
+
+
+def run_batch(players, stat_key, season_str, groups, out_dir, features=None, top_n=5,
+              metric="cosine", fmt="csv", figures="html", workers=None):
+    """
+    Writes <out>/similar_players.<fmt> (one row per similar player, per query player and group),
+    <out>/missing_players.txt and, unless figures == "none", one radar figure per player and group.
+    Returns (summary dict, error) in the scraper's (result, error) style.
+    """
+    from data import load_all_leagues
+
+    start = time.perf_counter()
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if error:
+        return None, error
+    if df_all is None:
+        return None, "No data loaded."
+
+    numeric_cols = df_all.select_dtypes(include="number").columns.tolist()
+    features = features or numeric_cols[:5]
+    unknown = [f for f in features if f not in numeric_cols]
+    if unknown:
+        return None, f"Unknown features: {', '.join(unknown)}"
+
+    resolved = {}
+    for group in groups:
+        leagues = resolve_league_group(group)
+        if leagues is None:
+            return None, f"League group '{group}' not supported."
+        resolved[canonical_group_name(group)] = leagues
+
+    out_dir = Path(out_dir)
+    (out_dir / "figures").mkdir(parents=True, exist_ok=True)
+    spec = {"groups": resolved, "features": features, "top_n": top_n, "metric": metric,
+            "figures": figures, "out": str(out_dir), "stat_type": stat_key, "season": season_str,
+            "data": frame_fingerprint(df_all) if figures in IMAGE_FORMATS else None}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(players) or 1))
+    chunks = [players[i::workers] for i in range(workers)]
+    if workers == 1:
+        _init_worker(df_all, spec)
+        results = _report_chunk(players)
+    else:
+        # One Arrow buffer per worker instead of one pickled frame per task
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(encode_table(df_all), spec)) as pool:
+            results = [r for chunk in pool.map(_report_chunk, chunks) for r in chunk]
+
+    tables = [similar for _, _, similar, _ in results if similar is not None]
+    missing = [player for player, found, _, _ in results if not found]
+    figure_paths = [path for _, _, _, figs in results for path in figs]
+    if figures in IMAGE_FORMATS and figure_paths:
+        figure_paths, error = render_images(figure_paths, figures, workers, df_all, spec)
+        if error:
+            return None, error
+
+    summary_path = None
+    if tables:
+        similar_df = pd.concat(tables, ignore_index=True)
+        lead_cols = ["Query Player", "Group", "Rank", "similarity"]
+        similar_df = similar_df[lead_cols + [c for c in similar_df.columns if c not in lead_cols]]
+        summary_path = write_table(similar_df, out_dir / "similar_players", fmt)
+    (out_dir / "missing_players.txt").write_text("\n".join(missing), encoding="utf-8")
+
+    return {
+        "players": len(players),
+        "missing": missing,
+        "groups": list(resolved),
+        "workers": workers,
+        "similar_table": str(summary_path) if summary_path else None,
+        "figures": len(figure_paths),
+        "seconds": time.perf_counter() - start
+    }, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export similar-player tables and radar figures for a list of players")
+    parser.add_argument("players", help="text file with one player per line, or a CSV with a Player column")
+    parser.add_argument("--stat", required=True, help="stat type key or label, e.g. gca or 'Goal and Shot Creation'")
+    parser.add_argument("--season", required=True, help="season, e.g. 2024-2025")
+    parser.add_argument("--group", action="append", help="league group or league (repeatable, default: All 8 Leagues)")
+    parser.add_argument("--features", default=None, help="comma-separated numeric columns (default: first 5)")
+    parser.add_argument("--metric", default="cosine", choices=list(SIMILARITY_METRICS.values()))
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--format", default="csv", choices=OUTPUT_FORMATS, help="similar-player table format")
+    parser.add_argument("--figures", default="html", choices=FIGURE_FORMATS, help="radar figure format")
+    parser.add_argument("--out", default="reports", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    stat_key = stat_type_dict.get(args.stat, args.stat)
+    if stat_key not in stat_type_reverse_dict:
+        raise SystemExit(f"Statistic type '{args.stat}' not supported.")
+
+    players = read_player_list(args.players)
+    if not players:
+        raise SystemExit(f"No players found in {args.players}")
+
+    summary, error = run_batch(
+        players, stat_key, args.season, args.group or ["All 8 Leagues"], args.out,
+        features=[f for f in args.features.split(",") if f] if args.features else None,
+        top_n=args.top_n, metric=args.metric, fmt=args.format, figures=args.figures, workers=args.workers
+    )
+    if error:
+        raise SystemExit(error)
+
+    print(f"{summary['players']} players x {len(summary['groups'])} groups on {summary['workers']} workers "
+          f"in {summary['seconds']:.1f}s")
+    print(f"similar players: {summary['similar_table']}")
+    print(f"radar figures: {summary['figures']}")
+    if summary["missing"]:
+        print(f"not found ({len(summary['missing'])}): {', '.join(summary['missing'])}")
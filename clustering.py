@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from similarity import VOLUME_COLUMNS
+
+N_CLUSTERS = 8
+# Above this many rows mini-batch k-means is used instead of full k-means
+MINIBATCH_ROWS = 5000
+UNCLUSTERED = "Unclustered"
+# Columns that identify a row of the all-leagues frame, stored with saved cluster labels
+ROW_KEYS = ["Player", "Squad", "League"]
+# Plotly's default qualitative palette, so cluster colours match the charts
+CLUSTER_COLORS = ["#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A",
+                  "#19D3F3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"]
+
+
+def cluster_features(columns):
+    # Playing-time volume columns say how much a player played, not how
+    return [c for c in columns if c.split("_")[-1] not in VOLUME_COLUMNS]
+
+
+def _short(col):
+    return col.split("_")[-1]
+
+
+class PlayerClusters:
+    """
+    Role clusters of one all-leagues frame (stat_type, season): a label and the distance
+    to its centroid for every row, aligned with load_all_leagues. Rows with missing
+    values get label -1. Built once with the data; the Explorer only reads it.
+    """
+
+    def __init__(self, labels, distances, names):
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.distances = np.asarray(distances, dtype=float)
+        # cluster id -> display name, e.g. "3: PrgC / PrgP"
+        self.names = dict(names)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_frame(cls, df):
+        # Inverse of frame(), e.g. for the copy stored in an offline snapshot
+        labels = df["Cluster Id"].to_numpy(dtype=np.int64)
+        names = dict(zip(labels, df["Cluster"].astype(str)))
+        names.pop(-1, None)
+        return cls(labels, df["Centroid Distance"].to_numpy(dtype=float), names)
+
+    def options(self):
+        return [self.names[k] for k in sorted(self.names)]
+
+    def name_of(self, labels):
+        return np.array([self.names.get(k, UNCLUSTERED) for k in labels], dtype=object)
+
+    def color_of(self, name):
+        ids = {v: k for k, v in self.names.items()}
+        return CLUSTER_COLORS[ids[name] % len(CLUSTER_COLORS)] if name in ids else "#BBBBBB"
+
+    def rows(self, name, within=None):
+        # Row positions (of the all-leagues frame, or of `within`) in the named cluster
+        ids = [k for k, v in self.names.items() if v == name]
+        labels = self.labels if within is None else self.labels[within]
+        return np.flatnonzero(labels == ids[0]) if ids else np.empty(0, dtype=np.int64)
+
+    def frame(self, rows=None):
+        labels = self.labels if rows is None else self.labels[rows]
+        distances = self.distances if rows is None else self.distances[rows]
+        return pd.DataFrame({"Cluster Id": labels, "Cluster": self.name_of(labels),
+                             "Centroid Distance": distances})
+
+
+def align_cluster_frame(frame, df):
+    """
+    Saved cluster rows (frame() plus ROW_KEYS columns) reordered to match df's rows, or None
+    when they describe other rows (different leagues, order or players) and must be refitted.
+    """
+    keys = [k for k in ROW_KEYS if k in df.columns]
+    if not keys or any(k not in frame.columns for k in keys):
+        return None
+    saved = pd.MultiIndex.from_frame(frame[keys].astype(str))
+    if not saved.is_unique:
+        return None
+    pos = saved.get_indexer(pd.MultiIndex.from_frame(df[keys].astype(str)))
+    if (pos < 0).any() or len(frame) != len(df):
+        return None
+    return frame.iloc[pos].reset_index(drop=True)
+
+
+def build_clusters(sim_index, n_clusters=N_CLUSTERS, features=None, random_state=0):
+    """
+    k-means over the z-scored, unit-length rows the similarity queries use, so a cluster
+    is a group of players pointing the same way in the same feature space.
+    """
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    features = features or cluster_features(sim_index.features)
+    labels = np.full(len(sim_index.df), -1, dtype=np.int64)
+    distances = np.full(len(sim_index.df), np.nan)
+    Z, rows_ok = sim_index.normalized(features)
+    k = min(n_clusters, int(rows_ok.sum()))
+    if k < 2:
+        return PlayerClusters(labels, distances, {})
+
+    with span("clustering.fit", rows=int(rows_ok.sum()), features=len(features), k=k):
+        Zc = Z[rows_ok]
+        if len(Zc) > MINIBATCH_ROWS:
+            model = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3, batch_size=1024)
+        else:
+            model = KMeans(n_clusters=k, random_state=random_state, n_init=4)
+        fitted = model.fit_predict(Zc)
+        dist = model.transform(Zc)[np.arange(len(Zc)), fitted]
+
+    # Number clusters by size (1 = largest) and name them after their two strongest features
+    # with different short names ("Gls" is both a total and a per-90 column)
+    order = np.argsort(-np.bincount(fitted, minlength=k), kind="stable")
+    relabel = np.empty(k, dtype=np.int64)
+    relabel[order] = np.arange(k)
+    fitted = relabel[fitted]
+    labels[rows_ok], distances[rows_ok] = fitted, dist
+
+    cols = [sim_index.col_pos[f] for f in features]
+    z = (sim_index.X[rows_ok][:, cols] - sim_index.mean[cols]) / sim_index.std[cols]
+    names = {}
+    for c in range(k):
+        top = []
+        for j in np.argsort(-z[fitted == c].mean(axis=0)):
+            if _short(features[j]) not in top:
+                top.append(_short(features[j]))
+            if len(top) == 2:
+                break
+        names[c] = f"{c + 1}: " + " / ".join(top)
+    return PlayerClusters(labels, distances, names)
@@ -0,0 +1,347 @@
+import itertools
+import threading
+import time
+from functools import wraps
+
+import pandas as pd
+
+from diagnostics import record_cache, span
+from lookups import league_id_dict, stat_type_reverse_dict
+from scraper import get_fbref_page, build_all_leagues_df, schema_fingerprint
+from similarity import SimilarityIndex, shrink_frame
+from table_view import TableView
+from row_index import RowIndex
+from group_stats import build_group_stats
+from clustering import PlayerClusters, align_cluster_frame, build_clusters
+from landscape import PlayerMap
+from query_engine import ScoutingIndex
+from sketches import build_league_sketches, build_group_sketches
+from snapshot import active_snapshot
+
+CACHE_TTL = 3600
+# Stamps every value ttl_cache stores; see generation() below
+_generations = itertools.count(1)
+
+
+def ttl_cache(ttl=CACHE_TTL, key_func=None, keep=None):
+    """
+    Process-wide memoization with expiry, safe to share between the Streamlit script
+    thread and API worker threads. Concurrent calls with the same arguments wait for
+    the first one instead of scraping fbref twice.
+    key_func(*args), if given, is appended to the key (e.g. the source table's data version);
+    when it returns None the source is not cached, so neither is the result.
+    keep(value), if given, decides whether a successful value is cached or only returned.
+    wrapper.generation(*args) is the load number of the cached value (None if not cached);
+    it changes whenever the value is loaded again, so derived results can be keyed on it.
+    """
+    def decorator(func):
+        entries = {}
+        key_locks = {}
+        lock = threading.Lock()
+
+        def cache_key(call_args):
+            if key_func is None:
+                return call_args
+            part = key_func(*call_args)
+            return None if part is None else call_args + (part,)
+
+        @wraps(func)
+        def wrapper(*call_args):
+            args = cache_key(call_args)
+            if args is None:
+                record_cache(func.__name__, False)
+                return func(*call_args)
+            now = time.monotonic()
+            with lock:
+                hit = entries.get(args)
+                if hit is not None and hit[0] > now:
+                    record_cache(func.__name__, True)
+                    return hit[1]
+                key_lock = key_locks.setdefault(args, threading.Lock())
+
+            with key_lock:
+                with lock:
+                    hit = entries.get(args)
+                    if hit is not None and hit[0] > time.monotonic():
+                        record_cache(func.__name__, True)
+                        return hit[1]
+                record_cache(func.__name__, False)
+                value = func(*call_args)
+                # Errors are not cached, so the next call retries the scrape
+                failed = value is None or (isinstance(value, tuple) and len(value) == 2 and value[0] is None)
+                if not failed and (keep is None or keep(value)):
+                    with lock:
+                        now = time.monotonic()
+                        # Versioned keys never repeat after a reload; drop what has expired
+                        for key in [k for k, e in entries.items() if e[0] <= now]:
+                            del entries[key]
+                            key_locks.pop(key, None)
+                        entries[args] = (now + ttl, value, next(_generations))
+                return value
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        def generation(*call_args):
+            args = cache_key(call_args)
+            if args is None:
+                return None
+            with lock:
+                hit = entries.get(args)
+            return None if hit is None or hit[0] <= time.monotonic() else hit[2]
+
+        wrapper.cache_clear = cache_clear
+        wrapper.generation = generation
+        return wrapper
+    return decorator
+
+
+def _player_table_loaded(value):
+    tables, error = value
+    return tables["player"][0] is not None
+
+
+# Loaders take the fbref stat key (e.g. "gca"), not the display label
+@ttl_cache(keep=_player_table_loaded)
+def load_page(stat_key, season_str, league_name):
+    # One download and parse per stats page; player and team tables both come from it,
+    # so switching Data Level between Player and Team never fetches again. A page whose
+    # player table failed (e.g. the eligibility page timed out) is returned but not cached,
+    # so the next call retries
+    if stat_key not in stat_type_reverse_dict:
+        return None, f"Statistic type '{stat_key}' not supported."
+    tables, error = get_fbref_page(stat_key, season_str, league_name)
+    if error is None and all(df is None for df, _ in tables.values()):
+        # Nothing usable on the page: report the player table's error and let the next call retry
+        return None, tables["player"][1]
+    return tables, error
+
+
+def _page_table(table, stat_key, season_str, league_name):
+    tables, error = load_page(stat_key, season_str, league_name)
+    if error:
+        return None, error
+    return tables[table]
+
+
+def load_player_stats(stat_key, season_str, league_name):
+    return _page_table("player", stat_key, season_str, league_name)
+
+
+def load_team_stats(stat_key, season_str, league_name):
+    return _page_table("team", stat_key, season_str, league_name)
+
+
+def load_opponent_stats(stat_key, season_str, league_name):
+    return _page_table("opponent", stat_key, season_str, league_name)
+
+
+@ttl_cache()
+def load_all_leagues(stat_key, season_str):
+    if stat_key not in stat_type_reverse_dict:
+        return None, f"Statistic type '{stat_key}' not supported."
+    # Per-league pages come from the same cache as the single-league views
+    return build_all_leagues_df(stat_key, season_str, list(league_id_dict.keys()), fetch=load_player_stats)
+
+
+@ttl_cache()
+def load_all_team_stats(stat_key, season_str):
+    # Squad tables of all 8 leagues with a League column, from the same page cache
+    if stat_key not in stat_type_reverse_dict:
+        return None, f"Statistic type '{stat_key}' not supported."
+    return build_all_leagues_df(stat_key, season_str, list(league_id_dict.keys()), fetch=load_team_stats)
+
+
+def _load_level(level, stat_key, season_str, league_name):
+    # level: "Player", "Team", "All Leagues" or "All Teams" (league_name unused for the last two)
+    if level == "Player":
+        return load_player_stats(stat_key, season_str, league_name)
+    if level == "Team":
+        return load_team_stats(stat_key, season_str, league_name)
+    if level == "All Teams":
+        return load_all_team_stats(stat_key, season_str)
+    return load_all_leagues(stat_key, season_str)
+
+
+def _level_schema(level, stat_key, season_str, league_name=None):
+    # Layout fingerprint of the cached source table
+    df, error = _load_level(level, stat_key, season_str, league_name)
+    return None if df is None else schema_fingerprint(df.columns)
+
+
+def data_version(level, stat_key, season_str, league_name=None):
+    # (layout fingerprint, load generation) of the cached source table, for keying figures
+    # and other results derived from it; a new version on every reload
+    loader = {"Player": load_page, "Team": load_page, "All Teams": load_all_team_stats}.get(level, load_all_leagues)
+    args = (stat_key, season_str) if loader is not load_page else (stat_key, season_str, league_name)
+    return _level_schema(level, stat_key, season_str, league_name), loader.generation(*args)
+
+
+# Key functions of everything derived from a source table (row positions, indexes, statistics,
+# projections): its data_version(), so any reload, same layout or not, rebuilds them instead of
+# serving positions into a frame that no longer exists. None while the table is not cached.
+def _level_version(level, stat_key, season_str, league_name=None):
+    version = data_version(level, stat_key, season_str, league_name)
+    return None if version[1] is None else version
+
+
+def _all_leagues_version(stat_key, season_str, *rest):
+    return _level_version("All Leagues", stat_key, season_str)
+
+
+def _group_stats_version(stat_key, season_str, level="All Leagues"):
+    return _level_version(level, stat_key, season_str)
+
+
+def _seasons_version(level, stat_key, seasons):
+    versions = tuple(_level_version(level, stat_key, season_str) for season_str in seasons)
+    return None if None in versions else versions
+
+
+def _team_index_version(stat_key, seasons, leagues):
+    return _seasons_version("All Teams", stat_key, seasons)
+
+
+def _sketches_version(stat_key, seasons):
+    return _seasons_version("All Leagues", stat_key, seasons)
+
+
+@ttl_cache(key_func=_level_version)
+def load_table_view(level, stat_key, season_str, league_name=None):
+    df, error = _load_level(level, stat_key, season_str, league_name)
+    if df is None:
+        return None
+    return TableView(df)
+
+
+@ttl_cache(key_func=_level_version)
+def load_row_index(level, stat_key, season_str, league_name=None):
+    df, error = _load_level(level, stat_key, season_str, league_name)
+    if df is None:
+        return None
+    return RowIndex(df)
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_shrunk_leagues(stat_key, season_str):
+    # (frame, reliability): the all-leagues frame row for row as minutes-shrunk per-90 rates,
+    # shrunk once per (stat_type, season) so every league group shares the same priors
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if df_all is None:
+        return None
+    return shrink_frame(df_all)
+
+
+def _build_similarity_index(stat_key, season_str, leagues, shrunk):
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if df_all is None:
+        return None
+    row_weights = None
+    if shrunk:
+        df_all, row_weights = load_shrunk_leagues(stat_key, season_str)
+    rows = load_row_index("All Leagues", stat_key, season_str).league_rows(leagues)
+    with span("similarity.build_index", stat_type=stat_key, season=season_str, leagues=len(leagues),
+              shrunk=shrunk) as s:
+        sim_index = SimilarityIndex(df_all.iloc[rows], row_weights=None if row_weights is None else row_weights[rows])
+        s["rows"] = len(sim_index.df)
+    return sim_index
+
+
+# Two loaders rather than a shrunk flag, so every caller of the raw index shares one cache entry
+@ttl_cache(key_func=_all_leagues_version)
+def load_similarity_index(stat_key, season_str, leagues):
+    return _build_similarity_index(stat_key, season_str, leagues, shrunk=False)
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_shrunk_similarity_index(stat_key, season_str, leagues):
+    # Index over the load_shrunk_leagues() frame, for the "shrunk" metric
+    return _build_similarity_index(stat_key, season_str, leagues, shrunk=True)
+
+
+@ttl_cache(key_func=_group_stats_version)
+def load_group_stats(stat_key, season_str, level="All Leagues"):
+    # {group name: GroupStats} for every league group, built once per (stat_type, season);
+    # level "All Teams" aggregates squads instead of players
+    df_all, error = _load_level(level, stat_key, season_str, None)
+    if df_all is None:
+        return None
+    return build_group_stats(df_all, load_row_index(level, stat_key, season_str))
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_clusters(stat_key, season_str):
+    # Role clusters of the all-leagues frame, fitted once per (stat_type, season);
+    # an offline snapshot carries them precomputed
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if df_all is None:
+        return None
+    snapshot, _ = active_snapshot()
+    if snapshot is not None:
+        frame, error = snapshot.clusters(stat_key, season_str)
+        # Labels are used only if they match the frame's players row for row, else refitted
+        frame = None if frame is None else align_cluster_frame(frame, df_all)
+        if frame is not None:
+            return PlayerClusters.from_frame(frame)
+    return build_clusters(load_similarity_index(stat_key, season_str, tuple(league_id_dict.keys())))
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_player_map(stat_key, season_str, features):
+    # 2-D projection of the all-leagues frame for one feature tuple, shared by every rerun
+    sim_index = load_similarity_index(stat_key, season_str, tuple(league_id_dict.keys()))
+    if sim_index is None:
+        return None
+    return PlayerMap(sim_index, features)
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_scouting_index(stat_key, season_str):
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if df_all is None:
+        return None
+    return ScoutingIndex(df_all, load_group_stats(stat_key, season_str))
+
+
+@ttl_cache(key_func=_all_leagues_version)
+def load_league_sketches(stat_key, season_str):
+    # {league: QuantileSketch} of one season; the unit group and multi-season sketches merge from
+    df_all, error = load_all_leagues(stat_key, season_str)
+    if df_all is None:
+        return None
+    return build_league_sketches(df_all, load_row_index("All Leagues", stat_key, season_str))
+
+
+@ttl_cache(key_func=_sketches_version)
+def load_group_sketches(stat_key, seasons):
+    # {group name: QuantileSketch} over the pooled seasons, merged without re-ranking any rows
+    league_sketch_sets = [s for s in (load_league_sketches(stat_key, season_str) for season_str in seasons) if s]
+    if not league_sketch_sets:
+        return None
+    return build_group_sketches(league_sketch_sets)
+
+
+@ttl_cache(key_func=_team_index_version)
+def load_team_index(stat_key, seasons, leagues):
+    """
+    Similarity index over the squads of the given leagues in one or more seasons.
+    Rows are labelled "Squad (Season)" in a Team column, so one squad can be matched
+    against other squads and against its own other seasons.
+    """
+    frames = []
+    for season_str in seasons:
+        df_teams, error = load_all_team_stats(stat_key, season_str)
+        if df_teams is None:
+            continue
+        rows = load_row_index("All Teams", stat_key, season_str).league_rows(leagues)
+        frames.append(df_teams.iloc[rows].assign(Season=season_str))
+    if not frames:
+        return None
+
+    with span("similarity.build_team_index", stat_type=stat_key, seasons=len(seasons), leagues=len(leagues)) as s:
+        df_teams = pd.concat(frames, ignore_index=True)
+        df_teams["Team"] = df_teams["Squad"].astype(str) + " (" + df_teams["Season"] + ")"
+        team_index = SimilarityIndex(df_teams, id_col="Team")
+        s["rows"] = len(df_teams)
+    return team_index
@@ -0,0 +1,167 @@
+# diagnostics.py
+# Lightweight hot-path instrumentation: timed spans (with bytes fetched, rows parsed, ...)
+# kept in an in-memory ring buffer, plus cache hit/miss counters. Shown on the
+# "Diagnostics" page of app.py and exportable as JSON or Prometheus text.
+import json
+import threading
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+RING_SIZE = 5000
+
+_spans = deque(maxlen=RING_SIZE)
+_cache_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_lock = threading.Lock()
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block of code:
+
+        with span("scraper.fetch", url=url) as s:
+            html = fetch(url)
+            s["bytes"] = len(html)
+    """
+    record = dict(attrs)
+    start_wall = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield record
+    except Exception as e:
+        # Control-flow exceptions (e.g. Streamlit's rerun/stop) derive from BaseException and aren't errors
+        error = type(e).__name__
+        raise
+    finally:
+        record_span(name, (time.perf_counter() - start) * 1000, start=start_wall, error=error, **record)
+
+
+def record_span(name, duration_ms, start=None, error=None, **attrs):
+    # For durations measured elsewhere (e.g. a whole script run)
+    entry = {
+        "name": name,
+        "start": start if start is not None else time.time() - duration_ms / 1000,
+        "duration_ms": duration_ms,
+        "thread": threading.current_thread().name,
+        "attrs": attrs
+    }
+    if error:
+        entry["error"] = error
+    with _lock:
+        _spans.append(entry)
+
+
+def timed(name):
+    # Decorator form of span()
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache_name, hit):
+    with _lock:
+        _cache_stats[cache_name]["hits" if hit else "misses"] += 1
+
+
+def recent_spans(limit=None):
+    with _lock:
+        spans = list(_spans)
+    return spans[-limit:] if limit else spans
+
+
+def cache_stats():
+    with _lock:
+        stats = {k: dict(v) for k, v in _cache_stats.items()}
+    for v in stats.values():
+        total = v["hits"] + v["misses"]
+        v["hit_rate"] = v["hits"] / total if total else 0.0
+    return stats
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def span_summary():
+    # Per span name: count, total/mean/p50/p95/max duration and summed numeric attributes
+    grouped = defaultdict(list)
+    for s in recent_spans():
+        grouped[s["name"]].append(s)
+
+    summary = {}
+    for name, spans in grouped.items():
+        durations = sorted(s["duration_ms"] for s in spans)
+        totals = defaultdict(float)
+        for s in spans:
+            for k, v in s["attrs"].items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    totals[k] += v
+        summary[name] = {
+            "count": len(spans),
+            "errors": sum(1 for s in spans if "error" in s),
+            "total_ms": sum(durations),
+            "mean_ms": sum(durations) / len(durations),
+            "p50_ms": _percentile(durations, 0.5),
+            "p95_ms": _percentile(durations, 0.95),
+            "max_ms": durations[-1],
+            "totals": dict(totals)
+        }
+    return summary
+
+
+def clear():
+    with _lock:
+        _spans.clear()
+        _cache_stats.clear()
+
+
+# --- Export ---
+def export_json(indent=None):
+    return json.dumps({
+        "summary": span_summary(),
+        "cache": cache_stats(),
+        "spans": recent_spans()
+    }, indent=indent, default=str)
+
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def export_prometheus():
+    lines = [
+        "# HELP football_app_span_duration_ms Duration of instrumented spans in the ring buffer",
+        "# TYPE football_app_span_duration_ms summary"
+    ]
+    summary = span_summary()
+    for name, s in sorted(summary.items()):
+        label = _prom_label(name)
+        lines.append(f'football_app_span_duration_ms{{span="{label}",quantile="0.5"}} {s["p50_ms"]:.3f}')
+        lines.append(f'football_app_span_duration_ms{{span="{label}",quantile="0.95"}} {s["p95_ms"]:.3f}')
+        lines.append(f'football_app_span_duration_ms_sum{{span="{label}"}} {s["total_ms"]:.3f}')
+        lines.append(f'football_app_span_duration_ms_count{{span="{label}"}} {s["count"]}')
+
+    lines.append("# HELP football_app_span_attr_total Summed numeric span attributes (bytes, rows, ...)")
+    lines.append("# TYPE football_app_span_attr_total gauge")
+    for name, s in sorted(summary.items()):
+        for attr, total in sorted(s["totals"].items()):
+            lines.append(f'football_app_span_attr_total{{span="{_prom_label(name)}",attr="{_prom_label(attr)}"}} {total:g}')
+
+    lines.append("# HELP football_app_cache_requests_total Cache lookups by result")
+    lines.append("# TYPE football_app_cache_requests_total counter")
+    for cache_name, c in sorted(cache_stats().items()):
+        label = _prom_label(cache_name)
+        lines.append(f'football_app_cache_requests_total{{cache="{label}",result="hit"}} {c["hits"]}')
+        lines.append(f'football_app_cache_requests_total{{cache="{label}",result="miss"}} {c["misses"]}')
+
+    return "\n".join(lines) + "\n"
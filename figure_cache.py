@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from diagnostics import record_cache
+
+FIGURE_CACHE_SIZE = 128
+
+
+class FigureCache:
+    """
+    LRU cache of built Plotly figures keyed by the chart inputs (stat type, season, group,
+    players, features, ...), so a rerun that leaves a chart unchanged reuses its figure.
+    Kept free of Plotly imports so the Diagnostics page can read the stats cheaply.
+    """
+
+    def __init__(self, maxsize=FIGURE_CACHE_SIZE, name="figure"):
+        self.maxsize = maxsize
+        self.name = name
+        self.evictions = 0
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts):
+        # Lists (feature lists) become tuples so the key is hashable
+        return tuple(tuple(p) if isinstance(p, list) else p for p in parts)
+
+    def get(self, key):
+        with self._lock:
+            fig = self._figures.get(key)
+            if fig is not None:
+                self._figures.move_to_end(key)
+        record_cache(self.name, fig is not None)
+        return fig
+
+    def put(self, key, fig):
+        with self._lock:
+            self._figures[key] = fig
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._figures), "maxsize": self.maxsize, "evictions": self.evictions}
+
+    def memoize(self, func):
+        # Adds a cache_key keyword to a figure builder; calls without one always build
+        @wraps(func)
+        def wrapper(*args, cache_key=None, **kwargs):
+            if cache_key is None:
+                return func(*args, **kwargs)
+            key = (func.__name__,) + self.key(*cache_key)
+            fig = self.get(key)
+            if fig is None:
+                fig = func(*args, **kwargs)
+                self.put(key, fig)
+            return fig
+        return wrapper
+
+
+# visuals.plot_radar_comparison
+radar_figures = FigureCache(name="radar_figure")
+# visuals.plot_player_map; each figure holds every player, so fewer are kept
+map_figures = FigureCache(maxsize=16, name="map_figure")
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from league_groups import all_group_names, resolve_league_group
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class GroupStats:
+    """
+    Per-feature aggregates of one league group for one (stat_type, season):
+    mean, median, quantiles and the mean "Top X%" percentile of the group's players,
+    plus a per-column argsort that leaderboards slice.
+    Computed once when the all-leagues frame is cached; radar group traces read from it.
+    """
+
+    def __init__(self, name, leagues, features, X, rows=None):
+        self.name = name
+        self.leagues = list(leagues)
+        self.features = list(features)
+        self.col_pos = {f: i for i, f in enumerate(self.features)}
+        self.count = len(X)
+        # Positions of the group's rows in the source frame, ascending
+        self.rows = np.arange(self.count) if rows is None else np.asarray(rows, dtype=np.int64)
+
+        if self.count:
+            # Column-wise ascending argsort (missing values last) and the column-sorted values;
+            # percentile lookups are searchsorted calls, top-k lists are slices
+            self.order = np.argsort(X, axis=0, kind="stable").astype(np.int32)
+            self.sorted = np.take_along_axis(X, self.order, axis=0)
+            self.valid_count = (~np.isnan(X)).sum(axis=0)
+            self.mean = X.mean(axis=0)
+            self.median = np.median(X, axis=0)
+            self.quantiles = {q: np.quantile(X, q, axis=0) for q in QUANTILES}
+            # Same definition as visuals.true_top_percentile, averaged over the group
+            min_rank = np.column_stack([
+                np.searchsorted(self.sorted[:, j], X[:, j], side="left") + 1 for j in range(X.shape[1])
+            ])
+            self.mean_top_pct = ((1 - min_rank / self.count) * 100).mean(axis=0)
+        else:
+            empty = np.full(len(self.features), np.nan)
+            self.sorted = np.empty((0, len(self.features)))
+            self.order = np.empty((0, len(self.features)), dtype=np.int32)
+            self.valid_count = np.zeros(len(self.features), dtype=np.int64)
+            self.mean = self.median = self.mean_top_pct = empty
+            self.quantiles = {q: empty for q in QUANTILES}
+
+    def values(self, stat, features):
+        # stat: "mean", "median", "mean_top_pct" or a quantile from QUANTILES
+        arr = self.quantiles[stat] if stat in self.quantiles else getattr(self, stat)
+        return [float(arr[self.col_pos[f]]) for f in features]
+
+    def percentile(self, feature, values):
+        # Radar percentile (100 - "Top X%") of values within the group; higher = better
+        min_rank = np.searchsorted(self.sorted[:, self.col_pos[feature]], values, side="left") + 1
+        return min_rank / max(self.count, 1) * 100
+
+    def top_k(self, feature, k=20, ascending=False):
+        # (source frame row positions, values) of the k highest (or lowest) rows, best first
+        j = self.col_pos[feature]
+        n = int(self.valid_count[j])
+        k = max(min(k, n), 0)
+        if ascending:
+            return self.rows[self.order[:k, j]], self.sorted[:k, j]
+        return self.rows[self.order[n - k:n, j][::-1]], self.sorted[n - k:n, j][::-1]
+
+    def ranks(self, feature, values, ascending=False):
+        # 1-based ranks of values among the group's non-missing values; ties share the best rank
+        j = self.col_pos[feature]
+        n = int(self.valid_count[j])
+        col = self.sorted[:n, j]
+        if ascending:
+            return np.searchsorted(col, values, side="left") + 1
+        return n - np.searchsorted(col, values, side="right") + 1
+
+    def rank_of(self, feature, value, ascending=False):
+        # (rank, ranked rows); rank is None for a missing value
+        n = int(self.valid_count[self.col_pos[feature]])
+        if np.isnan(value):
+            return None, n
+        return int(self.ranks(feature, value, ascending)), n
+
+    def summary_frame(self, features=None):
+        features = features or self.features
+        cols = [self.col_pos[f] for f in features]
+        data = {"Mean": self.mean[cols], "Median": self.median[cols]}
+        for q in QUANTILES:
+            data[f"P{int(q * 100)}"] = self.quantiles[q][cols]
+        data["Mean Top %"] = self.mean_top_pct[cols]
+        return pd.DataFrame(data, index=features)
+
+
+def leaderboard(df_all, group_stats, feature, k=20, ascending=False,
+                id_cols=("Player", "Squad", "League", "Pos", "Age")):
+    # Top k rows of df_all in one feature from the group's sorted index
+    rows, values = group_stats.top_k(feature, k, ascending)
+    out = df_all.iloc[rows][[c for c in id_cols if c in df_all.columns]].reset_index(drop=True)
+    out.insert(0, "Rank", group_stats.ranks(feature, values, ascending))
+    out[feature] = values
+    out["Percentile"] = np.round(group_stats.percentile(feature, values), 1)
+    return out
+
+
+def build_group_stats(df_all, row_index):
+    """
+    {group name: GroupStats} for every single league and multi-league group, from one
+    numeric block of the all-leagues frame.
+    """
+    features = df_all.select_dtypes(include="number").columns.tolist()
+    with span("group_stats.build", rows=len(df_all), features=len(features)):
+        X = df_all[features].to_numpy(dtype=float)
+        groups = {}
+        for name in all_group_names():
+            rows = row_index.league_rows(resolve_league_group(name))
+            groups[name] = GroupStats(name, resolve_league_group(name), features, X[rows], rows)
+        return groups
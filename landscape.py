@@ -0,0 +1,52 @@
+import numpy as np
+
+from diagnostics import span
+
+# Wider feature sets use the randomized SVD; narrower ones (every fbref table so far)
+# take the exact eigendecomposition of the small feature covariance
+RANDOMIZED_MIN_FEATURES = 64
+
+
+def randomized_svd(X, k, oversample=10, n_iter=4, seed=0):
+    # Halko et al. range finder: (U, s, Vt) of the top-k singular triplets
+    rng = np.random.default_rng(seed)
+    Y = X @ rng.standard_normal((X.shape[1], k + oversample))
+    for _ in range(n_iter):
+        Y, _ = np.linalg.qr(X @ (X.T @ Y))
+    Q, _ = np.linalg.qr(Y)
+    U_b, s, Vt = np.linalg.svd(Q.T @ X, full_matrices=False)
+    return (Q @ U_b)[:, :k], s[:k], Vt[:k]
+
+
+def principal_axes(X, k=2):
+    # (k x d axes, explained variance ratio of each); X is already centered
+    if X.shape[1] >= RANDOMIZED_MIN_FEATURES:
+        _, s, Vt = randomized_svd(X, k)
+        total = np.einsum("ij,ij->", X, X)
+        return Vt, (s ** 2) / total if total > 0 else np.zeros(k)
+    eigvals, eigvecs = np.linalg.eigh(X.T @ X)
+    top = np.argsort(eigvals)[::-1][:k]
+    total = eigvals.sum()
+    return eigvecs[:, top].T, eigvals[top] / total if total > 0 else np.zeros(k)
+
+
+class PlayerMap:
+    """
+    2-D PCA coordinates of every row of one all-leagues frame for one feature set, from
+    the same normalized rows the similarity search compares. Rows with missing values
+    have NaN coordinates. Built once per (stat_type, season, features) and cached.
+    """
+
+    def __init__(self, sim_index, features):
+        self.features = list(features)
+        Z, rows_ok = sim_index.normalized(self.features)
+        self.coords = np.full((len(Z), 2), np.nan, dtype=np.float32)
+        self.explained = np.zeros(2)
+
+        with span("landscape.project", rows=int(rows_ok.sum()), features=len(self.features)):
+            if rows_ok.sum() >= 2 and len(self.features) >= 2:
+                Zc = Z[rows_ok] - Z[rows_ok].mean(axis=0)
+                axes, self.explained = principal_axes(Zc)
+                # Fix each axis' sign so the map does not flip between rebuilds
+                axes *= np.where(axes[np.arange(len(axes)), np.abs(axes).argmax(axis=1)] < 0, -1.0, 1.0)[:, None]
+                self.coords[rows_ok] = Zc @ axes.T
@@ -0,0 +1,43 @@
+# league_groups.py
+# League groups used for comparisons (radar, similarity, API). Single leagues are groups of one.
+from lookups import league_id_dict
+
+big5_leagues = ["Premier League", "La Liga", "Bundesliga", "Serie A", "Ligue 1"]
+other3_leagues = ["Eredivisie", "Primeira Liga", "Belgian Pro League"]
+all_leagues = list(league_id_dict.keys())
+
+BIG5_GROUP = "Big 5 Leagues"
+OTHER3_GROUP = "Eredivisie/Primeira Liga/Belgian Pro League"
+ALL_GROUP = "All 8 Leagues"
+
+# Multi-league groups, in display order
+fixed_league_groups = {
+    BIG5_GROUP: big5_leagues,
+    OTHER3_GROUP: other3_leagues,
+    ALL_GROUP: all_leagues
+}
+
+# Older labels still found in shared comparison URLs
+legacy_group_names = {
+    "Eredivisie/Primeira Liga/Jupiler": OTHER3_GROUP
+}
+
+
+def comparison_groups(league_name):
+    # Groups shown on the Explorer for a player of league_name: own league first
+    return {league_name: [league_name], **fixed_league_groups}
+
+
+def all_group_names():
+    return all_leagues + list(fixed_league_groups.keys())
+
+
+def canonical_group_name(group_name):
+    return legacy_group_names.get(group_name, group_name)
+
+
+def resolve_league_group(group_name):
+    group_name = canonical_group_name(group_name)
+    if group_name in league_id_dict:
+        return [group_name]
+    return fixed_league_groups.get(group_name)
@@ -0,0 +1,34 @@
+# lookups.py
+# Lookup tables shared by the UI, the API and the scraper. Kept free of third-party
+# imports so app.py can build its sidebar before pandas/scraper are loaded.
+
+# Mapping only for League IDs (this is still needed)
+league_id_dict = {
+    "Premier League": 9,
+    "La Liga": 12,
+    "Bundesliga": 20,
+    "Serie A": 11,
+    "Ligue 1": 13,
+    "Eredivisie": 23,
+    "Primeira Liga": 32,
+    "Belgian Pro League": 37
+}
+
+# Display label → fbref stat key
+stat_type_dict = {
+    "Standard": "standard",
+    "Shooting": "shooting",
+    "Passing": "passing",
+    "Pass Types": "passing_types",
+    "Goal and Shot Creation": "gca",
+    "Defensive Actions": "defense",
+    "Possession": "possession",
+    "Playing Time": "playingtime",
+    "Goalkeeping": "keepers",
+    "Goalkeeping Advanced": "keepersadv"
+}
+
+# Reverse dictionary for converting back lowercase stat_type → display label
+stat_type_reverse_dict = {v: k for k, v in stat_type_dict.items()}
+
+seasons = ["2024-2025", "2023-2024", "2022-2023", "2021-2022"]
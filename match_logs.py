@@ -0,0 +1,265 @@
+# match_logs.py
+# Per-match player logs for form and rolling-window analysis, scraped league by league:
+#
+#   python match_logs.py ingest matchlogs/ --season 2024-2025 --league "Premier League" --interval 3
+#   python match_logs.py form matchlogs/ --season 2024-2025 --league "Premier League"
+#
+# Pages stream through fetch -> parse -> normalize -> append one chunk of players at a time,
+# so memory stays bounded by the chunk size however many seasons and leagues are ingested.
+# Layout (hive partitions, readable with pyarrow.dataset or pandas.read_parquet):
+#   <root>/<log_type>/season=<season>/league=<league>/part-00000.parquet     match rows
+#   <root>/<log_type>_rolling<window>/season=.../league=.../part-00000.parquet rolling means
+# Each part holds whole player-seasons. _progress.json in the partition lists the player
+# links, finished players and committed parts; an interrupted run resumes after the last
+# committed part and parts written after it are discarded.
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+
+from diagnostics import span
+from lookups import league_id_dict
+from scraper import MATCH_LOG_NON_NUMERIC_COLS
+
+CHUNK_PLAYERS = 25
+ROLLING_WINDOW = 5
+LOG_TYPES = ["summary", "passing", "passing_types", "gca", "defense", "possession", "misc"]
+ID_COLS = ["PlayerId", "Player", "Season", "League"]
+
+
+def partition_dir(root, log_type, season_str, league_name, rolling=None):
+    base = log_type if rolling is None else f"{log_type}_rolling{rolling}"
+    return Path(root) / base / f"season={season_str}" / f"league={quote(league_name)}"
+
+
+def load_progress(part_dir):
+    path = part_dir / "_progress.json"
+    if not path.exists():
+        return {"players": None, "done": {}, "failed": {}, "parts": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_progress(part_dir, progress):
+    # Atomic, so a crash leaves either the old or the new progress, never half of it
+    tmp = part_dir / "_progress.json.tmp"
+    tmp.write_text(json.dumps(progress), encoding="utf-8")
+    os.replace(tmp, part_dir / "_progress.json")
+
+
+def _write_part(path, df):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _drop_uncommitted(dirs, progress):
+    # Parts (or temp files) written after the last saved progress belong to no finished player
+    committed = set(progress["parts"])
+    for d in dirs:
+        if d.exists():
+            for path in d.iterdir():
+                if path.name.startswith("part-") and path.name not in committed:
+                    path.unlink()
+
+
+def normalize_match_log(df, player_id, player_name, season_str, league_name):
+    # One column type per name across all parts: text as strings, every stat as float64
+    df = df.copy()
+    for col in df.columns:
+        if col == "Date":
+            continue
+        if col in MATCH_LOG_NON_NUMERIC_COLS:
+            df[col] = df[col].astype("string")
+        else:
+            df[col] = df[col].astype("float64")
+    ids = pd.DataFrame({"PlayerId": player_id, "Player": player_name, "Season": season_str, "League": league_name},
+                       index=df.index).astype("string")
+    return pd.concat([ids, df], axis=1)
+
+
+def rolling_form(logs, window=ROLLING_WINDOW, features=None):
+    """
+    Mean of the last `window` matches per player at every match, for one chunk of logs.
+    Parts hold whole player-seasons, so each chunk is rolled on its own; windows restart
+    at the start of a season.
+    """
+    features = features or [c for c in logs.select_dtypes(include="number").columns]
+    logs = logs.sort_values(["PlayerId", "Date"], kind="stable").reset_index(drop=True)
+    rolled = logs.groupby("PlayerId", sort=False)[features].rolling(window, min_periods=1).mean()
+    rolled = rolled.reset_index(level=0, drop=True).add_suffix(f"_r{window}")
+    keep = ID_COLS + [c for c in ("Date", "Squad", "Opponent", "Comp") if c in logs.columns]
+    return pd.concat([logs[keep], rolled.sort_index()], axis=1)
+
+
+async def _ingest(root, season_str, league_name, log_type, chunk_players, window, max_concurrency,
+                  min_interval, limit=None):
+    from async_scraper import AsyncScraper
+
+    part_dir = partition_dir(root, log_type, season_str, league_name)
+    rolling_dir = partition_dir(root, log_type, season_str, league_name, rolling=window)
+    part_dir.mkdir(parents=True, exist_ok=True)
+    progress = load_progress(part_dir)
+    _drop_uncommitted([part_dir, rolling_dir], progress)
+
+    async with AsyncScraper(max_concurrency=max_concurrency, min_interval=min_interval) as scraper:
+        if progress["players"] is None:
+            links, error = await scraper.get_player_links(season_str, league_name)
+            if error:
+                return None, error
+            progress["players"] = links
+            save_progress(part_dir, progress)
+
+        todo = [p for p in progress["players"] if p[0] not in progress["done"]][:limit]
+        rows = 0
+        for start in range(0, len(todo), chunk_players):
+            chunk = todo[start:start + chunk_players]
+            with span("match_logs.chunk", league=league_name, season=season_str, players=len(chunk)) as s:
+                results = await asyncio.gather(*[scraper.get_match_log(pid, season_str, log_type)
+                                                 for pid, _, _ in chunk])
+                frames, finished = [], []
+                for (pid, name, _), (df, error) in zip(chunk, results):
+                    if df is None:
+                        progress["failed"][pid] = error
+                        continue
+                    frames.append(normalize_match_log(df, pid, name, season_str, league_name))
+                    finished.append(pid)
+
+                part = f"part-{len(progress['parts']):05d}.parquet"
+                if any(len(f) for f in frames):
+                    logs = pd.concat(frames, ignore_index=True)
+                    _write_part(part_dir / part, logs)
+                    _write_part(rolling_dir / part, rolling_form(logs, window))
+                    progress["parts"].append(part)
+                    rows += len(logs)
+                    s["rows"] = len(logs)
+                for pid in finished:
+                    progress["done"][pid] = part
+                    progress["failed"].pop(pid, None)
+                save_progress(part_dir, progress)
+
+    return {"players": len(progress["players"]), "done": len(progress["done"]), "failed": dict(progress["failed"]),
+            "parts": len(progress["parts"]), "rows_written": rows}, None
+
+
+def ingest_match_logs(root, season_str, league_name, log_type="summary", chunk_players=CHUNK_PLAYERS,
+                      window=ROLLING_WINDOW, max_concurrency=2, min_interval=3.0, limit=None):
+    """
+    Scrapes (or resumes) the match logs of every player on the league's standard stats page.
+    Returns (summary, error); players that failed are retried by the next run.
+    """
+    if league_name not in league_id_dict:
+        return None, f"League '{league_name}' not supported."
+    if log_type not in LOG_TYPES:
+        return None, f"Match log type '{log_type}' not supported."
+    return asyncio.run(_ingest(root, season_str, league_name, log_type, chunk_players, window,
+                               max_concurrency, min_interval, limit))
+
+
+# --- Reading ---
+def match_log_dataset(root, log_type="summary", rolling=None):
+    # pyarrow Dataset over every committed part, with season/league partition columns
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    base = Path(root) / (log_type if rolling is None else f"{log_type}_rolling{rolling}")
+    paths = [str(p) for p in sorted(base.glob("season=*/league=*/part-*.parquet"))]
+    if not paths:
+        return None
+    # Players without e.g. xG columns add no columns; unify so every part reads alike.
+    # season/league come from the directory names, so filters on them skip whole partitions.
+    partitions = pa.schema([("season", pa.string()), ("league", pa.string())])
+    schema = pa.unify_schemas([pq.read_schema(p) for p in paths] + [partitions])
+    return ds.dataset(paths, schema=schema, format="parquet", partition_base_dir=str(base),
+                      partitioning=ds.partitioning(partitions, flavor="hive"))
+
+
+def _filter(season_str=None, league_name=None, players=None):
+    import pyarrow.dataset as ds
+
+    expr = None
+    for e in (ds.field("season") == season_str if season_str else None,
+              ds.field("league") == league_name if league_name else None,
+              ds.field("Player").isin(list(players)) if players else None):
+        if e is not None:
+            expr = e if expr is None else expr & e
+    return expr
+
+
+def read_match_logs(root, log_type="summary", season_str=None, league_name=None, players=None,
+                    columns=None, rolling=None):
+    # (df, error); only the requested partitions, players and columns are read
+    dataset = match_log_dataset(root, log_type, rolling)
+    if dataset is None:
+        return None, f"No {log_type} match logs under {root}."
+    table = dataset.to_table(columns=columns, filter=_filter(season_str, league_name, players))
+    return table.to_pandas().drop(columns=["season", "league"], errors="ignore"), None
+
+
+def latest_form(root, log_type="summary", season_str=None, league_name=None, window=ROLLING_WINDOW,
+                batch_size=65536):
+    """
+    Most recent rolling row per player, from a batch-by-batch scan of the rolling parts:
+    memory holds one batch plus one row per player, never the whole history.
+    """
+    dataset = match_log_dataset(root, log_type, rolling=window)
+    if dataset is None:
+        return None, f"No rolling {log_type} match logs under {root}."
+    latest = None
+    with span("match_logs.latest_form", season=season_str, league=league_name):
+        for batch in dataset.to_batches(filter=_filter(season_str, league_name), batch_size=batch_size):
+            df = batch.to_pandas()
+            if latest is not None:
+                df = pd.concat([latest, df], ignore_index=True)
+            latest = df.sort_values("Date", kind="stable").groupby(["PlayerId", "Season"], sort=False).tail(1)
+    if latest is None or latest.empty:
+        return None, "No match logs for this selection."
+    return latest.drop(columns=["season", "league"], errors="ignore").sort_values("Player").reset_index(drop=True), None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest and query fbref player match logs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="scrape or resume match logs (needs fbref access)")
+    ingest.add_argument("root")
+    ingest.add_argument("--season", action="append", required=True, help="season, e.g. 2024-2025 (repeatable)")
+    ingest.add_argument("--league", action="append", help="league (repeatable, default: all 8)")
+    ingest.add_argument("--log-type", default="summary", choices=LOG_TYPES)
+    ingest.add_argument("--chunk", type=int, default=CHUNK_PLAYERS, help="players per stored part")
+    ingest.add_argument("--window", type=int, default=ROLLING_WINDOW, help="rolling window in matches")
+    ingest.add_argument("--concurrency", type=int, default=2, help="concurrent requests")
+    ingest.add_argument("--interval", type=float, default=3.0, help="seconds between request starts")
+    ingest.add_argument("--limit", type=int, default=None, help="at most this many new players per league")
+
+    form = sub.add_parser("form", help="latest rolling form per player")
+    form.add_argument("root")
+    form.add_argument("--season", default=None)
+    form.add_argument("--league", default=None)
+    form.add_argument("--log-type", default="summary", choices=LOG_TYPES)
+    form.add_argument("--window", type=int, default=ROLLING_WINDOW)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        for season_str in args.season:
+            for league_name in args.league or list(league_id_dict.keys()):
+                start = time.perf_counter()
+                summary, error = ingest_match_logs(args.root, season_str, league_name, args.log_type, args.chunk,
+                                                   args.window, args.concurrency, args.interval, args.limit)
+                if error:
+                    print(f"{league_name} {season_str}: {error}")
+                    continue
+                print(f"{league_name} {season_str}: {summary['done']}/{summary['players']} players, "
+                      f"{summary['rows_written']} rows in {time.perf_counter() - start:.0f}s"
+                      + (f", {len(summary['failed'])} failed" if summary["failed"] else ""))
+    else:
+        df, error = latest_form(args.root, args.log_type, args.season, args.league, args.window)
+        if error:
+            raise SystemExit(error)
+        print(df.to_string(index=False))
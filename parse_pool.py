@@ -0,0 +1,196 @@
+# parse_pool.py
+# Parse scraped fbref pages on several cores. BeautifulSoup and pd.read_html are CPU-bound
+# and hold the GIL, so once downloads are concurrent (async_scraper.py) parsing becomes the
+# bottleneck. Workers receive the raw HTML bytes and send back a compact Arrow IPC buffer
+# (or a NumPy block when pyarrow is missing) instead of a pickled DataFrame.
+#
+# Benchmark against in-process parsing on saved pages:
+#   python parse_pool.py fixtures/ --workers 4
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scraper import PAGE_PARSERS, player_table_id
+from lookups import stat_type_reverse_dict
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# --- Table <-> buffer encoding ---
+def encode_table(df):
+    if pa is not None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return ("arrow", sink.getvalue().to_pybytes())
+
+    # NumPy fallback: one contiguous float64 block for the numeric columns,
+    # plain lists for the few text columns (Player, Squad, ...)
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    block = np.ascontiguousarray(df[numeric_cols].to_numpy(dtype=np.float64))
+    return ("numpy", {
+        "columns": df.columns.tolist(),
+        "numeric_cols": numeric_cols,
+        "dtypes": [str(df[c].dtype) for c in numeric_cols],
+        "shape": block.shape,
+        "block": block.tobytes(),
+        "text": {c: df[c].astype(str).tolist() for c in df.columns if c not in numeric_cols}
+    })
+
+
+def decode_table(encoded):
+    kind, payload = encoded
+    if kind == "arrow":
+        with pa.ipc.open_stream(payload) as reader:
+            return reader.read_all().to_pandas()
+
+    block = np.frombuffer(payload["block"], dtype=np.float64).reshape(payload["shape"])
+    cols = {c: block[:, i].astype(dtype) for i, (c, dtype) in enumerate(zip(payload["numeric_cols"], payload["dtypes"]))}
+    cols.update(payload["text"])
+    return pd.DataFrame({c: cols[c] for c in payload["columns"]})
+
+
+def _encode_result(result):
+    df, error = result
+    if error:
+        return None, error
+    return encode_table(df), None
+
+
+def _parse_encoded(kind, args):
+    # Runs in the worker process
+    result = PAGE_PARSERS[kind](*args)
+    if isinstance(result, dict):
+        # "page": {table name: (df, error)}, every table encoded on its own
+        return {name: _encode_result(table) for name, table in result.items()}
+    return _encode_result(result)
+
+
+def _warm_worker():
+    # Import/compile the parsing stack once per worker, not on the first page
+    from bs4 import BeautifulSoup
+    BeautifulSoup("<table><tr><td>0</td></tr></table>", "html.parser")
+
+
+class ParsePool:
+    """
+    Process pool for page parsing. Results come back as (df, error) like the scraper.py
+    parse functions ({table name: (df, error)} for "page"). Can be handed to AsyncScraper(parse_pool=...).
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def submit(self, kind, *args):
+        return self.executor.submit(_parse_encoded, kind, args)
+
+    @staticmethod
+    def result(encoded_result):
+        if isinstance(encoded_result, dict):
+            return {name: ParsePool.result(table) for name, table in encoded_result.items()}
+        encoded, error = encoded_result
+        if error:
+            return None, error
+        return decode_table(encoded), None
+
+    def parse(self, kind, *args):
+        return self.result(self.submit(kind, *args).result())
+
+    def parse_many(self, jobs):
+        # jobs: iterable of (kind, args tuple); results keep the input order
+        futures = [self.submit(kind, *args) for kind, args in jobs]
+        return [self.result(f.result()) for f in futures]
+
+    async def parse_async(self, kind, *args):
+        loop = asyncio.get_running_loop()
+        encoded_result = await loop.run_in_executor(self.executor, _parse_encoded, kind, args)
+        return self.result(encoded_result)
+
+
+# --- Benchmark on offline fixture pages ---
+def detect_stat_type(html):
+    # Longest table ids first so "stats_keeper_adv" wins over "stats_keeper"
+    candidates = sorted(stat_type_reverse_dict, key=lambda s: -len(player_table_id(s)))
+    for stat_type in candidates:
+        if f'id="{player_table_id(stat_type)}"'.encode() in html:
+            return stat_type
+    return None
+
+
+def load_fixture_jobs(fixture_dir):
+    jobs = []
+    for path in sorted(Path(fixture_dir).glob("*.htm*")):
+        html = path.read_bytes()
+        stat_type = detect_stat_type(html)
+        if stat_type is not None:
+            jobs.append(("player", (html, stat_type)))
+        jobs.append(("team", (html, stat_type)))
+    return jobs
+
+
+def benchmark(jobs, workers=None, repeat=1):
+    jobs = list(jobs) * repeat
+
+    start = time.perf_counter()
+    serial = [PAGE_PARSERS[kind](*args) for kind, args in jobs]
+    serial_time = time.perf_counter() - start
+
+    with ParsePool(workers) as pool:
+        pool.parse_many(jobs[:pool.workers])  # spin up and warm every worker first
+        start = time.perf_counter()
+        pooled = pool.parse_many(jobs)
+        pool_time = time.perf_counter() - start
+
+    rows = sum(len(df) for df, _ in serial if df is not None)
+    mismatches = sum(
+        (a is None) != (b is None) or (a is not None and a.shape != b.shape)
+        for (a, _), (b, _) in zip(serial, pooled)
+    )
+    return {
+        "pages": len(jobs),
+        "rows": rows,
+        "workers": pool.workers,
+        "in_process_s": serial_time,
+        "pool_s": pool_time,
+        "speedup": serial_time / pool_time if pool_time > 0 else float("nan"),
+        "mismatches": mismatches
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare process-pool and in-process parsing of saved fbref pages")
+    parser.add_argument("fixture_dir", help="directory of saved fbref stats pages (*.html)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--repeat", type=int, default=1, help="parse every page this many times")
+    args = parser.parse_args()
+
+    jobs = load_fixture_jobs(args.fixture_dir)
+    if not jobs:
+        raise SystemExit(f"No fixture pages found in {args.fixture_dir}")
+
+    result = benchmark(jobs, args.workers, args.repeat)
+    print(f"{result['pages']} parse jobs, {result['rows']} player rows")
+    print(f"in-process: {result['in_process_s']:.2f}s")
+    print(f"pool ({result['workers']} workers): {result['pool_s']:.2f}s")
+    print(f"speedup: {result['speedup']:.2f}x")
+    if result["mismatches"]:
+        print(f"WARNING: {result['mismatches']} results differ between in-process and pool parsing")
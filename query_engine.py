@@ -0,0 +1,139 @@
+# query_engine.py
+# Scouting search over the all-leagues frame: "age <= 23, Pos contains MF, above the 80th
+# percentile in PrgP and TklW, Big 5 Leagues" as one vectorized mask.
+#
+#   python query_engine.py      (benchmark on synthetic frames)
+import time
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from league_groups import resolve_league_group
+
+POSITIONS = ["GK", "DF", "MF", "FW"]
+
+
+def parse_age(age):
+    # fbref "years-days" ("23-145") -> 23.4 years; bare years and blanks work too
+    parts = pd.Series(age, dtype="string").str.split("-", n=1, expand=True)
+    years = pd.to_numeric(parts[0], errors="coerce")
+    days = pd.to_numeric(parts[1], errors="coerce").fillna(0) if parts.shape[1] > 1 else 0
+    return (years + days / 365.25).to_numpy(dtype=float)
+
+
+class ScoutingIndex:
+    """
+    Column blocks of one all-leagues frame laid out for compound filters: numeric Age,
+    one boolean array per position and, per league group, the group's rows (GroupStats.rows,
+    contiguous league blocks) with a matrix of each player's percentile within the
+    group (same ranks as the radar charts).
+    Built once with the cached frame; a search is a handful of array comparisons.
+    """
+
+    def __init__(self, df_all, group_stats):
+        with span("query_engine.build", rows=len(df_all)):
+            self.df = df_all.reset_index(drop=True)
+            self.n_rows = len(self.df)
+            self.age = parse_age(self.df["Age"]) if "Age" in self.df.columns else np.full(self.n_rows, np.nan)
+            pos = self.df["Pos"].astype(str) if "Pos" in self.df.columns else pd.Series([""] * self.n_rows)
+            self.pos_masks = {p: pos.str.contains(p, regex=False).to_numpy() for p in POSITIONS}
+
+            self.features = next(iter(group_stats.values())).features if group_stats else []
+            self.col_pos = {f: i for i, f in enumerate(self.features)}
+            X = self.df[self.features].to_numpy(dtype=float)
+            # group -> (rows, float32 percentile matrix of those rows, 0-100, higher = better)
+            self.percentiles = {}
+            for name, stats in group_stats.items():
+                P = np.column_stack([stats.percentile(f, X[stats.rows, j]) for j, f in enumerate(self.features)])
+                self.percentiles[name] = (stats.rows, P.astype(np.float32).reshape(len(stats.rows), -1))
+
+    def search(self, group="All 8 Leagues", positions=None, age_min=None, age_max=None, thresholds=None):
+        """
+        Row positions (of the all-leagues frame) matching every predicate, best first by
+        mean percentile over the thresholded features, plus that percentile block.
+        positions: any of POSITIONS ("MF" matches "DF,MF"); thresholds: {feature: min percentile}.
+        """
+        thresholds = thresholds or {}
+        rows, P = self.percentiles[group]
+        with span("query_engine.search", group=group, predicates=len(thresholds)) as s:
+            keep = np.ones(len(rows), dtype=bool)
+            if positions:
+                keep &= np.logical_or.reduce([self.pos_masks[p] for p in positions])[rows]
+            age = self.age[rows]
+            if age_min is not None:
+                keep &= age >= age_min
+            if age_max is not None:
+                keep &= age < age_max + 1  # "age <= 23" includes 23 years and 364 days
+            cols = [self.col_pos[f] for f in thresholds]
+            if cols:
+                keep &= (P[:, cols] >= np.array(list(thresholds.values()), dtype=np.float32)).all(axis=1)
+
+            hits = np.flatnonzero(keep)
+            if cols:
+                hits = hits[np.argsort(-P[np.ix_(hits, cols)].mean(axis=1), kind="stable")]
+            s["rows"] = len(hits)
+        return rows[hits], P[hits]
+
+    def results_frame(self, found_rows, found_percentiles, features, id_cols=("Player", "Squad", "League", "Pos")):
+        out = self.df.iloc[found_rows][[c for c in id_cols if c in self.df.columns]].reset_index(drop=True)
+        out.insert(len(out.columns), "Age", np.floor(self.age[found_rows]))
+        for f in features:
+            out[f"{f} pct"] = found_percentiles[:, self.col_pos[f]].astype(float).round(1)
+        return out
+
+
+def _naive_search(df, leagues, positions, age_max, thresholds):
+    # Row-wise pandas equivalent, for the benchmark only
+    group = df[df["League"].isin(leagues)]
+    pct = group[list(thresholds)].rank(method="min") / len(group) * 100
+    age = group["Age"].apply(lambda a: int(a.split("-")[0]) + int(a.split("-")[1]) / 365.25)
+    mask = group["Pos"].apply(lambda p: any(x in p for x in positions)) & (age < age_max + 1)
+    for f, t in thresholds.items():
+        mask &= pct[f] >= t
+    return group.index[mask]
+
+
+def benchmark_query(n_rows=(3000, 12000, 48000), n_features=20, repeat=20, seed=0):
+    """
+    Build time and per-search time of ScoutingIndex against the same filter written
+    with pandas row operations, on synthetic all-leagues frames.
+    """
+    from group_stats import build_group_stats
+    from row_index import RowIndex
+    from lookups import league_id_dict
+
+    rng = np.random.default_rng(seed)
+    leagues = list(league_id_dict.keys())
+    features = [f"f{i}" for i in range(n_features)]
+    rows = []
+    for n in n_rows:
+        df = pd.DataFrame(rng.gamma(2.0, 2.0, size=(n, n_features)), columns=features)
+        df.insert(0, "Player", [f"P{i}" for i in range(n)])
+        df.insert(1, "Pos", rng.choice(["GK", "DF", "MF", "FW", "DF,MF", "MF,FW"], n))
+        df.insert(2, "Age", [f"{a}-{d:03d}" for a, d in zip(rng.integers(17, 38, n), rng.integers(0, 365, n))])
+        df["League"] = np.repeat(leagues, -(-n // len(leagues)))[:n]
+
+        start = time.perf_counter()
+        index = ScoutingIndex(df, build_group_stats(df, RowIndex(df)))
+        build = time.perf_counter() - start
+
+        thresholds = {"f1": 80.0, "f2": 70.0}
+        big5 = resolve_league_group("Big 5 Leagues")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            found, _ = index.search("Big 5 Leagues", ["MF"], age_max=23, thresholds=thresholds)
+        vectorized = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(max(repeat // 5, 1)):
+            naive = _naive_search(df, big5, ["MF"], 23, thresholds)
+        pandas_ms = (time.perf_counter() - start) / max(repeat // 5, 1)
+
+        assert set(found) == set(naive)
+        rows.append({"rows": n, "matches": len(found), "build_ms": build * 1e3,
+                     "search_ms": vectorized * 1e3, "pandas_ms": pandas_ms * 1e3})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    print(benchmark_query().round(2).to_string(index=False))
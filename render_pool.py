@@ -0,0 +1,171 @@
+# render_pool.py
+# Static PNG/SVG export of Plotly figures (radar charts) for reports and dashboards.
+# Each fig.write_image() call used to start its own Kaleido/Chrome process. Here a few worker
+# processes start one renderer each and keep it warm, figures are converted in batches, and
+# every image is stored on disk under a hash of what it shows (player, features, group, season,
+# source data, ...) so repeated exports are file reads. The cache is pruned to a size and age limit.
+#
+# Needs the optional kaleido package (pip install kaleido; Kaleido 1.x also needs Chrome,
+# see `plotly_get_chrome`).
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+from pathlib import Path
+
+from diagnostics import record_cache, span
+
+IMAGE_FORMATS = ["png", "svg"]
+RENDER_CACHE_DIR = os.environ.get("FOOTBALL_RENDER_CACHE", ".render_cache")
+RENDER_CACHE_MAX_MB = int(os.environ.get("FOOTBALL_RENDER_CACHE_MB", 500))
+RENDER_CACHE_MAX_DAYS = int(os.environ.get("FOOTBALL_RENDER_CACHE_DAYS", 30))
+BATCH_SIZE = 16
+
+
+def render_key(player, features, group, season, stat_type=None, compare=None, data=None,
+               fmt="png", width=None, height=None, scale=None):
+    # Everything that changes the picture; the hash is the cache file name.
+    # data: fingerprint of the table the figure is drawn from, so rescraped numbers get new images
+    parts = {
+        "player": player, "features": list(features), "group": group, "season": season,
+        "stat_type": stat_type, "compare": compare, "data": data, "fmt": fmt,
+        "width": width, "height": height, "scale": scale
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def renderer_error():
+    # None when images can be rendered, otherwise why not. Kaleido 1.x drives a local Chrome
+    # and waits for one indefinitely, so check before starting any worker.
+    if find_spec("kaleido") is None:
+        return "Static image export needs the kaleido package (pip install kaleido)."
+    try:
+        from choreographer.browsers.chromium import Chromium
+        if Chromium.find_browser(skip_local=False) is None:
+            return "Kaleido found no Chrome/Chromium; install one or run plotly_get_chrome."
+    except (ImportError, TypeError):
+        pass  # Kaleido 0.x ships its own renderer
+    return None
+
+
+def _start_renderer():
+    # Runs once per worker: start a persistent headless browser that every batch reuses
+    import kaleido
+    import plotly.io  # noqa: F401
+    if hasattr(kaleido, "start_sync_server"):
+        kaleido.start_sync_server(silence_warnings=True)
+
+
+def _render_batch(figures, paths, fmt, width, height, scale):
+    # Runs in the worker; writes next to the target and renames so readers never see partial files
+    import plotly.io as pio
+
+    tmp_paths = [f"{p}.{os.getpid()}.tmp" for p in paths]
+    pio.write_images(figures, tmp_paths, format=fmt, width=width, height=height, scale=scale)
+    for tmp, path in zip(tmp_paths, paths):
+        os.replace(tmp, path)
+    return len(paths)
+
+
+class RenderPool:
+    """
+    Warm renderer processes plus a disk cache of rendered images.
+    render_many() takes (key_parts, figure) jobs; figure may be a callable so cached
+    images never build their figure at all. After each call the cache is pruned to
+    max_mb, least recently used first, and images unused for max_days are removed.
+    """
+
+    def __init__(self, workers=2, cache_dir=RENDER_CACHE_DIR, batch_size=BATCH_SIZE,
+                 width=700, height=600, scale=2, max_mb=RENDER_CACHE_MAX_MB, max_days=RENDER_CACHE_MAX_DAYS):
+        error = renderer_error()
+        if error:
+            raise RuntimeError(error)
+        self.workers = workers
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.width, self.height, self.scale = width, height, scale
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age = max_days * 86400
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_start_renderer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def cache_path(self, key_parts, fmt="png"):
+        key = render_key(**key_parts, fmt=fmt, width=self.width, height=self.height, scale=self.scale)
+        return self.cache_dir / f"{key}.{fmt}"
+
+    def prune_cache(self, keep=()):
+        # Drop images older than max_age, then the least recently used until under max_bytes;
+        # keep: paths just returned to the caller
+        keep = set(keep)
+        now = time.time()
+        files = []
+        for path in self.cache_dir.iterdir():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # removed by another process
+            if path.suffix.lstrip(".") in IMAGE_FORMATS:
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if path in keep or (total <= self.max_bytes and now - mtime <= self.max_age):
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    @staticmethod
+    def _figure_json(figure):
+        figure = figure() if callable(figure) else figure
+        return figure if isinstance(figure, dict) else figure.to_plotly_json()
+
+    def render_many(self, jobs, fmt="png"):
+        """
+        jobs: iterable of (key_parts, figure) pairs. key_parts are the render_key() arguments;
+        figure is a plotly Figure, its dict, or a zero-argument callable returning either, which
+        is called only when the image is not cached. Returns the cached image paths in job order.
+        """
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format '{fmt}'")
+
+        jobs = list(jobs)
+        paths = [self.cache_path(key_parts, fmt) for key_parts, _ in jobs]
+        misses = {}
+        for path, (_, figure) in zip(paths, jobs):
+            hit = path.exists()
+            record_cache("render_image", hit)
+            if hit:
+                os.utime(path)  # mark as recently used for prune_cache()
+            if not hit and path not in misses:
+                misses[path] = figure
+
+        with span("render.images", images=len(jobs), rendered=len(misses), fmt=fmt):
+            pending = list(misses.items())
+            futures = []
+            for i in range(0, len(pending), self.batch_size):
+                batch = pending[i:i + self.batch_size]
+                figures = [self._figure_json(fig) for _, fig in batch]
+                futures.append(self.executor.submit(
+                    _render_batch, figures, [str(p) for p, _ in batch], fmt, self.width, self.height, self.scale))
+            for future in futures:
+                future.result()
+        self.prune_cache(keep=paths)
+        return paths
+
+    def render(self, key_parts, figure, fmt="png"):
+        # Image bytes for one figure
+        return self.render_many([(key_parts, figure)], fmt)[0].read_bytes()
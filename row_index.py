@@ -0,0 +1,79 @@
+import numpy as np
+
+from diagnostics import span
+
+
+class RowIndex:
+    """
+    Grouped row positions of one cached frame, built once when the frame is cached:
+    Squad → positions, Player → positions, League → contiguous (start, stop) ranges.
+    Dropdown options and row subsets then cost O(result) instead of a full boolean scan.
+    """
+
+    def __init__(self, df):
+        with span("row_index.build", rows=len(df)):
+            self.n_rows = len(df)
+            self._by_squad = self._group(df, "Squad")
+            self._by_player = self._group(df, "Player")
+            self.squads = sorted(self._by_squad)
+            self.players = sorted(self._by_player)
+            self._players_by_squad = {}
+            self._player_at = None
+            self._league_ranges = self._ranges(df, "League")
+
+    @staticmethod
+    def _group(df, col):
+        if col not in df.columns:
+            return {}
+        return {key: np.asarray(pos, dtype=np.int64) for key, pos in df.groupby(col, sort=False).indices.items()}
+
+    @staticmethod
+    def _ranges(df, col):
+        # build_all_leagues_df concatenates league by league, so every league is one
+        # contiguous block; anything else falls back to explicit positions
+        if col not in df.columns:
+            return {}
+        ranges = {}
+        for key, pos in df.groupby(col, sort=False).indices.items():
+            if len(pos) and pos[-1] - pos[0] + 1 == len(pos):
+                ranges[key] = (int(pos[0]), int(pos[-1]) + 1)
+            else:
+                ranges[key] = np.asarray(pos, dtype=np.int64)
+        return ranges
+
+    # --- Option lists ---
+    def players_in_squad(self, squad):
+        players = self._players_by_squad.get(squad)
+        if players is None:
+            players = sorted(set(self._player_names(self.squad_rows(squad))))
+            self._players_by_squad[squad] = players
+        return players
+
+    def _player_names(self, rows):
+        # Reverse lookup without touching the frame: position → player
+        if self._player_at is None:
+            self._player_at = np.empty(self.n_rows, dtype=object)
+            for name, pos in self._by_player.items():
+                self._player_at[pos] = name
+        return self._player_at[rows]
+
+    # --- Row subsets ---
+    def squad_rows(self, squad):
+        return self._by_squad.get(squad, np.empty(0, dtype=np.int64))
+
+    def player_rows(self, player, within=None):
+        rows = self._by_player.get(player, np.empty(0, dtype=np.int64))
+        if within is not None:
+            rows = rows[np.isin(rows, within, assume_unique=True)]
+        return rows
+
+    def league_rows(self, leagues):
+        parts = []
+        for league in leagues:
+            r = self._league_ranges.get(league)
+            if r is None:
+                continue
+            parts.append(np.arange(*r, dtype=np.int64) if isinstance(r, tuple) else r)
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]
@@ -1,64 +1,160 @@
+import hashlib
+import os
 from urllib.request import Request, urlopen
 from bs4 import BeautifulSoup, Comment
 import pandas as pd
 from io import StringIO
-
-# Mapping only for League IDs (this is still needed)
-league_id_dict = {
-    "Premier League": 9,
-    "La Liga": 12,
-    "Bundesliga": 20,
-    "Serie A": 11,
-    "Ligue 1": 13,
-    "Eredivisie": 23,
-    "Primeira Liga": 32,
-    "Belgian Pro League": 37
+from diagnostics import span
+from lookups import league_id_dict
+from snapshot import active_snapshot
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+PLAYER_NON_NUMERIC_COLS = {"Player", "Nation", "Pos", "Squad", "Age", "Born"}
+TEAM_NON_NUMERIC_COLS = {"Squad", "Country"}
+MATCH_LOG_NON_NUMERIC_COLS = {"Date", "Day", "Comp", "Round", "Venue", "Result", "Squad", "Opponent",
+                              "Start", "Pos", "Match Report"}
+# Match log pages per player: summary, passing, passing_types, gca, defense, possession, misc
+MATCH_LOG_TABLE_ID = "matchlogs_all"
+
+# Eligibility cutoff: players below either count are dropped at scrape time. Lower it
+# ($FOOTBALL_MIN_MATCHES / $FOOTBALL_MIN_MINUTES) to keep fringe players; the minutes-shrunk
+# similarity metric discounts their small samples instead of discarding them
+MIN_MATCHES = int(os.environ.get("FOOTBALL_MIN_MATCHES", 5))
+MIN_MINUTES = int(os.environ.get("FOOTBALL_MIN_MINUTES", 150))
+
+# Columns the app cannot work without, by table kind; filter_eligible needs the playing time pair
+PLAYING_TIME_COLS = {"Playing Time_MP", "Playing Time_Min"}
+REQUIRED_COLUMNS = {
+    "player": {"Player", "Squad", "Pos"},
+    "standard": {"Player"} | PLAYING_TIME_COLS,
+    "team": {"Squad"},
+    "opponent": {"Squad"}
 }
 
-# Function to extract player stats
-def get_fbref_stats(stat_type, season_str, league_name):
+# (table kind, stat_type, source) -> last seen header fingerprint, to report layout changes.
+# source is (league, season) or the page URL: leagues legitimately differ (e.g. no xG columns)
+_seen_schemas = {}
+
+# --- URLs and table ids ---
+def build_stats_url(stat_type, season_str, league_name):
     league_id = league_id_dict[league_name]
     league_name_url = league_name.replace(" ", "-")
-
     url_stat_type = "stats" if stat_type == "standard" else stat_type
-    url = f"https://fbref.com/en/comps/{league_id}/{season_str}/{url_stat_type}/{season_str}-{league_name_url}-Stats"
+    return f"https://fbref.com/en/comps/{league_id}/{season_str}/{url_stat_type}/{season_str}-{league_name_url}-Stats"
 
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(url, headers=headers)
+def build_team_stats_url(stat_type, season_str, league_name):
+    league_id = league_id_dict[league_name]
+    league_name_url = league_name.replace(" ", "-")
+    stat_suffix = stat_type
+    return f"https://fbref.com/en/comps/{league_id}/{season_str}/{stat_suffix}/{season_str}-{league_name_url}-Stats"
 
-    try:
-        html = urlopen(req)
-        soup = BeautifulSoup(html, 'html.parser')
-    except Exception as e:
-        return None, f"Error loading page: {e}"
+def build_match_log_url(player_id, season_str, log_type="summary"):
+    return f"https://fbref.com/en/players/{player_id}/matchlogs/{season_str}/{log_type}/"
 
+def player_table_id(stat_type):
     # Determine table ID based on stat_type
-    table_id = {
+    return {
         "playingtime": "stats_playing_time",
         "keepers": "stats_keeper",
         "keepersadv": "stats_keeper_adv"
     }.get(stat_type, "stats_standard" if stat_type == "standard" else f"stats_{stat_type}")
 
-    def find_table_in_comments(soup, table_id):
-        table = soup.find("table", {"id": table_id})
+def eligibility_source(stat_type, season_str, league_name):
+    # Page/table holding "Playing Time_MP" and "Playing Time_Min" for stat types that lack them.
+    # None means the table itself carries the playing time columns.
+    if stat_type in ("standard", "keepers"):
+        return None
+    if stat_type == "keepersadv":
+        return build_stats_url("keepers", season_str, league_name), "stats_keeper"
+    return build_stats_url("standard", season_str, league_name), "stats_standard"
+
+# --- Fetching ---
+def fetch_html(url):
+    req = Request(url, headers=HEADERS)
+    with span("scraper.fetch", url=url) as s:
+        with urlopen(req) as response:
+            html = response.read()
+        s["bytes"] = len(html)
+    return html
+
+# --- Parsing (pure functions of the page bytes, shared with async_scraper.py) ---
+def find_table_in_comments(soup, table_id):
+    table = soup.find("table", {"id": table_id})
+    if table:
+        return table
+    comments = soup.find_all(string=lambda text: isinstance(text, Comment))
+    for comment in comments:
+        if table_id not in comment:
+            continue
+        comment_soup = BeautifulSoup(comment, "html.parser")
+        table = comment_soup.find("table", {"id": table_id})
         if table:
             return table
-        comments = soup.find_all(string=lambda text: isinstance(text, Comment))
-        for comment in comments:
-            comment_soup = BeautifulSoup(comment, "html.parser")
-            table = comment_soup.find("table", {"id": table_id})
-            if table:
-                return table
-        return None
-
-    table_html = find_table_in_comments(soup, table_id)
-
-    try:
-        df = pd.read_html(StringIO(str(table_html)), flavor='lxml')[0]
-    except Exception as e:
-        return None, f"Error parsing table HTML: {e}"
+    return None
 
-    df = df[df[df.columns[0]] != df.columns[0]]
+def find_table_by_caption(soup, caption_startswith="Squad"):
+    for table in soup.find_all("table"):
+        caption = table.find("caption")
+        if caption and caption.text.strip().startswith(caption_startswith):
+            return table
+    comments = soup.find_all(string=lambda text: isinstance(text, Comment))
+    for comment in comments:
+        comment_soup = BeautifulSoup(comment, "html.parser")
+        for table in comment_soup.find_all("table"):
+            caption = table.find("caption")
+            if caption and caption.text.strip().startswith(caption_startswith):
+                return table
+    return None
+
+# --- Table layout (schema) fingerprints ---
+def header_columns(table_html):
+    # Flattened column names from the <thead> rows alone, same naming rules as table_to_df
+    thead = table_html.find("thead")
+    rows = thead.find_all("tr") if thead is not None else table_html.find_all("tr", limit=1)
+    levels = []
+    for tr in rows:
+        cells = []
+        for th in tr.find_all(["th", "td"]):
+            cells.extend([th.get_text(strip=True)] * int(th.get("colspan") or 1))
+        levels.append(cells)
+    if not levels:
+        return []
+    bottom = levels[-1]
+    if len(levels) == 1:
+        return bottom
+    top = levels[0] + [""] * (len(bottom) - len(levels[0]))
+    return [b if not t or t == b else f"{t}_{b}" for t, b in zip(top, bottom)]
+
+def schema_fingerprint(columns):
+    return hashlib.sha1("\x1f".join(map(str, columns)).encode("utf-8")).hexdigest()[:12]
+
+def check_layout(kind, stat_type, columns, span_attrs, source=None):
+    # Runs before the full parse: rejects layouts missing required columns and reports, as span
+    # attributes, a header that changed since the last scrape of the same page. This is the
+    # fingerprint of the raw header row; data.py keys its indexes on the loaded frame's columns.
+    fingerprint = schema_fingerprint(columns)
+    span_attrs["header_schema"] = fingerprint
+    key = (kind, stat_type, source)
+    previous = _seen_schemas.get(key)
+    if previous is not None and previous != fingerprint:
+        span_attrs["header_schema_changed"] = True
+        span_attrs["previous_header_schema"] = previous
+    _seen_schemas[key] = fingerprint
+
+    required = REQUIRED_COLUMNS[kind] | (PLAYING_TIME_COLS if kind == "player" and stat_type in ("standard", "keepers") else set())
+    missing = sorted(required - set(columns))
+    if missing:
+        return f"Unsupported table layout {fingerprint}: missing columns {', '.join(missing)}"
+    return None
+
+def table_to_df(table_html, non_numeric_cols):
+    df = pd.read_html(StringIO(str(table_html)), flavor='lxml')[0]
+
+    # Drop repeated header rows and flatten the two-level header
+    first_col = df.columns[0]
+    header_label = first_col[-1] if isinstance(first_col, tuple) else first_col
+    df = df[df[first_col].astype(str) != str(header_label)]
     df.reset_index(drop=True, inplace=True)
     df.columns = [
         col[1] if col[0].startswith('Unnamed') or col[0] == col[1]
@@ -66,143 +162,293 @@ def get_fbref_stats(stat_type, season_str, league_name):
         for col in df.columns
     ]
 
-    df.drop(columns=[c for c in df.columns if c.lower() in ['rk', 'matches']], inplace=True, errors='ignore')
-
-    non_numeric_cols = {"Player", "Nation", "Pos", "Squad", "Age", "Born"}
     for col in df.columns:
         if col not in non_numeric_cols:
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
 
-    df.fillna(0, inplace=True)
+def _player_df(table_html, stat_type, span_attrs, source=None):
+    if table_html is None:
+        return None, f"Error parsing table HTML: table '{player_table_id(stat_type)}' not found"
 
-    # Apply filter using standard stats (if not already standard)
-    if stat_type != "standard":
-        if stat_type == "keepersadv":
-            std_url = f"https://fbref.com/en/comps/{league_id}/{season_str}/keepers/{season_str}-{league_name_url}-Stats"
-            std_table_id = "stats_keeper"
-        elif stat_type == "keepers":
-            std_url = url  # already loaded
-            std_table_id = "stats_keeper"
-        else:
-            std_url = f"https://fbref.com/en/comps/{league_id}/{season_str}/stats/{season_str}-{league_name_url}-Stats"
-            std_table_id = "stats_standard"
-
-        if stat_type != "keepers":
-            req_std = Request(std_url, headers=headers)
-            try:
-                html_std = urlopen(req_std)
-                soup_std = BeautifulSoup(html_std, 'html.parser')
-            except Exception as e:
-                return None, f"Error loading standard stats page: {e}"
-
-            std_table_html = None
-            for comment in soup_std.find_all(string=lambda text: isinstance(text, Comment)):
-                if std_table_id in comment:
-                    comment_soup = BeautifulSoup(comment, 'html.parser')
-                    std_table_html = comment_soup.find("table", {"id": std_table_id})
-                    if std_table_html:
-                        break
-
-            if std_table_html is None:
-                return None, f"Standard stats table not found at {std_url}"
-
-            try:
-                std_df = pd.read_html(StringIO(str(std_table_html)), flavor='lxml')[0]
-            except Exception as e:
-                return None, f"Error parsing standard stats table: {e}"
-
-            std_df = std_df[std_df[std_df.columns[0]] != std_df.columns[0]]
-            std_df.reset_index(drop=True, inplace=True)
-            std_df.columns = [
-                col[1] if col[0].startswith('Unnamed') or col[0] == col[1]
-                else f"{col[0]}_{col[1]}"
-                for col in std_df.columns
-            ]
-            for col in std_df.columns:
-                if col not in non_numeric_cols:
-                    std_df[col] = pd.to_numeric(std_df[col], errors='coerce').fillna(0)
-
-            valid_players = std_df[(std_df["Playing Time_MP"] >= 5) &
-                                   (std_df["Playing Time_Min"] >= 150)]["Player"]
-            df = df[df["Player"].isin(valid_players)].reset_index(drop=True)
-        else:
-            df = df[(df["Playing Time_MP"] >= 5) & (df["Playing Time_Min"] >= 150)].reset_index(drop=True)
-    else:
-        df = df[(df["Playing Time_MP"] >= 5) & (df["Playing Time_Min"] >= 150)].reset_index(drop=True)
+    error = check_layout("player", stat_type, header_columns(table_html), span_attrs, source)
+    if error:
+        return None, error
 
+    try:
+        df = table_to_df(table_html, PLAYER_NON_NUMERIC_COLS)
+    except Exception as e:
+        return None, f"Error parsing table HTML: {e}"
+
+    df.drop(columns=[c for c in df.columns if c.lower() in ['rk', 'matches']], inplace=True, errors='ignore')
+    df.fillna(0, inplace=True)
+    span_attrs["rows"] = len(df)
     return df, None
 
-# Team-level scraping
-def get_fbref_team_stats(stat_type, season_str, league_name):
-    league_id = league_id_dict[league_name]
-    league_name_url = league_name.replace(" ", "-")
-    stat_suffix = stat_type
-    url = f"https://fbref.com/en/comps/{league_id}/{season_str}/{stat_suffix}/{season_str}-{league_name_url}-Stats"
+def _team_df(table_html, stat_type, span_attrs, kind="team", source=None):
+    # kind: "team" (Squad table) or "opponent" (Opponent table, squads prefixed "vs ")
+    if table_html is None:
+        return None, f"No {kind}-level table found for stat type '{stat_type}'"
 
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    req = Request(url, headers=headers)
+    error = check_layout(kind, stat_type, header_columns(table_html), span_attrs, source)
+    if error:
+        return None, error
 
     try:
-        html = urlopen(req)
-        soup = BeautifulSoup(html, 'html.parser')
+        df = table_to_df(table_html, TEAM_NON_NUMERIC_COLS)
     except Exception as e:
-        return None, f"Error loading team stats page: {e}"
+        return None, f"Error parsing table HTML: {e}"
+
+    df.fillna(0, inplace=True)
+    span_attrs["rows"] = len(df)
+    return df, None
 
-    def find_table_by_caption(soup, caption_startswith="Squad"):
+def parse_player_table(html, stat_type, source=None):
+    # source: (league, season) of the page, for layout change reports
+    with span("scraper.parse", table="player", stat_type=stat_type) as s:
+        soup = BeautifulSoup(html, 'html.parser')
+        return _player_df(find_table_in_comments(soup, player_table_id(stat_type)), stat_type, s, source)
+
+def parse_standard_table(html, std_table_id, std_url):
+    with span("scraper.parse", table=std_table_id) as s:
+        soup = BeautifulSoup(html, 'html.parser')
+        std_table_html = find_table_in_comments(soup, std_table_id)
+        if std_table_html is None:
+            return None, f"Standard stats table not found at {std_url}"
+
+        error = check_layout("standard", std_table_id, header_columns(std_table_html), s, std_url)
+        if error:
+            return None, error
+
+        try:
+            std_df = table_to_df(std_table_html, PLAYER_NON_NUMERIC_COLS)
+        except Exception as e:
+            return None, f"Error parsing standard stats table: {e}"
+        s["rows"] = len(std_df)
+    return std_df, None
+
+def parse_team_table(html, stat_type=None, source=None):
+    with span("scraper.parse", table="team", stat_type=stat_type) as s:
+        soup = BeautifulSoup(html, 'html.parser')
+        return _team_df(find_table_by_caption(soup), stat_type, s, source=source)
+
+def page_soups(html):
+    # The page plus each commented-out block holding a table (fbref hides most tables in
+    # comments), every one parsed once
+    soup = BeautifulSoup(html, 'html.parser')
+    comments = soup.find_all(string=lambda text: isinstance(text, Comment) and "<table" in text)
+    return [soup] + [BeautifulSoup(comment, "html.parser") for comment in comments]
+
+def find_table(soups, table_id=None, caption_startswith=None):
+    # Same search order as find_table_in_comments / find_table_by_caption
+    for soup in soups:
+        if table_id is not None:
+            table = soup.find("table", {"id": table_id})
+            if table:
+                return table
+            continue
         for table in soup.find_all("table"):
             caption = table.find("caption")
             if caption and caption.text.strip().startswith(caption_startswith):
                 return table
-        comments = soup.find_all(string=lambda text: isinstance(text, Comment))
-        for comment in comments:
-            comment_soup = BeautifulSoup(comment, "html.parser")
-            for table in comment_soup.find_all("table"):
-                caption = table.find("caption")
-                if caption and caption.text.strip().startswith(caption_startswith):
-                    return table
-        return None
+    return None
+
+def parse_page_tables(html, stat_type, source=None):
+    """
+    Player, squad and opponent tables of one stats page from a single HTML parse.
+    Returns {"player": (df, error), "team": (df, error), "opponent": (df, error)}.
+    """
+    with span("scraper.parse", table="page", stat_type=stat_type) as s:
+        soups = page_soups(html)
+        team_attrs, opponent_attrs = {}, {}
+        tables = {
+            "player": _player_df(find_table(soups, table_id=player_table_id(stat_type)), stat_type, s, source),
+            "team": _team_df(find_table(soups, caption_startswith="Squad"), stat_type, team_attrs, source=source),
+            "opponent": _team_df(find_table(soups, caption_startswith="Opponent"), stat_type, opponent_attrs,
+                                 kind="opponent", source=source)
+        }
+        s["team_rows"] = team_attrs.get("rows", 0)
+        s["opponent_rows"] = opponent_attrs.get("rows", 0)
+    return tables
+
+def parse_player_links(html, stat_type="standard"):
+    # [(player_id, Player, Squad)] from the player links of a league stats page, first row per player
+    with span("scraper.parse", table="player_links", stat_type=stat_type) as s:
+        table_html = find_table(page_soups(html), table_id=player_table_id(stat_type))
+        if table_html is None:
+            return None, f"Error parsing table HTML: table '{player_table_id(stat_type)}' not found"
+        links = {}
+        for tr in table_html.find_all("tr"):
+            a = tr.find("a", href=lambda h: h and "/players/" in h)
+            if a is None:
+                continue
+            player_id = a["href"].split("/players/", 1)[1].split("/", 1)[0]
+            squad = tr.find(attrs={"data-stat": "team"})
+            links.setdefault(player_id, (player_id, a.get_text(strip=True), squad.get_text(strip=True) if squad else ""))
+        s["rows"] = len(links)
+    return list(links.values()), None
+
+def parse_match_log(html, log_type="summary"):
+    # One player's season match log; unused-substitute, header and total rows are dropped
+    with span("scraper.parse", table="match_log", log_type=log_type) as s:
+        table_html = find_table(page_soups(html), table_id=MATCH_LOG_TABLE_ID)
+        if table_html is None:
+            return None, f"Error parsing table HTML: table '{MATCH_LOG_TABLE_ID}' not found"
+        try:
+            df = table_to_df(table_html, MATCH_LOG_NON_NUMERIC_COLS)
+        except Exception as e:
+            return None, f"Error parsing table HTML: {e}"
+        if "Date" not in df.columns or "Min" not in df.columns:
+            return None, "Unsupported match log layout: missing Date or Min"
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df[df["Date"].notna() & (df["Min"] > 0)].drop(columns="Match Report", errors="ignore")
+        s["rows"] = len(df)
+    return df.reset_index(drop=True), None
+
+# Parser by table kind, for code that ships parsing to executors (async_scraper.py, parse_pool.py)
+PAGE_PARSERS = {
+    "player": parse_player_table,
+    "standard": parse_standard_table,
+    "team": parse_team_table,
+    "page": parse_page_tables,
+    "player_links": parse_player_links,
+    "match_log": parse_match_log
+}
+
+def filter_eligible(df, std_df=None, min_matches=None, min_minutes=None):
+    # Keep players with at least min_matches matches and min_minutes minutes (default
+    # MIN_MATCHES / MIN_MINUTES); std_df supplies the playing time columns when df itself doesn't have them
+    min_matches = MIN_MATCHES if min_matches is None else min_matches
+    min_minutes = MIN_MINUTES if min_minutes is None else min_minutes
+    if std_df is None:
+        return df[(df["Playing Time_MP"] >= min_matches) & (df["Playing Time_Min"] >= min_minutes)].reset_index(drop=True)
+    valid_players = std_df[(std_df["Playing Time_MP"] >= min_matches) &
+                           (std_df["Playing Time_Min"] >= min_minutes)]["Player"]
+    return df[df["Player"].isin(valid_players)].reset_index(drop=True)
+
+def eligible_players(df, stat_type, season_str, league_name):
+    # Apply filter using standard stats (if not already standard)
+    std_source = eligibility_source(stat_type, season_str, league_name)
+    if std_source is None:
+        return filter_eligible(df), None
 
-    table_html = find_table_by_caption(soup)
+    std_url, std_table_id = std_source
+    with span("scraper.eligibility", stat_type=stat_type, league=league_name, season=season_str):
+        try:
+            html_std = fetch_html(std_url)
+        except Exception as e:
+            return None, f"Error loading standard stats page: {e}"
 
-    if table_html is None:
-        return None, f"No team-level table found for stat type '{stat_type}'"
+        std_df, error = parse_standard_table(html_std, std_table_id, std_url)
+    if error:
+        return None, error
+
+    return filter_eligible(df, std_df), None
+
+# Function to extract player stats
+def get_fbref_stats(stat_type, season_str, league_name):
+    # Offline mode ($FOOTBALL_SNAPSHOT): served from the local bundle, never the network
+    snapshot, error = active_snapshot()
+    if error:
+        return None, error
+    if snapshot is not None:
+        return snapshot.player_stats(stat_type, season_str, league_name)
+
+    url = build_stats_url(stat_type, season_str, league_name)
 
     try:
-        df = pd.read_html(StringIO(str(table_html)), flavor='lxml')[0]
+        html = fetch_html(url)
     except Exception as e:
-        return None, f"Error parsing table HTML: {e}"
+        return None, f"Error loading page: {e}"
 
-    df = df[df[df.columns[0]] != df.columns[0]]
-    df.reset_index(drop=True, inplace=True)
-    df.columns = [
-        col[1] if col[0].startswith('Unnamed') or col[0] == col[1]
-        else f"{col[0]}_{col[1]}"
-        for col in df.columns
-    ]
+    df, error = parse_player_table(html, stat_type, (league_name, season_str))
+    if error:
+        return None, error
+
+    return eligible_players(df, stat_type, season_str, league_name)
+
+# Player, squad and opponent tables from one download
+def get_fbref_page(stat_type, season_str, league_name):
+    """
+    Returns ({"player": (df, error), "team": (df, error), "opponent": (df, error)}, error).
+    The player table is eligibility-filtered like get_fbref_stats.
+    """
+    snapshot, error = active_snapshot()
+    if error:
+        return None, error
+    if snapshot is not None:
+        return {
+            "player": snapshot.player_stats(stat_type, season_str, league_name),
+            "team": snapshot.team_stats(stat_type, season_str, league_name),
+            "opponent": (None, "Opponent tables are not in the offline snapshot.")
+        }, None
+
+    url = build_stats_url(stat_type, season_str, league_name)
 
-    non_numeric_cols = {"Squad", "Country"}
-    for col in df.columns:
-        if col not in non_numeric_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    try:
+        html = fetch_html(url)
+    except Exception as e:
+        return None, f"Error loading page: {e}"
 
-    df.fillna(0, inplace=True)
+    tables = parse_page_tables(html, stat_type, (league_name, season_str))
+    df, error = tables["player"]
+    if df is not None:
+        tables["player"] = eligible_players(df, stat_type, season_str, league_name)
+    return tables, None
 
-    return df, None
+# Team-level scraping
+def get_fbref_team_stats(stat_type, season_str, league_name):
+    snapshot, error = active_snapshot()
+    if error:
+        return None, error
+    if snapshot is not None:
+        return snapshot.team_stats(stat_type, season_str, league_name)
+
+    url = build_team_stats_url(stat_type, season_str, league_name)
+
+    try:
+        html = fetch_html(url)
+    except Exception as e:
+        return None, f"Error loading team stats page: {e}"
+
+    return parse_team_table(html, stat_type, (league_name, season_str))
+
+# Match logs (see match_logs.py for the bulk pipeline); live only, not part of offline snapshots
+def get_player_links(season_str, league_name):
+    try:
+        html = fetch_html(build_stats_url("standard", season_str, league_name))
+    except Exception as e:
+        return None, f"Error loading page: {e}"
+    return parse_player_links(html)
+
+def get_match_log(player_id, season_str, log_type="summary"):
+    try:
+        html = fetch_html(build_match_log_url(player_id, season_str, log_type))
+    except Exception as e:
+        return None, f"Error loading match log page: {e}"
+    return parse_match_log(html, log_type)
+
+# Combine all leagues; fetch can be swapped for a cached loader with the same signature
+def build_all_leagues_df(stat_type, season_str, league_list, fetch=None):
+    snapshot, error = active_snapshot()
+    if error:
+        return None, error
+    if snapshot is not None and fetch is None:
+        return snapshot.all_leagues(stat_type, season_str, league_list)
 
-# Combine all leagues
-def build_all_leagues_df(stat_type, season_str, league_list):
     all_dfs = []
 
-    for league in league_list:
-        df, error = get_fbref_stats(stat_type=stat_type, season_str=season_str, league_name=league)
-        if df is not None:
-            df["League"] = league
-            all_dfs.append(df)
-        else:
-            print(f"Skipped {league} due to error: {error}")
+    with span("scraper.build_all_leagues", stat_type=stat_type, season=season_str) as s:
+        for league in league_list:
+            df, error = (fetch or get_fbref_stats)(stat_type, season_str, league)
+            if df is not None:
+                all_dfs.append(df.assign(League=league))
+            else:
+                print(f"Skipped {league} due to error: {error}")
 
-    if not all_dfs:
-        return None, "No data could be loaded for any league."
+        if not all_dfs:
+            return None, "No data could be loaded for any league."
 
-    df_all = pd.concat(all_dfs, ignore_index=True)
+        df_all = pd.concat(all_dfs, ignore_index=True)
+        s["rows"] = len(df_all)
     return df_all, None
@@ -0,0 +1,305 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import record_cache, span
+
+# Display label → metric key
+SIMILARITY_METRICS = {
+    "Cosine (raw)": "cosine",
+    "Cosine (z-scored)": "zscore",
+    "Weighted (z-scored)": "weighted",
+    "Mahalanobis": "mahalanobis",
+    "Minutes-shrunk (per 90)": "shrunk"
+}
+
+# Metrics that need per-player minutes (not offered for squads)
+PLAYER_ONLY_METRICS = {"shrunk"}
+
+# Small ridge added to the covariance diagonal so near-constant or
+# collinear columns (e.g. Min vs 90s) still give an invertible matrix
+COV_RIDGE = 1e-6
+
+# Projections kept per index, least recently used dropped first: every feature set and every
+# distinct set of "Weighted" slider values is one n x k matrix, and indexes live for CACHE_TTL
+MAX_PROJECTIONS = 16
+
+# Features listed per match as the ones where the two players differ most
+DIVERGENT_FEATURES = 3
+
+# Playing-time volume columns: never scaled to per 90, and left out of the role clusters
+VOLUME_COLUMNS = {"MP", "Min", "Starts", "90s", "Mn/MP", "Min%"}
+
+# Minutes at which a player's own per-90 rates and the league/position prior weigh the same
+# (ten full matches); reliability = minutes / (minutes + SHRINKAGE_MINUTES)
+SHRINKAGE_MINUTES = 900
+# Prior cells (league x position) with fewer players fall back to the position across leagues
+MIN_CELL_PLAYERS = 10
+
+
+def minutes_played(df):
+    # Minutes per row: standard tables have Playing Time_Min, the other player tables "90s"
+    for col, scale in (("Playing Time_Min", 1.0), ("Min", 1.0), ("Playing Time_90s", 90.0), ("90s", 90.0)):
+        if col in df.columns:
+            return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) * scale
+    return None
+
+
+def reliability(minutes):
+    minutes = np.nan_to_num(np.asarray(minutes, dtype=float))
+    return minutes / (minutes + SHRINKAGE_MINUTES)
+
+
+def is_unshrunk_column(col):
+    # Playing time and age describe the sample, not the player's level; kept as they are
+    return col.split("_")[-1] in VOLUME_COLUMNS | {"Age", "Born"}
+
+
+def is_rate_column(col):
+    # Per-90 values, percentages and ratios; everything else is a season total
+    short = col.split("_")[-1]
+    return "90" in col or "%" in col or "/" in short or short == "Dist"
+
+
+def _cell_means(P, minutes, codes, n_cells):
+    # Minutes-weighted mean of every column per cell, ignoring missing values; also players per cell
+    ok = ~np.isnan(P)
+    w = np.where(ok, minutes[:, None], 0.0)
+    num = np.zeros((n_cells, P.shape[1]))
+    den = np.zeros((n_cells, P.shape[1]))
+    np.add.at(num, codes, np.where(ok, P, 0.0) * w)
+    np.add.at(den, codes, w)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return num / den, np.bincount(codes, minlength=n_cells)
+
+
+def shrink_frame(df, features=None):
+    """
+    Copy of df (row for row) with every feature but playing time as a per-90 rate shrunk toward its
+    league x position mean, plus each row's reliability weight w:
+        shrunk = w * own per-90 + (1 - w) * prior,   w = minutes / (minutes + SHRINKAGE_MINUTES)
+    so 300-minute players stop matching on a hot streak. The priors are minutes-weighted
+    means, and the whole matrix is done in a few array operations.
+    """
+    features = [f for f in features or df.select_dtypes(include="number").columns if not is_unshrunk_column(f)]
+    minutes = minutes_played(df)
+    if minutes is None or df.empty:
+        return df, None
+
+    with span("similarity.shrink", rows=len(df), features=len(features)):
+        minutes = np.nan_to_num(minutes)
+        X = df[features].to_numpy(dtype=float)
+        counts = np.array([not is_rate_column(f) for f in features])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            per90 = np.where(minutes[:, None] > 0, X / (minutes[:, None] / 90.0), np.nan)
+        P = np.where(counts, per90, X)
+
+        # Prior: league x primary position, else primary position in every league, else everyone
+        pos = df["Pos"].astype(str).str.split(",").str[0] if "Pos" in df.columns else pd.Series("", index=df.index)
+        league = df["League"].astype(str) if "League" in df.columns else pd.Series("", index=df.index)
+        cell_codes, _ = pd.factorize(league + "|" + pos)
+        pos_codes, _ = pd.factorize(pos)
+        cell_mean, cell_n = _cell_means(P, minutes, cell_codes, cell_codes.max() + 1)
+        pos_mean, _ = _cell_means(P, minutes, pos_codes, pos_codes.max() + 1)
+        global_mean, _ = _cell_means(P, minutes, np.zeros(len(P), dtype=np.int64), 1)
+        prior = np.where((cell_n[cell_codes] >= MIN_CELL_PLAYERS)[:, None], cell_mean[cell_codes], pos_mean[pos_codes])
+        prior = np.where(np.isnan(prior), global_mean[0], prior)
+
+        w = reliability(minutes)
+        shrunk = w[:, None] * P + (1 - w[:, None]) * prior
+        # Totals of players without minutes have no rate and take the prior; missing stays missing
+        shrunk = np.where(np.isnan(X), np.nan, np.where(np.isnan(P), prior, shrunk))
+
+    out = df.copy()
+    out[features] = shrunk
+    return out, w
+
+
+class SimilarityIndex:
+    """
+    Numeric feature matrix of one comparison pool (stat_type, season, league group)
+    together with the column statistics every metric needs.
+    Mean, std and covariance are computed once over all numeric columns; switching
+    metrics or feature subsets only slices these and projects the cached matrix.
+    The "shrunk" metric compares z-scored rows as "zscore" does; the index must be built
+    over a shrink_frame() copy for it to mean anything (data.load_similarity_index does).
+    """
+
+    def __init__(self, df, feature_cols=None, id_col="Player", row_weights=None):
+        if feature_cols is None:
+            feature_cols = df.select_dtypes(include="number").columns.tolist()
+
+        self.df = df.reset_index(drop=True)
+        self.features = list(feature_cols)
+        self.col_pos = {f: i for i, f in enumerate(self.features)}
+        # Row labels used by top_similar(exclude_player=...): players, or e.g. "Squad (Season)" for teams
+        self.players = self.df[id_col].to_numpy() if id_col in self.df.columns else None
+        # Per-row reliability (0-1) from minutes played, for the confidence of each match;
+        # None for tables without playing time (squads)
+        if row_weights is None:
+            minutes = minutes_played(self.df) if id_col == "Player" else None
+            row_weights = None if minutes is None else reliability(minutes)
+        self.reliability = row_weights
+
+        self.X = self.df[self.features].to_numpy(dtype=float)
+        self.valid = ~np.isnan(self.X)
+
+        X0 = np.where(self.valid, self.X, np.nan)
+        self.mean = np.nan_to_num(np.nanmean(X0, axis=0)) if len(X0) else np.zeros(len(self.features))
+        self.std = np.nan_to_num(np.nanstd(X0, axis=0)) if len(X0) else np.zeros(len(self.features))
+        self.std[self.std == 0] = 1.0
+
+        # Covariance over mean-imputed values (only used for Mahalanobis)
+        Xc = np.where(self.valid, self.X, self.mean) - self.mean
+        self.cov = (Xc.T @ Xc) / max(len(Xc) - 1, 1)
+
+        # (metric, features, weights) -> projection, see _projection(); an LRU of MAX_PROJECTIONS
+        self._projections = OrderedDict()
+        self._projections_lock = threading.Lock()
+
+    def _transform(self, metric, features, weights):
+        # Returns (center, matrix) so that projected = (x - center) @ matrix
+        cols = [self.col_pos[f] for f in features]
+        n = len(cols)
+
+        if metric == "cosine":
+            return np.zeros(n), np.eye(n)
+
+        if metric in ("zscore", "weighted", "shrunk"):
+            scale = 1.0 / self.std[cols]
+            if metric == "weighted" and weights:
+                scale = scale * np.array([float(weights.get(f, 1.0)) for f in features])
+            return self.mean[cols], np.diag(scale)
+
+        if metric == "mahalanobis":
+            cov = self.cov[np.ix_(cols, cols)]
+            cov = cov + np.eye(n) * COV_RIDGE * max(np.trace(cov) / max(n, 1), 1.0)
+            # cov = L L^T  →  whitened row z = x_c @ L^{-T}
+            L = np.linalg.cholesky(cov)
+            return self.mean[cols], np.linalg.inv(L).T
+
+        raise ValueError(f"Unknown similarity metric '{metric}'")
+
+    def _projection(self, metric, features, weights=None):
+        weights_key = tuple(sorted(weights.items())) if (metric == "weighted" and weights) else None
+        key = (metric, tuple(features), weights_key)
+        with self._projections_lock:
+            proj = self._projections.get(key)
+            if proj is not None:
+                self._projections.move_to_end(key)
+        record_cache("similarity_projection", proj is not None)
+        if proj is not None:
+            return proj
+
+        cols = [self.col_pos[f] for f in features]
+        center, matrix = self._transform(metric, features, weights)
+
+        rows_ok = self.valid[:, cols].all(axis=1)
+        Z = (np.where(self.valid[:, cols], self.X[:, cols], 0.0) - center) @ matrix
+        sq_norms = np.einsum("ij,ij->i", Z, Z)
+
+        if metric == "mahalanobis":
+            # d^2(z, q) = |z|^2 + |q|^2 - 2 z.q  → one mat-vec product per query
+            Zq = Z
+        else:
+            norms = np.sqrt(sq_norms)
+            norms[norms == 0] = 1.0
+            Zq = Z / norms[:, None]
+
+        proj = {"center": center, "matrix": matrix, "Z": Zq, "sq_norms": sq_norms, "rows_ok": rows_ok}
+        with self._projections_lock:
+            self._projections[key] = proj
+            while len(self._projections) > MAX_PROJECTIONS:
+                self._projections.popitem(last=False)
+        return proj
+
+    def normalized(self, features, metric="zscore"):
+        # (row matrix the queries compare against, mask of rows without missing values)
+        proj = self._projection(metric, features)
+        return proj["Z"], proj["rows_ok"]
+
+    def _query(self, proj, selected_vec):
+        return (np.atleast_2d(np.asarray(selected_vec, dtype=float))[0] - proj["center"]) @ proj["matrix"]
+
+    def scores(self, selected_vec, features, metric="cosine", weights=None):
+        """
+        Similarity of every row in the pool to selected_vec (raw feature values, same order as features).
+        Higher is more similar for every metric.
+        """
+        proj = self._projection(metric, features, weights)
+        return self._scores(proj, self._query(proj, selected_vec), metric)
+
+    def _scores(self, proj, q, metric):
+        if metric == "mahalanobis":
+            d2 = proj["sq_norms"] + q @ q - 2.0 * (proj["Z"] @ q)
+            sims = 1.0 / (1.0 + np.sqrt(np.maximum(d2, 0.0)))
+        else:
+            q_norm = np.linalg.norm(q)
+            sims = proj["Z"] @ (q / q_norm) if q_norm > 0 else np.zeros(len(proj["Z"]))
+
+        return np.where(proj["rows_ok"], sims, -np.inf)
+
+    def contributions(self, proj, q, rows, features, metric):
+        """
+        (contributions, divergences), both (rows x features), from the projected rows already
+        used for scoring. Cosine metrics: elementwise product of the unit vectors, summing to the
+        similarity; Mahalanobis: -delta_j * (inverse covariance @ delta)_j, summing to -d^2.
+        Divergences: |difference| of the unit vectors, or of the z-scores for Mahalanobis.
+        """
+        if metric == "mahalanobis":
+            # Whitened difference e = delta @ M, so delta = e @ M^-1 and inverse covariance @ delta = e @ M^T
+            diff = proj["Z"][rows] - q
+            delta = np.linalg.solve(proj["matrix"].T, diff.T).T
+            std = self.std[[self.col_pos[f] for f in features]]
+            return -delta * (diff @ proj["matrix"].T), np.abs(delta) / std
+        q_norm = np.linalg.norm(q)
+        qn = q / q_norm if q_norm > 0 else np.zeros_like(q)
+        Z = proj["Z"][rows]
+        return Z * qn, np.abs(Z - qn)
+
+    def confidence(self, query_weight=1.0):
+        # Confidence of every row as a match: geometric mean of both players' reliability
+        if self.reliability is None:
+            return None
+        return np.sqrt(self.reliability * query_weight)
+
+    def top_similar(self, selected_vec, features, exclude_player=None, top_n=3, metric="cosine", weights=None,
+                    query_minutes=None, explain=False):
+        """
+        Top-N rows by similarity, with a "confidence" column when the pool has minutes played
+        (query_minutes: the selected player's minutes; unknown counts as fully reliable).
+        explain=True adds a "<feature> contribution" column per feature and "divergent", the
+        DIVERGENT_FEATURES features where the pair differs most (see contributions()).
+        """
+        if len(self.df) == 0 or np.asarray(selected_vec).size == 0:
+            return None
+
+        with span("similarity.query", metric=metric, features=len(features)) as s:
+            proj = self._projection(metric, features, weights)
+            q = self._query(proj, selected_vec)
+            sims = self._scores(proj, q, metric)
+            if exclude_player is not None and self.players is not None:
+                sims = np.where(self.players == exclude_player, -np.inf, sims)
+
+            candidates = np.flatnonzero(np.isfinite(sims))
+            if candidates.size == 0:
+                return None
+
+            k = min(top_n, candidates.size)
+            top = candidates[np.argpartition(-sims[candidates], k - 1)[:k]]
+            top = top[np.argsort(-sims[top], kind="stable")]
+            s["rows"] = candidates.size
+
+        out = self.df.iloc[top].assign(similarity=sims[top])
+        if self.reliability is not None:
+            query_weight = 1.0 if query_minutes is None else float(reliability(query_minutes))
+            out["confidence"] = self.confidence(query_weight)[top]
+        if explain:
+            contrib, divergence = self.contributions(proj, q, top, features, metric)
+            for j, f in enumerate(features):
+                out[f"{f} contribution"] = contrib[:, j]
+            most = np.argsort(-divergence, axis=1, kind="stable")[:, :DIVERGENT_FEATURES]
+            out["divergent"] = [", ".join(features[j] for j in row) for row in most]
+        return out.reset_index(drop=True)
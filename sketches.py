@@ -0,0 +1,206 @@
+# sketches.py
+# Approximate percentiles for pools too large to rank row by row (every season, match-level
+# rows, extra competitions). One QuantileSketch is a KLL sketch (Karnin, Lang & Liberty,
+# "Optimal Quantile Approximation in Streams", 2016) for every numeric feature at once.
+#
+# Error bound: with k items in the top compactor, an estimated rank is within eps * n of the
+# true rank with eps ~ 1.7% for k=200 and ~0.9% for k=400 at 99% confidence (the constants
+# Apache DataSketches publishes for KLL; `python sketches.py` measures this implementation).
+# Memory is O(k log(n/k)) values per feature whatever the pool size, and merging two sketches
+# gives the same guarantee as sketching the combined rows, so league sketches merge into
+# group sketches (Big 5, All 8) and season sketches into multi-season pools without re-ranking.
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+
+from diagnostics import span
+from group_stats import QUANTILES
+from league_groups import all_group_names, resolve_league_group
+
+DEFAULT_K = 200
+CAPACITY_DECAY = 2 / 3
+MIN_WIDTH = 2
+
+
+class QuantileSketch:
+    """
+    Mergeable KLL sketch of every feature column. All features see the same number of
+    values, so each compactor level is one (items x features) block and a compaction sorts
+    and halves all columns in one NumPy call. Missing values rank lowest.
+    Has the lookups GroupStats has (values, percentile, count), so it can stand in for it.
+    """
+
+    def __init__(self, features, k=DEFAULT_K, seed=0):
+        self.features = list(features)
+        self.col_pos = {f: i for i, f in enumerate(self.features)}
+        self.k = k
+        self.count = 0
+        self.total = np.zeros(len(self.features))
+        self.levels = [np.empty((0, len(self.features)))]
+        self._rng = np.random.default_rng(seed)
+        self._cdf = None
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(MIN_WIDTH, int(np.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=float).reshape(-1, len(self.features))
+        self.total += np.nansum(X, axis=0)
+        self.count += len(X)
+        self.levels[0] = np.vstack([self.levels[0], np.where(np.isnan(X), -np.inf, X)])
+        self._compress()
+        return self
+
+    def _compress(self):
+        self._cdf = None
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty((0, len(self.features))))
+                # Keep every other sorted value at double weight; the random offset makes
+                # the rank error zero-mean
+                level = np.sort(level, axis=0)
+                m = len(level) - len(level) % 2
+                offset = int(self._rng.integers(2))
+                self.levels[h + 1] = np.vstack([self.levels[h + 1], level[offset:m:2]])
+                self.levels[h] = level[m:]
+            h += 1
+
+    def merge(self, other):
+        # New sketch of both pools; neither input changes
+        if other.features != self.features:
+            raise ValueError("Cannot merge sketches of different feature sets")
+        merged = copy.deepcopy(self)
+        for h, level in enumerate(other.levels):
+            if h == len(merged.levels):
+                merged.levels.append(np.empty((0, len(self.features))))
+            merged.levels[h] = np.vstack([merged.levels[h], level])
+        merged.count += other.count
+        merged.total = merged.total + other.total
+        merged.k = max(self.k, other.k)
+        merged._compress()
+        return merged
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.levels)
+
+    def _weighted_cdf(self):
+        # Column-sorted retained values and their cumulative weights (level h weighs 2^h)
+        if self._cdf is None:
+            items = np.vstack(self.levels)
+            weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+            order = np.argsort(items, axis=0, kind="stable")
+            self._cdf = (np.take_along_axis(items, order, axis=0), np.cumsum(weights[order], axis=0))
+        return self._cdf
+
+    def rank(self, feature, values):
+        # Estimated number of pool values strictly below each value
+        items, cum = self._weighted_cdf()
+        j = self.col_pos[feature]
+        idx = np.searchsorted(items[:, j], values, side="left")
+        return np.where(idx > 0, cum[np.maximum(idx - 1, 0), j], 0.0)
+
+    def percentile(self, feature, values):
+        # Same definition as GroupStats.percentile: min rank / count * 100, higher = better
+        return (self.rank(feature, values) + 1) / max(self.count, 1) * 100
+
+    def quantile(self, feature, q):
+        items, cum = self._weighted_cdf()
+        j = self.col_pos[feature]
+        if len(items) == 0:
+            return np.nan
+        idx = np.searchsorted(cum[:, j], q * self.count, side="left")
+        return float(items[min(idx, len(items) - 1), j])
+
+    def values(self, stat, features):
+        # stat: "mean", "median", "mean_top_pct" or a quantile from QUANTILES, like GroupStats.values
+        if stat == "mean":
+            return [float(self.total[self.col_pos[f]] / max(self.count, 1)) for f in features]
+        if stat == "median":
+            return [self.quantile(f, 0.5) for f in features]
+        if stat == "mean_top_pct":
+            # Weighted mean of the retained values' own "Top X%"
+            items, cum = self._weighted_cdf()
+            weights = np.diff(cum, axis=0, prepend=0.0)
+            out = []
+            for f in features:
+                j = self.col_pos[f]
+                top_pct = 100 - self.percentile(f, items[:, j])
+                out.append(float((top_pct * weights[:, j]).sum() / max(weights[:, j].sum(), 1)))
+            return out
+        if stat in QUANTILES:
+            return [self.quantile(f, stat) for f in features]
+        raise ValueError(f"Unknown statistic '{stat}'")
+
+
+def build_league_sketches(df_all, row_index, features=None, k=DEFAULT_K):
+    # {league: QuantileSketch} from one all-leagues frame
+    features = features or df_all.select_dtypes(include="number").columns.tolist()
+    with span("sketches.build", rows=len(df_all), features=len(features), k=k):
+        X = df_all[features].to_numpy(dtype=float)
+        return {league: QuantileSketch(features, k, seed=i).update(X[row_index.league_rows([league])])
+                for i, league in enumerate(df_all["League"].unique())}
+
+
+def merge_sketches(sketches):
+    # Sketches whose features differ from the first (a changed table layout) are left out
+    sketches = [s for s in sketches if s is not None]
+    if not sketches:
+        return None
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        if sketch.features == merged.features:
+            merged = merged.merge(sketch)
+    return merged
+
+
+def build_group_sketches(league_sketch_sets):
+    """
+    {group name: QuantileSketch} for every league group, merged from per-league sketches;
+    league_sketch_sets is one {league: sketch} dict per season in the pool.
+    """
+    with span("sketches.merge_groups", seasons=len(league_sketch_sets)):
+        groups = {}
+        for name in all_group_names():
+            leagues = resolve_league_group(name)
+            merged = merge_sketches([s.get(league) for s in league_sketch_sets for league in leagues])
+            if merged is not None:
+                groups[name] = merged
+        return groups
+
+
+def benchmark_sketch(n_rows=(10_000, 100_000, 1_000_000), n_features=8, ks=(200, 400), n_parts=8, seed=0):
+    """
+    Rank error of league-sketch-then-merge against exact ranks, plus time and memory, on
+    synthetic skewed data. max_rank_err is the largest |estimated - true| rank over a grid of
+    values, as a fraction of n.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in n_rows:
+        X = rng.gamma(1.5, 2.0, size=(n, n_features)).round(2)
+        parts = np.array_split(X, n_parts)
+        exact_sorted = np.sort(X, axis=0)
+        features = [f"f{i}" for i in range(n_features)]
+        probes = np.quantile(X, np.linspace(0.01, 0.99, 99), axis=0)
+        for k in ks:
+            start = time.perf_counter()
+            sketch = merge_sketches([QuantileSketch(features, k, seed=i).update(p) for i, p in enumerate(parts)])
+            elapsed = time.perf_counter() - start
+            err = max(
+                np.abs(sketch.rank(f, probes[:, j]) - np.searchsorted(exact_sorted[:, j], probes[:, j], side="left")).max()
+                for j, f in enumerate(features)
+            ) / n
+            rows.append({"rows": n, "k": k, "build_merge_ms": elapsed * 1e3, "sketch_kb": sketch.nbytes / 1024,
+                         "exact_kb": X.nbytes / 1024, "max_rank_err": err})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    print(benchmark_sketch().round(4).to_string(index=False))
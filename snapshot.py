@@ -0,0 +1,298 @@
+# snapshot.py
+# Offline mode: a local bundle of parsed fbref tables that the scraper functions read instead of
+# the network, for deployments without fbref access.
+#
+#   python snapshot.py build snapshot/ --season 2024-2025 --season 2023-2024   (scrapes once, online)
+#   python snapshot.py verify snapshot/
+#   FOOTBALL_SNAPSHOT=snapshot/ streamlit run app.py                           (offline)
+#
+# Layout: manifest.json plus two .npy files per (level, stat_type, season) table, a float64 block
+# for the numeric columns and a fixed-width string block for the text columns. Opening a bundle
+# only reads the manifest; tables are memory-mapped on first use, so startup does not grow with
+# the number of leagues and seasons in the bundle. Each table holds all leagues in contiguous
+# blocks and the manifest stores the per-league row ranges, so a single league is a slice.
+# Role clusters (clustering.py) of every player table are computed at build time and stored
+# alongside it, row-aligned, so offline deployments never fit a model.
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lookups import league_id_dict, stat_type_reverse_dict
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ENV = "FOOTBALL_SNAPSHOT"
+LEVELS = ("player", "team")
+
+# Bundle opened from $FOOTBALL_SNAPSHOT; "enabled" is switched off while building one
+_active = {"path": None, "snapshot": None, "error": None, "enabled": True}
+
+
+def table_name(level, stat_type, season_str):
+    return f"{level}__{stat_type}__{season_str}"
+
+
+def league_ranges(df):
+    # League -> [start, stop) of its contiguous block
+    ranges = {}
+    if "League" not in df.columns:
+        return ranges
+    for league, pos in df.groupby("League", sort=False).indices.items():
+        if pos[-1] - pos[0] + 1 != len(pos):
+            raise ValueError(f"League '{league}' rows are not contiguous")
+        ranges[league] = [int(pos[0]), int(pos[-1]) + 1]
+    return ranges
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_table(bundle_dir, name, df):
+    # Returns the manifest entry; plain (non-pickled) .npy so np.load can memory-map it
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    text_cols = [c for c in df.columns if c not in numeric_cols]
+    files = {"numeric": f"{name}.num.npy", "text": f"{name}.txt.npy"}
+    np.save(bundle_dir / files["numeric"], np.ascontiguousarray(df[numeric_cols].to_numpy(dtype=np.float64)))
+    np.save(bundle_dir / files["text"], df[text_cols].astype(str).to_numpy(dtype=str))
+    return {
+        "columns": df.columns.tolist(),
+        "numeric_cols": numeric_cols,
+        "text_cols": text_cols,
+        "dtypes": {c: str(df[c].dtype) for c in numeric_cols},
+        "rows": len(df),
+        "league_ranges": league_ranges(df),
+        "files": files,
+        "sha256": {kind: _sha256(bundle_dir / f) for kind, f in files.items()}
+    }
+
+
+class Snapshot:
+    """
+    Read side of a bundle. Methods mirror the scraper functions and return (df, error).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        manifest_path = self.path / "manifest.json"
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No snapshot manifest at {manifest_path}")
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {manifest.get('version')}")
+        self.created = manifest.get("created")
+        self.tables = manifest["tables"]
+        self._arrays = {}
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def arrays(self, name):
+        arrays = self._arrays.get(name)
+        if arrays is None:
+            files = self.tables[name]["files"]
+            arrays = (np.load(self.path / files["numeric"], mmap_mode="r"),
+                      np.load(self.path / files["text"], mmap_mode="r"))
+            self._arrays[name] = arrays
+        return arrays
+
+    def frame(self, name, start=0, stop=None):
+        entry = self.tables[name]
+        numeric, text = self.arrays(name)
+        stop = entry["rows"] if stop is None else stop
+        cols = {c: numeric[start:stop, i].astype(entry["dtypes"][c]) for i, c in enumerate(entry["numeric_cols"])}
+        cols.update({c: np.asarray(text[start:stop, i], dtype=object) for i, c in enumerate(entry["text_cols"])})
+        return pd.DataFrame({c: cols[c] for c in entry["columns"]})
+
+    def _league_frame(self, level, stat_type, season_str, league_name):
+        name = table_name(level, stat_type, season_str)
+        if name not in self.tables:
+            return None, f"{stat_type} {season_str} is not in the offline snapshot."
+        r = self.tables[name]["league_ranges"].get(league_name)
+        if r is None:
+            return None, f"{league_name} {stat_type} {season_str} is not in the offline snapshot."
+        return self.frame(name, *r).drop(columns="League"), None
+
+    def player_stats(self, stat_type, season_str, league_name):
+        return self._league_frame("player", stat_type, season_str, league_name)
+
+    def team_stats(self, stat_type, season_str, league_name):
+        return self._league_frame("team", stat_type, season_str, league_name)
+
+    def clusters(self, stat_type, season_str):
+        # Cluster labels of the full player table of (stat_type, season_str), with its row keys
+        name = table_name("clusters", stat_type, season_str)
+        if name not in self.tables:
+            return None, f"No clusters for {stat_type} {season_str} in the offline snapshot."
+        return self.frame(name), None
+
+    def all_leagues(self, stat_type, season_str, league_list):
+        name = table_name("player", stat_type, season_str)
+        if name not in self.tables:
+            return None, f"{stat_type} {season_str} is not in the offline snapshot."
+        ranges = self.tables[name]["league_ranges"]
+        parts = [self.frame(name, *ranges[league]) for league in league_list if league in ranges]
+        if not parts:
+            return None, "No data could be loaded for any league."
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0], None
+
+
+def active_snapshot():
+    # (snapshot, error); (None, None) when offline mode is off
+    path = os.environ.get(SNAPSHOT_ENV)
+    if not path or not _active["enabled"]:
+        return None, None
+    if _active["path"] != path:
+        try:
+            _active.update(path=path, snapshot=Snapshot(path), error=None)
+        except Exception as e:
+            _active.update(path=path, snapshot=None, error=f"Offline snapshot unusable: {e}")
+    return _active["snapshot"], _active["error"]
+
+
+# --- Build and verify ---
+async def _scrape_tables(stat_types, season_list, leagues, teams, max_concurrency, min_interval):
+    # One download per (stat_type, season, league) page gives both its player and team table
+    from async_scraper import AsyncScraper
+
+    tables = {}
+    async with AsyncScraper(max_concurrency=max_concurrency, min_interval=min_interval) as scraper:
+        for season_str in season_list:
+            for stat_type in stat_types:
+                pages = await asyncio.gather(*[scraper.get_fbref_page(stat_type, season_str, l) for l in leagues])
+                for level in LEVELS if teams else ("player",):
+                    dfs, errors = [], []
+                    for league, (page, error) in zip(leagues, pages):
+                        df, error = (None, error) if error else page[level]
+                        if df is not None:
+                            dfs.append(df.assign(League=league))
+                        else:
+                            errors.append(f"{league}: {error}")
+                    for error in errors:
+                        print(f"Skipped {level} {stat_type} {season_str} {error}")
+                    tables[table_name(level, stat_type, season_str)] = (
+                        (pd.concat(dfs, ignore_index=True), None) if dfs else (None, "; ".join(errors)))
+    return tables
+
+
+def _clusters_frame(df):
+    # Stored with the row keys, so the app can check the labels belong to its rows
+    from clustering import ROW_KEYS, build_clusters
+    from similarity import SimilarityIndex
+    frame = build_clusters(SimilarityIndex(df)).frame()
+    for i, key in enumerate(k for k in ROW_KEYS if k in df.columns):
+        frame.insert(i, key, df[key].astype(str).to_numpy())
+    return frame
+
+
+def build_snapshot(bundle_dir, stat_types, season_list, leagues=None, teams=True,
+                   max_concurrency=2, min_interval=3.0):
+    """
+    Scrapes every (stat_type, season) for the given leagues and writes the bundle.
+    Returns (manifest, errors) where errors lists the tables that could not be scraped.
+    """
+    leagues = leagues or list(league_id_dict.keys())
+    bundle_dir = Path(bundle_dir)
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+
+    # Never read the bundle being (re)built
+    _active["enabled"] = False
+    try:
+        scraped = asyncio.run(_scrape_tables(stat_types, season_list, leagues, teams, max_concurrency, min_interval))
+    finally:
+        _active["enabled"] = True
+
+    manifest = {"version": SNAPSHOT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "leagues": leagues, "tables": {}}
+    errors = []
+    for name, (df, error) in scraped.items():
+        if df is None:
+            errors.append(f"{name}: {error}")
+            continue
+        manifest["tables"][name] = write_table(bundle_dir, name, df)
+        if name.startswith("player__"):
+            clusters_name = "clusters__" + name[len("player__"):]
+            manifest["tables"][clusters_name] = write_table(bundle_dir, clusters_name, _clusters_frame(df))
+
+    # Manifest last and atomically, so a half-written bundle is never picked up
+    tmp = bundle_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, bundle_dir / "manifest.json")
+    return manifest, errors
+
+
+def verify_snapshot(bundle_dir):
+    # Returns a list of problems (empty when the bundle is intact)
+    try:
+        snapshot = Snapshot(bundle_dir)
+    except Exception as e:
+        return [str(e)]
+
+    problems = []
+    for name, entry in snapshot.tables.items():
+        for kind, file_name in entry["files"].items():
+            path = snapshot.path / file_name
+            if not path.exists():
+                problems.append(f"{name}: missing {file_name}")
+            elif _sha256(path) != entry["sha256"][kind]:
+                problems.append(f"{name}: checksum mismatch in {file_name}")
+        if any(p.startswith(f"{name}:") for p in problems):
+            continue
+        numeric, text = snapshot.arrays(name)
+        if numeric.shape != (entry["rows"], len(entry["numeric_cols"])) or \
+                text.shape != (entry["rows"], len(entry["text_cols"])):
+            problems.append(f"{name}: array shapes do not match the manifest")
+            continue
+        ranges = sorted(entry["league_ranges"].values())
+        if ranges and (ranges[0][0] != 0 or ranges[-1][1] != entry["rows"] or
+                       any(a[1] != b[0] for a, b in zip(ranges, ranges[1:]))):
+            problems.append(f"{name}: league ranges do not cover the table")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or verify an offline fbref snapshot bundle")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="scrape tables into a bundle (needs fbref access)")
+    build.add_argument("bundle_dir")
+    build.add_argument("--season", action="append", required=True, help="season, e.g. 2024-2025 (repeatable)")
+    build.add_argument("--stat", action="append", help="stat type key (repeatable, default: all)")
+    build.add_argument("--league", action="append", help="league (repeatable, default: all 8)")
+    build.add_argument("--no-teams", action="store_true", help="skip team-level tables")
+    build.add_argument("--concurrency", type=int, default=2, help="concurrent requests")
+    build.add_argument("--interval", type=float, default=3.0, help="seconds between request starts")
+
+    verify = sub.add_parser("verify", help="check files, checksums and shapes of a bundle")
+    verify.add_argument("bundle_dir")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stat_types = args.stat or list(stat_type_reverse_dict.keys())
+        unknown = [s for s in stat_types if s not in stat_type_reverse_dict]
+        if unknown:
+            raise SystemExit(f"Statistic type(s) not supported: {', '.join(unknown)}")
+        start = time.perf_counter()
+        manifest, errors = build_snapshot(args.bundle_dir, stat_types, args.season, args.league,
+                                          teams=not args.no_teams, max_concurrency=args.concurrency,
+                                          min_interval=args.interval)
+        print(f"{len(manifest['tables'])} tables written to {args.bundle_dir} in {time.perf_counter() - start:.0f}s")
+        for error in errors:
+            print(f"skipped {error}")
+
+    problems = verify_snapshot(args.bundle_dir)
+    for problem in problems:
+        print(f"PROBLEM {problem}")
+    if problems:
+        raise SystemExit(1)
+    print(f"{args.bundle_dir}: OK")
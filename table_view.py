@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from diagnostics import span, record_cache
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+class TableView:
+    """
+    Server-side sort, filter, column projection and pagination over one cached frame,
+    so a rerun sends only the visible page to the browser instead of the whole table.
+    Sort orders are argsort indexes computed once per column and reused by every page.
+    """
+
+    def __init__(self, df, search_cols=("Player", "Squad", "Nation", "Pos")):
+        self.df = df.reset_index(drop=True)
+        self.columns = self.df.columns.tolist()
+        self.search_cols = [c for c in search_cols if c in self.columns]
+        self._sort_index = {}
+        self._search_text = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def sort_index(self, col):
+        # Ascending and stable; descending pages read the same array backwards
+        order = self._sort_index.get(col)
+        record_cache("table_sort_index", order is not None)
+        if order is None:
+            with span("table_view.sort_index", column=col, rows=len(self.df)):
+                values = self.df[col]
+                if pd.api.types.is_numeric_dtype(values):
+                    order = np.argsort(values.to_numpy(dtype=float), kind="stable")
+                else:
+                    order = np.argsort(values.astype(str).str.lower().to_numpy(), kind="stable")
+            self._sort_index[col] = order
+        return order
+
+    def search_mask(self, text):
+        if self._search_text is None:
+            # Lower-cased "player | squad | ..." line per row, built once
+            joined = self.df[self.search_cols].astype(str).agg(" | ".join, axis=1) if self.search_cols \
+                else pd.Series([""] * len(self.df))
+            self._search_text = joined.str.lower()
+        return self._search_text.str.contains(text.lower(), regex=False).to_numpy()
+
+    def positions(self, sort_by=None, ascending=True, search=None, rows=None):
+        """
+        Row positions in display order. rows optionally restricts the view to a subset
+        (e.g. one squad); search is a case-insensitive substring over search_cols.
+        """
+        with span("table_view.positions", rows=len(self.df)):
+            if sort_by is not None:
+                order = self.sort_index(sort_by)
+                if not ascending:
+                    order = order[::-1]
+            else:
+                order = np.arange(len(self.df))
+
+            keep = None
+            if rows is not None:
+                keep = np.zeros(len(self.df), dtype=bool)
+                keep[np.asarray(rows, dtype=int)] = True
+            if search:
+                mask = self.search_mask(search)
+                keep = mask if keep is None else keep & mask
+            if keep is not None:
+                order = order[keep[order]]
+        return order
+
+    def page(self, positions, page=0, page_size=50, columns=None):
+        # Only this slice is materialised and sent to the browser
+        start = max(page, 0) * page_size
+        page_df = self.df.iloc[positions[start:start + page_size]]
+        if columns:
+            page_df = page_df[[c for c in columns if c in self.columns]]
+        return page_df
+
+    def query(self, sort_by=None, ascending=True, search=None, columns=None, rows=None, page=0, page_size=50):
+        # Returns (page_df, total_rows)
+        positions = self.positions(sort_by, ascending, search, rows)
+        return self.page(positions, page, page_size, columns), len(positions)
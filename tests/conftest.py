@@ -0,0 +1,5 @@
+# The app's modules are flat files at the repository root
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
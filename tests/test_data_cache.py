@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+import data
+from data import ttl_cache
+
+
+def test_errors_and_rejected_values_are_not_cached():
+    calls = []
+
+    @ttl_cache(keep=lambda value: value[0] != "partial")
+    def load(key):
+        calls.append(key)
+        return {"error": (None, "timeout"), "partial": ("partial", None)}.get(key, (key, None))
+
+    for key in ("error", "partial", "ok"):
+        load(key)
+        load(key)
+    assert calls == ["error", "error", "partial", "partial", "ok"]
+
+
+def test_generation_changes_on_every_load():
+    @ttl_cache()
+    def load(key):
+        return key, None
+
+    assert load.generation("a") is None
+    load("a")
+    first = load.generation("a")
+    load("a")
+    assert load.generation("a") == first
+    load.cache_clear()
+    assert load.generation("a") is None
+    load("a")
+    assert load.generation("a") not in (None, first)
+
+
+def test_key_func_none_bypasses_the_cache():
+    calls = []
+
+    @ttl_cache(key_func=lambda key: None)
+    def load(key):
+        calls.append(key)
+        return key, None
+
+    load("a")
+    load("a")
+    assert calls == ["a", "a"]
+    assert load.generation("a") is None
+
+
+@pytest.fixture
+def all_leagues(monkeypatch):
+    # load_all_leagues over a replaceable frame instead of fbref
+    frame = {"df": pd.DataFrame({"Player": ["A", "B"], "Squad": ["x", "y"],
+                                 "League": ["Premier League", "La Liga"], "Gls": [1.0, 2.0]})}
+    monkeypatch.setattr(data, "build_all_leagues_df", lambda *args, **kwargs: (frame["df"], None))
+    loaders = [data.load_all_leagues, data.load_row_index, data.load_table_view, data.load_similarity_index]
+    for loader in loaders:
+        loader.cache_clear()
+    yield frame
+    for loader in loaders:
+        loader.cache_clear()
+
+
+def test_derived_indexes_follow_a_reload_with_the_same_layout(all_leagues):
+    rows = data.load_row_index("All Leagues", "gca", "2024-2025")
+    assert list(rows.league_rows(["Premier League"])) == [0]
+    version = data.data_version("All Leagues", "gca", "2024-2025")
+
+    all_leagues["df"] = pd.DataFrame({"Player": ["B", "C", "A"], "Squad": ["y", "z", "x"],
+                                      "League": ["La Liga", "Serie A", "Premier League"], "Gls": [2.0, 0.0, 1.0]})
+    data.load_all_leagues.cache_clear()
+
+    reloaded = data.load_row_index("All Leagues", "gca", "2024-2025")
+    assert reloaded is not rows
+    assert list(reloaded.league_rows(["Premier League"])) == [2]
+    assert data.data_version("All Leagues", "gca", "2024-2025") != version
+    index = data.load_similarity_index("gca", "2024-2025", ("Premier League", "Serie A"))
+    assert sorted(index.df["Player"]) == ["A", "C"]
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from similarity import SHRINKAGE_MINUTES, SimilarityIndex, reliability, shrink_frame
+
+FEATURES = ["Performance_Gls", "Performance_Ast", "Expected_xG", "Per 90 Minutes_Gls"]
+
+
+def _players(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Player": [f"P{i}" for i in range(n)],
+        "League": np.where(np.arange(n) < n // 2, "Premier League", "La Liga"),
+        "Pos": np.where(np.arange(n) % 3 == 0, "FW", "MF,FW"),
+        "Playing Time_Min": rng.integers(90, 3000, size=n).astype(float),
+        **{f: rng.gamma(2.0, 2.0, size=n) for f in FEATURES}
+    })
+
+
+@pytest.mark.parametrize("metric", ["cosine", "zscore", "weighted"])
+def test_cosine_contributions_sum_to_similarity(metric):
+    df = _players()
+    index = SimilarityIndex(df)
+    weights = dict(zip(FEATURES, [1.0, 2.0, 0.5, 1.0])) if metric == "weighted" else None
+    top = index.top_similar(df.loc[[0], FEATURES].values, FEATURES, exclude_player="P0", top_n=5,
+                            metric=metric, weights=weights, explain=True)
+    contrib = top[[f"{f} contribution" for f in FEATURES]].sum(axis=1)
+    np.testing.assert_allclose(contrib, top["similarity"], atol=1e-9)
+
+
+def test_mahalanobis_contributions_sum_to_minus_squared_distance():
+    df = _players()
+    top = SimilarityIndex(df).top_similar(df.loc[[0], FEATURES].values, FEATURES, exclude_player="P0", top_n=5,
+                                          metric="mahalanobis", explain=True)
+    d2 = -top[[f"{f} contribution" for f in FEATURES]].sum(axis=1)
+    assert (d2 >= 0).all()
+    np.testing.assert_allclose(1.0 / (1.0 + np.sqrt(d2)), top["similarity"], atol=1e-9)
+    assert top["divergent"].str.split(", ").map(len).eq(3).all()
+
+
+def _expected_shrunk(df, values, w):
+    # w * own value + (1 - w) * minutes-weighted mean of the player's league x primary position
+    # (every cell of _players() has at least MIN_CELL_PLAYERS players)
+    minutes = df["Playing Time_Min"]
+    cell = df["League"] + "|" + df["Pos"].str.split(",").str[0]
+    prior = (values * minutes).groupby(cell).sum() / minutes.groupby(cell).sum()
+    return w * values + (1 - w) * cell.map(prior)
+
+
+def test_shrinkage_pulls_totals_toward_the_cell_prior():
+    df = _players()
+    out, w = shrink_frame(df, FEATURES)
+    minutes = df["Playing Time_Min"].to_numpy()
+    np.testing.assert_allclose(w, minutes / (minutes + SHRINKAGE_MINUTES))
+
+    # Season totals are compared as per-90 rates
+    per90 = df["Performance_Gls"] / (df["Playing Time_Min"] / 90.0)
+    np.testing.assert_allclose(out["Performance_Gls"], _expected_shrunk(df, per90, w))
+
+
+def test_shrinkage_keeps_rates_and_playing_time_unscaled():
+    df = _players()
+    out, w = shrink_frame(df, FEATURES)
+    # A per-90 column is shrunk as it is, not divided by minutes again
+    np.testing.assert_allclose(out["Per 90 Minutes_Gls"], _expected_shrunk(df, df["Per 90 Minutes_Gls"], w))
+    np.testing.assert_array_equal(out["Playing Time_Min"], df["Playing Time_Min"])
+
+
+def test_reliability_is_half_at_the_shrinkage_minutes():
+    assert reliability([SHRINKAGE_MINUTES])[0] == pytest.approx(0.5)
+    assert reliability([np.nan])[0] == 0.0
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from sketches import QuantileSketch, merge_sketches
+
+# Documented rank error at 99% confidence, as a fraction of the pool (sketches.py)
+RANK_ERROR = {200: 0.017, 400: 0.009}
+
+
+def _max_rank_error(sketch, X):
+    exact = np.sort(X, axis=0)
+    probes = np.quantile(X, np.linspace(0.01, 0.99, 99), axis=0)
+    return max(
+        np.abs(sketch.rank(f, probes[:, j]) - np.searchsorted(exact[:, j], probes[:, j], side="left")).max()
+        for j, f in enumerate(sketch.features)
+    ) / len(X)
+
+
+@pytest.mark.parametrize("k", sorted(RANK_ERROR))
+def test_merged_league_sketches_stay_within_the_rank_error(k):
+    rng = np.random.default_rng(0)
+    X = rng.gamma(1.5, 2.0, size=(50_000, 3)).round(2)
+    features = ["a", "b", "c"]
+    sketch = merge_sketches([QuantileSketch(features, k, seed=i).update(part)
+                             for i, part in enumerate(np.array_split(X, 8))])
+    assert sketch.count == len(X)
+    assert _max_rank_error(sketch, X) <= RANK_ERROR[k]
+
+
+def test_small_pools_are_exact():
+    X = np.arange(50, dtype=float)[:, None]
+    sketch = QuantileSketch(["a"], k=200).update(X)
+    np.testing.assert_array_equal(sketch.rank("a", [0.0, 10.0, 49.5]), [0, 10, 50])
+    assert sketch.values("mean", ["a"]) == [pytest.approx(24.5)]
@@ -1,80 +1,139 @@
+import time
+
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from scipy.stats import rankdata
-
-def plot_radar_comparison(selected_player_df, comparison_df, player_name, features=None, comparison_group_name="Comparison Group", 
-                          checkbox_player_df=None, checkbox_name=None):
-    if features is None:
-        features = selected_player_df.select_dtypes(include=np.number).columns.tolist()
-        
-    """ (Original)
-    # Combine for ranking
-    combined_df = pd.concat([selected_player_df, checkbox_player_df, comparison_df], axis=0).drop_duplicates().reset_index(drop=True)
-
-    # True "Top X%" = player in 1st = Top 1%, in last = Top 100%
-    def true_top_percentile(col):
-        return (1 - rankdata(col, method="min") / len(col)) * 100
-
-    # Compute percentiles
-    scaled_df = combined_df[features].copy()
-    for feature in features:
-        scaled_df[feature + "_top_pct"] = true_top_percentile(scaled_df[feature])
+from diagnostics import timed
+from figure_cache import radar_figures, map_figures
+
+# True "Top X%" = player in 1st = Top 1%, in last = Top 100%
+def true_top_percentile(col):
+    # Same as scipy.stats.rankdata(col, method="min") without importing scipy.stats (~1s cold)
+    values = np.asarray(col, dtype=float)
+    min_rank = np.searchsorted(np.sort(values), values, side="left") + 1
+    return (1 - min_rank / len(values)) * 100
+
+@timed("visuals.radar_percentiles")
+def compute_radar_data(selected_player_df, comparison_df, features, checkbox_player_df=None, group_stats=None,
+                       percentiles=None):
     """
-    
-    # True "Top X%" = player in 1st = Top 1%, in last = Top 100%
-    def true_top_percentile(col):
-        return (1 - rankdata(col, method="min") / len(col)) * 100
-        
-    # Modified for re-ordering checkboxed players
-    tagged_dfs = []
-
-    selected_player_df["__source__"] = "player"
-    tagged_dfs.append(selected_player_df)
+    Percentile payload behind plot_radar_comparison (also served as JSON by api.py).
+    Radar radius = 100 - top percentile, so higher = better.
+    group_stats (a group_stats.GroupStats) supplies the group trace pre-aggregated.
+    percentiles (a GroupStats or sketches.QuantileSketch) ranks the players against its pool
+    instead of re-ranking comparison_df, for pools too large to keep as rows.
+    """
+    if percentiles is not None:
+        return _pooled_radar_data(selected_player_df, features, checkbox_player_df, group_stats or percentiles,
+                                  percentiles)
 
+    # Tag sources so the checkboxed player can be re-ordered; assign() keeps the inputs untouched
+    tagged_dfs = [selected_player_df.assign(__source__="player")]
     if checkbox_player_df is not None and not checkbox_player_df.empty:
-        checkbox_player_df["__source__"] = "checkbox"
-        tagged_dfs.append(checkbox_player_df)
-
-    comparison_df["__source__"] = "group"
-    tagged_dfs.append(comparison_df)
+        tagged_dfs.append(checkbox_player_df.assign(__source__="checkbox"))
+    tagged_dfs.append(comparison_df.assign(__source__="group"))
 
     combined_df = pd.concat(tagged_dfs).drop_duplicates().reset_index(drop=True)
-        
+
     scaled_df = combined_df[features].copy()
     for feature in features:
         scaled_df[feature + "_top_pct"] = true_top_percentile(scaled_df[feature])
 
+    def row_payload(row):
+        top_pct = [float(row[feature + "_top_pct"]) for feature in features]
+        return {
+            "radar": [100 - p for p in top_pct],
+            "actual": [float(row[feature]) for feature in features],
+            "top_pct": top_pct
+        }
+
     player_row = scaled_df[combined_df["__source__"] == "player"].iloc[0]
     group_df = scaled_df[combined_df["__source__"] == "group"]
 
+    checkbox_payload = None
     if "checkbox" in combined_df["__source__"].values:
-        checkbox_row = scaled_df[combined_df["__source__"] == "checkbox"].iloc[0]
-        checkbox_actuals = [checkbox_row[feature] for feature in features]
-        checkbox_radar_values = [100 - checkbox_row[feature + "_top_pct"] for feature in features]
-        checkbox_top_percentiles = [checkbox_row[feature + "_top_pct"] for feature in features]
+        checkbox_payload = row_payload(scaled_df[combined_df["__source__"] == "checkbox"].iloc[0])
+
+    if group_stats is not None:
+        group_payload = {
+            "radar": [100 - p for p in group_stats.values("mean_top_pct", features)],
+            "actual": group_stats.values("mean", features)
+        }
     else:
-        checkbox_row = None
-        
-    """ (original)
-    # Extract values
-    player_row = scaled_df.iloc[0]
-    checkbox_row = scaled_df.iloc[1]
-    group_df = scaled_df.iloc[2:]
+        group_payload = {
+            "radar": [float(100 - group_df[feature + "_top_pct"].mean()) for feature in features],
+            "actual": [float(v) for v in group_df[features].mean().values]
+        }
+
+    return {
+        "features": list(features),
+        "player": row_payload(player_row),
+        "checkbox": checkbox_payload,
+        "group": group_payload
+    }
+
+def _pooled_radar_data(selected_player_df, features, checkbox_player_df, group_stats, percentiles):
+    def row_payload(row_df):
+        actual = [float(row_df[feature].iloc[0]) for feature in features]
+        top_pct = [float(100 - percentiles.percentile(f, v)) for f, v in zip(features, actual)]
+        return {"radar": [100 - p for p in top_pct], "actual": actual, "top_pct": top_pct}
+
+    has_checkbox = checkbox_player_df is not None and not checkbox_player_df.empty
+    return {
+        "features": list(features),
+        "player": row_payload(selected_player_df),
+        "checkbox": row_payload(checkbox_player_df) if has_checkbox else None,
+        "group": {
+            "radar": [100 - p for p in group_stats.values("mean_top_pct", features)],
+            "actual": group_stats.values("mean", features)
+        }
+    }
+
+# Compact mode: axis labels are cut to this many characters
+COMPACT_LABEL_LEN = 16
+
+
+def short_labels(features, max_len=COMPACT_LABEL_LEN):
+    # "Performance_Gls" → "Gls" (fbref column groups are prefixes before "_"). Labels are the
+    # polar categories, so names whose short form collides (e.g. two "xG" columns) keep more text.
+    def cut(label):
+        return label if len(label) <= max_len else label[:max_len - 1] + "…"
+
+    labels = [cut(f.rsplit("_", 1)[-1]) for f in features]
+    labels = [cut(f) if labels.count(label) > 1 else label for f, label in zip(features, labels)]
+    return [label if labels.count(label) == 1 else f"{label} ({i + 1})" for i, label in enumerate(labels)]
+
+
+@radar_figures.memoize
+@timed("visuals.radar_figure")
+def plot_radar_comparison(selected_player_df, comparison_df, player_name, features=None, comparison_group_name="Comparison Group", 
+                          checkbox_player_df=None, checkbox_name=None, group_stats=None, compact=False,
+                          percentiles=None):
     """
+    compact=True sends radii and hover values as float32 typed arrays, builds hover text from
+    templates instead of per-point strings, and uses short axis labels (details on hover).
+    percentiles: see compute_radar_data.
+    """
+    if features is None:
+        features = selected_player_df.select_dtypes(include=np.number).columns.tolist()
 
-    # Radar radius = 100 - top percentile → higher = better
-    player_radar_values = [100 - player_row[feature + "_top_pct"] for feature in features]
-    #checkbox_radar_values = [100 - checkbox_row[feature + "_top_pct"] for feature in features]
-    group_radar_values = [100 - group_df[feature + "_top_pct"].mean() for feature in features]
+    radar = compute_radar_data(selected_player_df, comparison_df, features, checkbox_player_df, group_stats,
+                               percentiles)
 
-    # Actual values
-    player_actuals = [player_row[feature] for feature in features]
-    #checkbox_actuals = [checkbox_row[feature] for feature in features]
-    group_actuals = group_df[features].mean().values
-    
-    player_top_percentiles = [player_row[feature + "_top_pct"] for feature in features]
-    #checkbox_top_percentiles = [checkbox_row[feature + "_top_pct"] for feature in features]
+    player_radar_values = radar["player"]["radar"]
+    player_actuals = radar["player"]["actual"]
+    player_top_percentiles = radar["player"]["top_pct"]
+
+    group_radar_values = radar["group"]["radar"]
+    group_actuals = radar["group"]["actual"]
+
+    if compact:
+        return _compact_radar_figure(radar, features, player_name, comparison_group_name, checkbox_name)
+
+    if radar["checkbox"] is not None:
+        checkbox_radar_values = radar["checkbox"]["radar"]
+        checkbox_actuals = radar["checkbox"]["actual"]
+        checkbox_top_percentiles = radar["checkbox"]["top_pct"]
 
     # Axis labels
     axis_labels = [
@@ -96,7 +155,7 @@ def plot_radar_comparison(selected_player_df, comparison_df, player_name, featur
     ))
     
     # Checkbox trace (simplified hover: just name)
-    if checkbox_player_df is not None and not checkbox_player_df.empty and checkbox_name is not None:
+    if radar["checkbox"] is not None and checkbox_name is not None:
         fig.add_trace(go.Scatterpolar(
             r=checkbox_radar_values,
             theta=axis_labels,
@@ -137,23 +196,101 @@ def plot_radar_comparison(selected_player_df, comparison_df, player_name, featur
 
     return fig
 
+def _compact_radar_figure(radar, features, player_name, comparison_group_name, checkbox_name):
+    axis_labels = short_labels(features)
+    # Hover reads (Top %, actual) from customdata; %{theta} is the short label
+    player_hover = "<b>%{theta}</b><br>Top %{customdata[0]:.0f}% (%{customdata[1]:.2f})<extra>%{fullData.name}</extra>"
+
+    def typed(values):
+        return np.asarray(values, dtype=np.float32)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatterpolar(
+        r=typed(radar["player"]["radar"]),
+        theta=axis_labels,
+        customdata=typed([radar["player"]["top_pct"], radar["player"]["actual"]]).T,
+        fill='toself',
+        name=player_name,
+        line=dict(color='skyblue'),
+        fillcolor='rgba(135, 206, 235, 0.5)',
+        hovertemplate=player_hover
+    ))
+
+    if radar["checkbox"] is not None and checkbox_name is not None:
+        fig.add_trace(go.Scatterpolar(
+            r=typed(radar["checkbox"]["radar"]),
+            theta=axis_labels,
+            customdata=typed([radar["checkbox"]["top_pct"], radar["checkbox"]["actual"]]).T,
+            fill='toself',
+            name=checkbox_name,
+            line=dict(color='red'),
+            fillcolor='rgba(255, 99, 132, 0.4)',
+            hovertemplate=player_hover
+        ))
+
+    fig.add_trace(go.Scatterpolar(
+        r=typed(radar["group"]["radar"]),
+        theta=axis_labels,
+        customdata=typed(radar["group"]["actual"]),
+        fill='toself',
+        name=comparison_group_name,
+        line=dict(color='dodgerblue'),
+        fillcolor='rgba(30, 144, 255, 0.5)',
+        hovertemplate="<b>%{theta}</b><br>Group Avg: %{customdata:.2f}<extra>%{fullData.name}</extra>"
+    ))
+
+    fig.update_layout(
+        polar=dict(
+            radialaxis=dict(visible=True, range=[0, 100])
+        ),
+        showlegend=True,
+        title=f"Radar: {player_name} vs {comparison_group_name}",
+        height=600
+    )
+    return fig
+
+@timed("visuals.contribution_figure")
+def plot_similarity_contributions(match_row, features, player_name, match_name, compact=False):
+    """
+    Horizontal bars of each feature's share of one top_similar(explain=True) row's score,
+    largest at the top: green pulls the pair together, red apart. The row's "divergent"
+    features are marked. Small enough to sit next to the radar.
+    """
+    values = np.array([float(match_row[f"{f} contribution"]) for f in features])
+    labels = short_labels(features) if compact else list(features)
+    divergent = set(str(match_row.get("divergent", "")).split(", "))
+    order = np.argsort(values, kind="stable")
+
+    fig = go.Figure(go.Bar(
+        x=values[order],
+        y=[labels[i] + (" ↔" if features[i] in divergent else "") for i in order],
+        orientation="h",
+        marker_color=["seagreen" if v >= 0 else "indianred" for v in values[order]],
+        customdata=[features[i] for i in order],
+        hovertemplate="%{customdata}: %{x:.3f}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"{match_name}: why similar to {player_name}",
+        xaxis=dict(title=f"contribution (sum = {values.sum():.3f})", zeroline=True),
+        margin=dict(l=10, r=10, t=60, b=40),
+        showlegend=False,
+        height=600
+    )
+    return fig
+
+@timed("visuals.mini_radar_figure")
 def mini_radar_chart(player_df, features, player_name, comparison_group_df=None, group_name="Group"):
     """
     Small radar chart for one player, optionally showing group average.
     Player is skyblue, group average is dodgerblue.
     Used for side-by-side display of multiple players.
     """
-    from scipy.stats import rankdata
-
     # Combine data for percentile calculation
     if comparison_group_df is not None:
         combined_df = pd.concat([player_df, comparison_group_df], axis=0).reset_index(drop=True)
     else:
         combined_df = player_df.copy()
 
-    def true_top_percentile(col):
-        return (1 - rankdata(col, method="min") / len(col)) * 100
-
     scaled_df = combined_df[features].copy()
     for f in features:
         scaled_df[f + "_top_pct"] = true_top_percentile(scaled_df[f])
@@ -197,9 +334,106 @@ def mini_radar_chart(player_df, features, player_name, comparison_group_df=None,
     return fig
 
 
+@map_figures.memoize
+@timed("visuals.player_map_figure")
+def plot_player_map(df_all, player_map, color_labels, selected_rows=(), neighbour_rows=(), title=None):
+    """
+    Every player of the all-leagues frame at their PlayerMap coordinates, one WebGL
+    (Scattergl) trace per colour group, with the selected player and neighbours on top.
+    color_labels: one label per row (league or role cluster).
+    """
+    coords = player_map.coords
+    names = df_all["Player"].astype(str).to_numpy()
+    labels = np.asarray(color_labels, dtype=object)
+    placed = ~np.isnan(coords[:, 0])
 
+    fig = go.Figure()
+    for label in sorted(set(labels[placed])):
+        rows = np.flatnonzero(placed & (labels == label))
+        fig.add_trace(go.Scattergl(
+            x=coords[rows, 0], y=coords[rows, 1], mode="markers", name=str(label), text=names[rows],
+            marker=dict(size=5, opacity=0.6), hovertemplate="%{text}<extra>%{fullData.name}</extra>"
+        ))
+
+    for rows, name, marker in (
+        (neighbour_rows, "Similar players", dict(size=11, symbol="diamond", color="gold", line=dict(width=1, color="black"))),
+        (selected_rows, "Selected player", dict(size=16, symbol="star", color="crimson", line=dict(width=1, color="black")))
+    ):
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[placed[rows]]
+        if len(rows):
+            fig.add_trace(go.Scattergl(
+                x=coords[rows, 0], y=coords[rows, 1], mode="markers+text", name=name, text=names[rows],
+                textposition="top center", marker=marker, hovertemplate="%{text}<extra></extra>"
+            ))
+
+    explained = player_map.explained
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title=f"PC1 ({explained[0]:.0%})", zeroline=False),
+        yaxis=dict(title=f"PC2 ({explained[1]:.0%})", zeroline=False),
+        # Keeps zoom/pan across Streamlit reruns that only change the highlight
+        uirevision="player_map",
+        dragmode="pan",
+        height=650,
+        legend=dict(itemsizing="constant")
+    )
+    return fig
+
+
+def figure_payload_stats(fig, repeat=5):
+    # Size of the JSON the browser receives and the time to serialize it (best of repeat)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = fig.to_json()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"json_bytes": len(payload.encode("utf-8")), "serialize_ms": min(times)}
 
 
+def figure_render_ms(fig, repeat=5):
+    # Time for plotly.js in Kaleido's headless Chrome to decode the figure JSON and draw it
+    # (best of repeat, after one warm-up); NaN when static export is not available
+    from render_pool import renderer_error
 
+    if renderer_error():
+        return float("nan")
+    fig.to_image(format="svg")
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig.to_image(format="svg")
+        times.append((time.perf_counter() - start) * 1000)
+    return min(times)
 
 
+def benchmark_radar_payload(n_features=(8, 16, 32), n_players=500, repeat=5, seed=0):
+    """
+    Full vs compact plot_radar_comparison on synthetic data: figure JSON size, build time,
+    serialization time and, with Kaleido installed, headless render time per feature count.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n in n_features:
+        features = [f"Group {i % 4}_Stat number {i}" for i in range(n)]
+        group_df = pd.DataFrame(rng.gamma(2.0, 2.0, size=(n_players, n)), columns=features)
+        player_df, checkbox_df = group_df.iloc[[0]], group_df.iloc[[1]]
+        for compact in (False, True):
+            build_times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fig = plot_radar_comparison(player_df, group_df, "Player A", features, "Group",
+                                            checkbox_player_df=checkbox_df, checkbox_name="Player B", compact=compact)
+                build_times.append((time.perf_counter() - start) * 1000)
+            rows.append({"features": n, "mode": "compact" if compact else "full",
+                         "build_ms": min(build_times), **figure_payload_stats(fig, repeat),
+                         "render_ms": figure_render_ms(fig, repeat)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from render_pool import renderer_error
+
+    print(benchmark_radar_payload().to_string(index=False))
+    if renderer_error():
+        print(f"render_ms not measured: {renderer_error()}")